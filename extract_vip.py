@@ -7,9 +7,17 @@
 
 import os
 import sys
+import hashlib
 import subprocess
 import platform
 import time
+import importlib.util
+
+# 依赖安装完成后写入虚拟环境目录的标记文件，内容为requirements.txt的哈希
+DEPS_MARKER = ".deps_installed"
+
+# 在当前解释器中运行所需的模块
+REQUIRED_MODULES = ("requests", "Crypto")
 
 def print_welcome():
     """打印欢迎信息"""
@@ -34,25 +42,41 @@ def get_playlist_id_from_config(current_dir):
             return None
     return None
 
-def main():
-    # 显示欢迎信息
-    print_welcome()
-    
-    # 获取当前文件所在目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # 构建子目录路径
-    extractor_dir = os.path.join(current_dir, "netease_vip_extractor")
-    
-    # 检查子目录是否存在
-    if not os.path.exists(extractor_dir):
-        print(f"错误: 目录 {extractor_dir} 不存在")
-        print("请确保您下载了完整的工具包，并且没有修改目录结构。")
-        input("按回车键退出...")
-        return
+def requirements_hash(requirements_path):
+    """计算依赖文件的哈希，依赖变化后需要重新安装"""
+    with open(requirements_path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def deps_marker_valid(venv_dir, requirements_path):
+    """检查标记文件是否与当前依赖文件一致，避免每次运行都调用pip"""
+    try:
+        with open(os.path.join(venv_dir, DEPS_MARKER), 'r', encoding='utf-8') as f:
+            return f.read().strip() == requirements_hash(requirements_path)
+    except OSError:
+        return False
+
+def write_deps_marker(venv_dir, requirements_path):
+    try:
+        with open(os.path.join(venv_dir, DEPS_MARKER), 'w', encoding='utf-8') as f:
+            f.write(requirements_hash(requirements_path))
+    except OSError as e:
+        print(f"写入依赖标记失败: {e}")
+
+def deps_available():
+    """当前解释器是否已安装所需依赖，只查找模块而不导入"""
+    return all(importlib.util.find_spec(name) is not None for name in REQUIRED_MODULES)
+
+def prepare_environment(current_dir, extractor_dir):
+    """准备运行环境
+
+    当前解释器已有依赖时返回 (True, None)，在本进程中运行；
+    否则确保虚拟环境和依赖就绪并返回 (False, 虚拟环境中的python路径)；失败时返回None。
+    """
+    if deps_available():
+        return True, None
     
-    # 检查虚拟环境是否存在
     venv_dir = os.path.join(current_dir, "venv")
+    requirements_path = os.path.join(extractor_dir, "requirements.txt")
     
     # 根据操作系统确定可执行文件路径
     is_windows = platform.system() == "Windows"
@@ -64,37 +88,93 @@ def main():
         python_bin = os.path.join(venv_dir, "bin", "python3")
         pip_bin = os.path.join(venv_dir, "bin", "pip")
     
-    if not os.path.exists(venv_dir):
-        print("首次运行需要创建虚拟环境并安装依赖，这可能需要几分钟时间...")
-        try:
+    if os.path.exists(python_bin) and deps_marker_valid(venv_dir, requirements_path):
+        return False, python_bin
+    
+    if not os.path.exists(requirements_path):
+        print(f"错误: 依赖文件 {requirements_path} 不存在")
+        return None
+    
+    try:
+        if not os.path.exists(venv_dir):
+            print("首次运行需要创建虚拟环境并安装依赖，这可能需要几分钟时间...")
             # 创建虚拟环境
             # 使用py命令在Windows上，或python3在其他系统上
             python_cmd = "py" if is_windows else "python3"
             print("正在创建虚拟环境...")
             subprocess.run([python_cmd, "-m", "venv", venv_dir], check=True)
-            
-            # 安装依赖
-            requirements_path = os.path.join(extractor_dir, "requirements.txt")
-            if not os.path.exists(requirements_path):
-                print(f"错误: 依赖文件 {requirements_path} 不存在")
-                input("按回车键退出...")
-                return
-            
-            print("正在安装必要的依赖包...")    
-            subprocess.run([pip_bin, "install", "-r", requirements_path], check=True)
-            
-            print("依赖安装完成！")
-        except subprocess.CalledProcessError as e:
-            print(f"环境设置失败: {e}")
-            print("请尝试手动安装依赖包：")
-            print(f"1. 打开命令提示符")
-            print(f"2. 执行: pip install -r {os.path.join(extractor_dir, 'requirements.txt')}")
-            input("按回车键退出...")
-            return
+        
+        # 首次运行或依赖文件变化后安装依赖
+        print("正在安装必要的依赖包...")
+        subprocess.run([pip_bin, "install", "-r", requirements_path], check=True)
+        write_deps_marker(venv_dir, requirements_path)
+        print("依赖安装完成！")
+    except subprocess.CalledProcessError as e:
+        print(f"环境设置失败: {e}")
+        print("请尝试手动安装依赖包：")
+        print(f"1. 打开命令提示符")
+        print(f"2. 执行: pip install -r {requirements_path}")
+        return None
+    except Exception as e:
+        print(f"发生未知错误: {e}")
+        return None
+    
+    return False, python_bin
+
+def run_extractor(in_process, python_bin, extractor_dir, args):
+    """运行提取程序，返回是否成功
+
+    依赖已在当前解释器中可用时直接导入运行，省去启动子进程和重复导入的时间。
+    """
+    print("正在启动提取程序...")
+    if in_process:
+        sys.path.insert(0, extractor_dir)
+        try:
+            import extract_by_id
+            extract_by_id.main(args)
+            return True
+        except SystemExit as e:
+            return not e.code
         except Exception as e:
-            print(f"发生未知错误: {e}")
-            input("按回车键退出...")
-            return
+            print(f"执行失败: {e}")
+            return False
+    
+    try:
+        result = subprocess.run([python_bin, os.path.join(extractor_dir, "extract_by_id.py")] + args)
+        return result.returncode == 0
+    except Exception as e:
+        print(f"执行失败: {e}")
+        return False
+
+def print_playlist_help():
+    print("如何获取歌单ID：")
+    print("1. 打开网易云音乐APP或网页版")
+    print("2. 找到你喜欢的歌单")
+    print("3. 点击\"分享\"按钮")
+    print("4. 复制分享链接中的数字部分")
+    print("例如：链接https://music.163.com/playlist?id=123456789中，123456789就是歌单ID\n")
+
+def ask_playlist_id():
+    """提示用户输入歌单ID，未输入时返回空字符串"""
+    print("请输入网易云音乐歌单ID: ", end="")
+    return input().strip()
+
+def main():
+    # 显示欢迎信息
+    print_welcome()
+    
+    # 获取当前文件所在目录
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    # 构建子目录路径
+    extractor_dir = os.path.join(current_dir, "netease_vip_extractor")
+    
+    # 检查子目录是否存在
+    if not os.path.exists(extractor_dir):
+        print(f"错误: 目录 {extractor_dir} 不存在")
+        print("请确保您下载了完整的工具包，并且没有修改目录结构。")
+        input("按回车键退出...")
+        return
     
     # 准备执行提取脚本
     extract_script = os.path.join(extractor_dir, "extract_by_id.py")
@@ -104,6 +184,13 @@ def main():
         input("按回车键退出...")
         return
     
+    # 检查运行环境，依赖已安装时不再调用pip
+    environment = prepare_environment(current_dir, extractor_dir)
+    if environment is None:
+        input("按回车键退出...")
+        return
+    in_process, python_bin = environment
+    
     # 获取命令行参数
     args = sys.argv[1:]
     
@@ -118,66 +205,26 @@ def main():
             choice = input("请选择 (默认1): ").strip()
             if choice != "2":
                 # 如果选择1或直接回车，直接使用保存的ID
-                args = [saved_id]
-                # 执行提取脚本
-                try:
-                    print("正在启动提取程序...")
-                    cmd = [python_bin, extract_script] + args
-                    result = subprocess.run(cmd)
-                    
-                    if result.returncode == 0:
-                        print("\n处理完成！结果已保存到当前目录。")
-                    else:
-                        print("\n处理过程中出现错误，请检查上方提示信息。")
-                except Exception as e:
-                    print(f"执行失败: {e}")
-                
-                print("\n感谢使用网易云音乐VIP歌曲提取工具！")
-                input("按回车键退出...")
-                return
+                playlist_id = saved_id
             else:
-                print("\n如何获取歌单ID：")
-                print("1. 打开网易云音乐APP或网页版")
-                print("2. 找到你喜欢的歌单")
-                print("3. 点击\"分享\"按钮")
-                print("4. 复制分享链接中的数字部分")
-                print("例如：链接https://music.163.com/playlist?id=123456789中，123456789就是歌单ID\n")
-                print("请输入网易云音乐歌单ID: ", end="")
-                playlist_id = input().strip()
-                if playlist_id:
-                    args = [playlist_id]
-                else:
-                    print("未提供歌单ID，退出")
-                    input("按回车键退出...")
-                    return
+                print()
+                print_playlist_help()
+                playlist_id = ask_playlist_id()
         else:
-            print("如何获取歌单ID：")
-            print("1. 打开网易云音乐APP或网页版")
-            print("2. 找到你喜欢的歌单")
-            print("3. 点击\"分享\"按钮")
-            print("4. 复制分享链接中的数字部分")
-            print("例如：链接https://music.163.com/playlist?id=123456789中，123456789就是歌单ID\n")
-            print("请输入网易云音乐歌单ID: ", end="")
-            playlist_id = input().strip()
-            if playlist_id:
-                args = [playlist_id]
-            else:
-                print("未提供歌单ID，退出")
-                input("按回车键退出...")
-                return
+            print_playlist_help()
+            playlist_id = ask_playlist_id()
+        
+        if not playlist_id:
+            print("未提供歌单ID，退出")
+            input("按回车键退出...")
+            return
+        args = [playlist_id]
     
     # 执行提取脚本
-    try:
-        print("正在启动提取程序...")
-        cmd = [python_bin, extract_script] + args
-        result = subprocess.run(cmd)
-        
-        if result.returncode == 0:
-            print("\n处理完成！结果已保存到当前目录。")
-        else:
-            print("\n处理过程中出现错误，请检查上方提示信息。")
-    except Exception as e:
-        print(f"执行失败: {e}")
+    if run_extractor(in_process, python_bin, extractor_dir, args):
+        print("\n处理完成！结果已保存到当前目录。")
+    else:
+        print("\n处理过程中出现错误，请检查上方提示信息。")
     
     print("\n感谢使用网易云音乐VIP歌曲提取工具！")
     input("按回车键退出...")
@@ -0,0 +1,508 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+协程接口模块，提供各网络阶段的async版本，便于嵌入异步服务
+
+请求数据、响应解析、加密、限流和重试规则与同步版本相同；所有请求经过一个aiohttp会话，
+同一事件循环中可以同时处理多个歌单和多个用户。需要安装aiohttp（pip install aiohttp）。
+
+用法示例：
+    async with AsyncWeapiClient() as client:
+        results = await asyncio.gather(
+            run_playlists(client, ['123', '456'], cookies_a),
+            run_playlists(client, ['789'], cookies_b),
+        )
+"""
+
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlencode
+import metrics
+from crypto_utils import encrypted_request, SecretKeyPool
+from http_client import (BASE_URL, HEADERS, DEFAULT_TIMEOUT, MAX_RETRIES, BACKOFF_FACTOR, RETRY_STATUS,
+                         THROTTLE_RETRIES, WeapiError)
+from rate_limiter import RateLimiter, EndpointLimiter, THROTTLE_STATUS, THROTTLE_CODES
+from song_detail import SONG_DETAIL_PATH, DETAIL_BATCH_SIZE, DETAIL_MAX_RETRIES, songs_request, parse_songs
+from cloud_music import CLOUD_MUSIC_PATH, save_cloud_music_to_markdown, get_cookies
+from extract_by_id import (PLAYLIST_DETAIL_PATH, PLAYLIST_TRACK_LIMIT, SONG_URL_PATH, URL_CHUNK_SIZE, URL_MAX_RETRIES,
+                           song_urls_request, find_vip_songs, filter_songs_by_cloud_music, save_to_markdown)
+from records import CloudEntry, UrlInfo
+from matcher import CloudMusicIndex
+from utils import chunk_list, load_config, set_version_tags
+
+# 同时打开的连接数上限，由同一会话中的所有请求共享
+CONNECTION_LIMIT = 100
+
+# 云盘每页条目数
+CLOUD_PAGE_SIZE = 1000
+
+
+def _aiohttp():
+    """导入aiohttp，未安装时给出安装提示"""
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError("协程接口需要aiohttp，请先运行: pip install aiohttp") from None
+    return aiohttp
+
+
+class AsyncEndpointLimiter(EndpointLimiter):
+    """EndpointLimiter的协程版本，令牌桶和自适应规则相同，等待时不阻塞事件循环"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._released = None
+
+    async def acquire(self):
+        """等待直到可以发送一个请求"""
+        start = time.monotonic()
+        while True:
+            with self._cond:
+                acquired, timeout = self._try_acquire(start)
+            if acquired:
+                return
+            # 等待有请求完成或令牌补充
+            if self._released is None:
+                self._released = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._released.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, throttled=False, retry_after=None, failed=False):
+        super().release(throttled, retry_after, failed)
+        released, self._released = self._released, None
+        if released is not None:
+            released.set()
+
+
+class AsyncWeapiClient:
+    """weapi的协程客户端，加密、限流和重试策略与WeapiClient相同
+
+    所有请求共用一个aiohttp会话，connection_limit限制同时打开的连接数；传入session时
+    多个客户端共用该会话的连接池，由调用方负责关闭。会话不保存Cookie，Cookie随每个请求传入，
+    因此一个客户端可以同时服务多个用户。rate_limiter默认按接口限流，传入False时不限流。
+    """
+
+    def __init__(self, base_url=BASE_URL, headers=None, timeout=DEFAULT_TIMEOUT, connection_limit=CONNECTION_LIMIT,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, sec_key=None, key_reuse=True,
+                 rate_limiter=None, throttle_retries=THROTTLE_RETRIES, session=None):
+        self._aiohttp = _aiohttp()
+        self.base_url = base_url.rstrip('/')
+        self.headers = HEADERS if headers is None else headers
+        self.timeout = timeout
+        self.connection_limit = connection_limit
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.sec_key = sec_key
+        self.key_pool = SecretKeyPool() if key_reuse else None
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(limiter_class=AsyncEndpointLimiter)
+        self.rate_limiter = rate_limiter or None
+        self.throttle_retries = throttle_retries
+        self._session = session
+        self._owns_session = session is None
+
+    @property
+    def session(self):
+        """aiohttp会话，首次使用时在当前事件循环中创建"""
+        if self._session is None:
+            aiohttp = self._aiohttp
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.connection_limit),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def _send(self, path, data, cookies):
+        """发送一次请求，连接失败和RETRY_STATUS按指数退避重试，返回 (状态码, Retry-After, 解析后的JSON)"""
+        body = urlencode(encrypted_request(data, self.sec_key, self.key_pool)).encode('ascii')
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                async with self.session.post(self.base_url + path, data=body, cookies=cookies) as response:
+                    content = await response.read()
+                    status = response.status
+                    retry_after = response.headers.get('Retry-After')
+            except (self._aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                attempt += 1
+                continue
+            if metrics.is_enabled():
+                metrics.record_request(path, time.perf_counter() - start, len(body), len(content), status)
+            if status in RETRY_STATUS and attempt < self.max_retries:
+                await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                attempt += 1
+                continue
+            break
+
+        try:
+            retry_after = max(0.0, float(retry_after)) if retry_after is not None else None
+        except ValueError:
+            retry_after = None
+        result = None
+        if status not in THROTTLE_STATUS:
+            try:
+                result = json.loads(content)
+            except ValueError:
+                raise WeapiError(f"接口返回了无法解析的响应，HTTP状态码: {status}", status)
+        return status, retry_after, result
+
+    async def post(self, path, data, cookies=None):
+        """加密请求数据并发送到指定接口，返回解析后的JSON；限流和错误码的处理与WeapiClient.post相同"""
+        limiter = self.rate_limiter.get(path) if self.rate_limiter is not None else None
+        attempt = 0
+        while True:
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                status, retry_after, result = await self._send(path, data, cookies)
+            except BaseException:
+                if limiter is not None:
+                    limiter.release(failed=True)
+                raise
+
+            code = status if result is None else result.get('code')
+            throttled = result is None or code in THROTTLE_CODES
+            if not throttled:
+                retry_after = None
+            if limiter is not None:
+                limiter.release(throttled, retry_after)
+            if not throttled:
+                return result
+            if attempt >= self.throttle_retries:
+                raise WeapiError(f"请求被限流（{path}，错误码: {code}），重试{attempt}次后放弃", code)
+            if limiter is None:
+                await asyncio.sleep(retry_after if retry_after is not None else self.backoff_factor * 2 ** attempt)
+            attempt += 1
+            metrics.record_retry('throttle')
+
+    async def close(self):
+        """关闭自己创建的会话"""
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+async def run_batches(fetch, batches, max_retries=2, retry_delay=0.5):
+    """并发执行批量请求，返回值与utils.run_batches相同
+
+    并发数由客户端的限流器和连接数上限控制，这里不再另设上限。
+    """
+    async def run_one(batch):
+        attempt = 0
+        while True:
+            try:
+                return await fetch(batch)
+            except Exception:
+                if attempt >= max_retries:
+                    raise
+                attempt += 1
+                metrics.record_retry('batch')
+                await asyncio.sleep(retry_delay * attempt)
+
+    outcomes = await asyncio.gather(*[run_one(batch) for batch in batches], return_exceptions=True)
+    results = [None] * len(batches)
+    failures = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            failures.append((index, outcome))
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results[index] = outcome
+    return results, failures
+
+
+async def _fetch_playlist(client, playlist_id, cookies=None, track_limit=PLAYLIST_TRACK_LIMIT):
+    """请求歌单详情，返回playlist字段，失败时返回None"""
+    data = {
+        'id': playlist_id,
+        'n': track_limit,
+        'csrf_token': ''
+    }
+    try:
+        result = await client.post(PLAYLIST_DETAIL_PATH, data, cookies=cookies)
+    except WeapiError as e:
+        print(f"获取歌单详情失败: {e}")
+        return None
+    if result.get('code') == 200:
+        return result.get('playlist', {})
+    print(f"获取歌单详情失败，错误码: {result.get('code')}")
+    return None
+
+
+def _playlist_track_ids(playlist):
+    # trackIds包含完整的歌曲ID列表，tracks只包含前n首歌曲的详情
+    return [item['id'] for item in (playlist.get('trackIds') or []) + (playlist.get('tracks') or [])]
+
+
+@metrics.timed('get_playlist_detail')
+async def get_playlist_detail(client, playlist_id, cookies=None):
+    """获取歌单名称和去重后的歌曲ID列表"""
+    playlist = await _fetch_playlist(client, playlist_id, cookies)
+    if playlist is None:
+        return "未知歌单", []
+    playlist_name = playlist.get('name', '未知歌单')
+    track_count = playlist.get('trackCount', 0)
+    track_ids = list(dict.fromkeys(_playlist_track_ids(playlist)))
+
+    # 与同步版本相同，只有响应中没有trackIds时才按歌曲总数重新请求
+    if len(track_ids) < track_count and 'trackIds' not in playlist:
+        print(f"歌单中实际有 {track_count} 首歌曲，但API只返回了 {len(track_ids)} 首，将尝试获取更多...")
+        full_playlist = await _fetch_playlist(client, playlist_id, cookies, track_limit=track_count)
+        if full_playlist:
+            track_ids = list(dict.fromkeys(track_ids + _playlist_track_ids(full_playlist)))
+
+    if len(track_ids) != track_count:
+        print(f"警告: 歌单显示有 {track_count} 首歌曲，实际获取到 {len(track_ids)} 首")
+    return playlist_name, track_ids
+
+
+@metrics.timed('get_songs_detail')
+async def get_songs_detail(client, track_ids, cookies=None, max_retries=DETAIL_MAX_RETRIES, cache=None, with_fees=True):
+    """获取歌曲详情，返回Track列表；cache和with_fees的含义与song_detail.get_songs_detail相同
+
+    缓存读写是阻塞的SQLite调用，在线程池中执行。
+    """
+    loop = asyncio.get_running_loop()
+    songs_by_id = {}
+    if cache is not None and not with_fees:
+        songs_by_id = await loop.run_in_executor(None, cache.get_many, track_ids)
+    missing_ids = [track_id for track_id in track_ids if track_id not in songs_by_id]
+
+    batches = chunk_list(missing_ids, DETAIL_BATCH_SIZE)
+
+    async def fetch(batch):
+        return parse_songs(await client.post(SONG_DETAIL_PATH, songs_request(batch), cookies=cookies))
+
+    results, failures = await run_batches(fetch, batches, max_retries=max_retries)
+    for index, error in failures:
+        start = index * DETAIL_BATCH_SIZE
+        print(f"第 {index + 1} 批歌曲详情获取失败（第 {start + 1}-{start + len(batches[index])} 首）: {error}")
+
+    fetched_songs = [song for batch_songs in results if batch_songs for song in batch_songs]
+    if cache is not None:
+        await loop.run_in_executor(None, cache.put_many, fetched_songs)
+    for song in fetched_songs:
+        songs_by_id[song.id] = song
+    return [songs_by_id[track_id] for track_id in dict.fromkeys(track_ids) if track_id in songs_by_id]
+
+
+@metrics.timed('get_song_urls')
+async def get_song_urls(client, track_ids, cookies=None, chunk_size=URL_CHUNK_SIZE, max_retries=URL_MAX_RETRIES):
+    """获取歌曲URL，以判断是否需要VIP，返回 {歌曲ID: UrlInfo}"""
+    chunks = chunk_list(track_ids, chunk_size)
+
+    async def fetch(chunk):
+        result = await client.post(SONG_URL_PATH, song_urls_request(chunk), cookies=cookies)
+        if result.get('code') != 200:
+            raise RuntimeError(f"接口返回错误码: {result.get('code')}")
+        return result.get('data', [])
+
+    results, failures = await run_batches(fetch, chunks, max_retries=max_retries)
+    for index, error in failures:
+        start = index * chunk_size
+        print(f"第 {index + 1} 组歌曲URL获取失败（第 {start + 1}-{start + len(chunks[index])} 首）: {error}")
+
+    return {item['id']: UrlInfo.from_api(item) for chunk_data in results if chunk_data for item in chunk_data}
+
+
+async def _get_cloud_page(client, limit, offset, cookies):
+    """获取一页云盘音乐，返回 (条目列表, 云盘总数)，请求失败时条目列表为None"""
+    data = {
+        'limit': limit,
+        'offset': offset,
+        'csrf_token': ''
+    }
+    try:
+        result = await client.post(CLOUD_MUSIC_PATH, data, cookies=cookies)
+    except WeapiError as e:
+        print(f"获取云盘音乐失败（偏移 {offset}）: {e}")
+        return None, None
+    if result.get('code') == 200:
+        return result.get('data', []), result.get('count')
+    print(f"获取云盘音乐失败（偏移 {offset}），错误码: {result.get('code')}")
+    return None, None
+
+
+async def get_cloud_music(client, limit=CLOUD_PAGE_SIZE, offset=0, cookies=None):
+    """获取用户云盘音乐列表的一页"""
+    data, _ = await _get_cloud_page(client, limit, offset, cookies)
+    return data or []
+
+
+@metrics.timed('get_all_cloud_music')
+async def get_all_cloud_music(client, cookies=None, limit=CLOUD_PAGE_SIZE):
+    """获取所有云盘音乐
+
+    第一页返回云盘总数时其余分页并发请求，否则逐页请求直到返回的条目少于limit。
+    有分页请求失败时返回已获取的部分并给出提示。
+    """
+    data, count = await _get_cloud_page(client, limit, 0, cookies)
+    if data is None:
+        print("警告: 云盘音乐列表获取失败")
+        return []
+    all_cloud_music = list(data)
+    if len(data) < limit:
+        return all_cloud_music
+
+    complete = True
+    if count:
+        pages = await asyncio.gather(*[_get_cloud_page(client, limit, offset, cookies)
+                                       for offset in range(limit, count, limit)])
+        for page, _ in pages:
+            if page is None:
+                complete = False
+            else:
+                all_cloud_music.extend(page)
+        complete = complete and len(all_cloud_music) >= count
+    else:
+        offset = limit
+        while True:
+            data, _ = await _get_cloud_page(client, limit, offset, cookies)
+            if data is None:
+                complete = False
+                break
+            all_cloud_music.extend(data)
+            if len(data) < limit:
+                break
+            offset += limit
+
+    if not complete:
+        print(f"警告: 云盘音乐列表获取不完整，只获取到 {len(all_cloud_music)} 首")
+    return all_cloud_music
+
+
+@metrics.timed('get_song_details')
+async def get_song_details(client, song_ids, cookies=None, cache=None):
+    """获取云盘匹配歌曲的详细信息，ID去重后分批获取，返回 {歌曲ID: Track}"""
+    song_ids = list(dict.fromkeys(song_ids))
+    if not song_ids:
+        return {}
+    return {song.id: song for song in await get_songs_detail(client, song_ids, cookies, cache=cache, with_fees=False)}
+
+
+@metrics.timed('extract_cloud_music_info')
+async def extract_cloud_music_info(client, cookies=None, cache=None):
+    """提取云盘音乐信息，返回CloudEntry列表
+
+    与同步版本不同，这里每次全量获取，不读写本地云盘快照，多个用户可以同时调用。
+    """
+    cloud_music_list = await get_all_cloud_music(client, cookies)
+    song_ids = [item['songId'] for item in cloud_music_list if item.get('songId')]
+    song_details = await get_song_details(client, song_ids, cookies, cache=cache)
+    if len(song_details) < len(set(song_ids)):
+        print(f"{len(set(song_ids)) - len(song_details)} 首匹配歌曲的详细信息获取失败，将使用云盘中的原始信息比对")
+    return [CloudEntry.from_api(item, song_details.get(item['songId']) if item.get('songId') else None)
+            for item in cloud_music_list]
+
+
+async def extract_playlist(client, playlist_id, cookies=None, cache=None, cloud=None):
+    """处理一个歌单，返回 (歌单名称, VIP歌曲, 过滤后的歌曲, 移除的歌曲, 云盘音乐信息)
+
+    cloud为 (云盘音乐信息, 匹配索引) 或返回它的awaitable，未提供时与歌单同时获取。
+    VIP判断和云盘比对是CPU密集的，在线程池中执行，不阻塞事件循环。事件循环和aiohttp运行时
+    不能安全地fork，因此云盘比对固定为单进程。
+    """
+    if cloud is None:
+        cloud = asyncio.ensure_future(_load_cloud(client, cookies, cache))
+
+    playlist_name, track_ids = await get_playlist_detail(client, playlist_id, cookies)
+    print(f"歌单 {playlist_name} ({playlist_id}): 共 {len(track_ids)} 首歌曲")
+    songs, song_urls = await asyncio.gather(get_songs_detail(client, track_ids, cookies, cache=cache),
+                                            get_song_urls(client, track_ids, cookies))
+
+    loop = asyncio.get_running_loop()
+    vip_songs = await loop.run_in_executor(None, find_vip_songs, songs, song_urls)
+    cloud_music_info, index = cloud if isinstance(cloud, tuple) else await cloud
+    filtered_songs, removed_songs = [], []
+    if vip_songs:
+        filtered_songs, removed_songs = await loop.run_in_executor(
+            None, lambda: filter_songs_by_cloud_music(vip_songs, None, index=index, processes=1))
+    return playlist_name, vip_songs, filtered_songs, removed_songs, cloud_music_info
+
+
+async def _load_cloud(client, cookies, cache):
+    """获取云盘音乐并构建内存中的匹配索引
+
+    多个用户在同一进程中同时运行，不读写本地的云盘索引文件，以免不同账号的云盘互相覆盖。
+    """
+    cloud_music_info = await extract_cloud_music_info(client, cookies, cache=cache)
+    loop = asyncio.get_running_loop()
+    return cloud_music_info, await loop.run_in_executor(None, CloudMusicIndex, cloud_music_info)
+
+
+async def run_playlists(client, playlist_ids, cookies=None, cache=None):
+    """同时处理同一用户的多个歌单，云盘只获取一次，返回与playlist_ids顺序一致的extract_playlist结果列表"""
+    cloud = asyncio.ensure_future(_load_cloud(client, cookies, cache))
+    return await asyncio.gather(*[extract_playlist(client, playlist_id, cookies, cache=cache, cloud=cloud)
+                                  for playlist_id in playlist_ids])
+
+
+async def main(argv=None, client=None):
+    """与extract_by_id.main对应的协程入口：同时处理命令行给出的多个歌单并保存结果"""
+    from batch import read_playlist_ids
+    from reports import parse_formats, set_report_formats
+    from song_cache import get_default_cache
+
+    parser = argparse.ArgumentParser(description="网易云音乐歌单VIP歌曲提取工具（协程版本）")
+    parser.add_argument('playlist_ids', nargs='+', metavar='ID', help="歌单ID或歌单链接")
+    parser.add_argument('--formats', metavar='FORMATS', help="报告格式，逗号分隔，可选 md,csv,jsonl，默认为md")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    if config.get('version_tags'):
+        set_version_tags(config['version_tags'])
+    report_formats = config.get('report_formats')
+    if args.formats:
+        try:
+            report_formats = parse_formats(args.formats)
+        except ValueError as e:
+            print(e)
+            return
+    if report_formats:
+        set_report_formats(report_formats)
+
+    playlist_ids = read_playlist_ids(args.playlist_ids)
+    if not playlist_ids:
+        print("没有可处理的歌单ID")
+        return
+    cookies = get_cookies()
+
+    own_client = client is None
+    client = client or AsyncWeapiClient()
+    try:
+        # 缓存只保存歌曲名称和艺术家，不含账号相关的信息，可以在多个用户之间共用
+        results = await run_playlists(client, playlist_ids, cookies, cache=get_default_cache())
+    finally:
+        if own_client:
+            await client.close()
+
+    cloud_filename = save_cloud_music_to_markdown(results[0][4])
+    print(f"云盘音乐列表已保存到 {cloud_filename}")
+
+    for playlist_id, (playlist_name, vip_songs, filtered_songs, _, _) in zip(playlist_ids, results):
+        print(f"\n歌单 {playlist_name} ({playlist_id}): {len(vip_songs)} 首VIP歌曲，过滤后剩余 {len(filtered_songs)} 首")
+        if vip_songs:
+            save_to_markdown(playlist_name, vip_songs, playlist_id=playlist_id)
+        if filtered_songs:
+            save_to_markdown(playlist_name, filtered_songs, filtered=True, playlist_id=playlist_id)
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
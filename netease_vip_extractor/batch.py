@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量模块，一次处理多个歌单，共享云盘索引并对歌曲去重查询
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from cloud_music import extract_cloud_music_info, save_cloud_music_to_markdown
+from extract_by_id import get_playlist_detail, get_songs_detail, get_song_urls, find_vip_songs
+from extract_by_id import filter_songs_by_cloud_music, save_to_markdown
+from cloud_index import open_cloud_index
+
+# 同时枚举的歌单数量
+BATCH_MAX_WORKERS = 4
+
+# 从歌单链接中提取歌单ID
+_PLAYLIST_URL_PATTERN = re.compile(r'[?&]id=(\d+)')
+
+
+def read_playlist_ids(values=None, file_path=None):
+    """汇总命令行和文件中的歌单ID，支持歌单链接，文件中以#开头的行视为注释"""
+    raw_values = list(values or [])
+    if file_path:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    raw_values.append(line)
+
+    playlist_ids = []
+    for value in raw_values:
+        if value.isdigit():
+            playlist_ids.append(value)
+            continue
+        match = _PLAYLIST_URL_PATTERN.search(value)
+        if match:
+            playlist_ids.append(match.group(1))
+        else:
+            print(f"无法识别的歌单ID: {value}")
+    return list(dict.fromkeys(playlist_ids))
+
+
+def run_batch(playlist_ids, cookies=None, cache=None, incremental=True, max_workers=BATCH_MAX_WORKERS, full_sync=False):
+    """批量处理多个歌单
+
+    云盘音乐只获取一次并构建一次匹配索引；各歌单并发枚举，所有歌单中的歌曲去重后
+    只查询一次详情和URL，VIP判断和云盘比对也只对每首歌曲做一次，再按歌单拆分结果。
+    返回 {歌单ID: (歌单名称, VIP歌曲, 过滤后的歌曲, 移除的歌曲)}。
+    """
+    with ThreadPoolExecutor(max_workers=max_workers + 1) as executor:
+        cloud_future = executor.submit(extract_cloud_music_info, cookies, cache=cache, incremental=incremental,
+                                       full_sync=full_sync)
+
+        print(f"正在获取 {len(playlist_ids)} 个歌单的详情...")
+        playlists = list(executor.map(lambda playlist_id: get_playlist_detail(playlist_id, cookies), playlist_ids))
+
+        distinct_ids = list(dict.fromkeys(track_id for _, track_ids in playlists for track_id in track_ids))
+        total = sum(len(track_ids) for _, track_ids in playlists)
+        print(f"共 {total} 首歌曲，去重后 {len(distinct_ids)} 首")
+
+        print("正在获取歌曲详情和URL信息...")
+        urls_future = executor.submit(get_song_urls, distinct_ids, cookies)
+        songs = get_songs_detail(distinct_ids, cookies, cache=cache)
+        song_urls = urls_future.result()
+
+        cloud_music_info = cloud_future.result()
+
+    cloud_filename = save_cloud_music_to_markdown(cloud_music_info)
+    print(f"云盘音乐列表已保存到 {cloud_filename}")
+
+    # 每首歌曲只判断和比对一次
+    vip_songs = find_vip_songs(songs, song_urls)
+    vip_by_id = {song.id: song for song in vip_songs}
+    _, removed_songs = filter_songs_by_cloud_music(vip_songs, cloud_music_info, index=open_cloud_index(cloud_music_info))
+    removed_ids = {song.id for song in removed_songs}
+
+    results = {}
+    for playlist_id, (playlist_name, track_ids) in zip(playlist_ids, playlists):
+        playlist_vip = [vip_by_id[track_id] for track_id in track_ids if track_id in vip_by_id]
+        playlist_filtered = [song for song in playlist_vip if song.id not in removed_ids]
+        playlist_removed = [song for song in playlist_vip if song.id in removed_ids]
+        results[playlist_id] = (playlist_name, playlist_vip, playlist_filtered, playlist_removed)
+
+        print(f"\n歌单 {playlist_name} ({playlist_id}): {len(track_ids)} 首歌曲，{len(playlist_vip)} 首VIP歌曲，"
+              f"过滤后剩余 {len(playlist_filtered)} 首")
+        if playlist_vip:
+            save_to_markdown(playlist_name, playlist_vip, playlist_id=playlist_id)
+        if playlist_filtered:
+            save_to_markdown(playlist_name, playlist_filtered, filtered=True, playlist_id=playlist_id)
+
+    return results
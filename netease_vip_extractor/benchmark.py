@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准测试脚本，使用合成数据测量提取流程各阶段的耗时
+
+用法示例：
+    python benchmark.py --sizes 1000,10000 --latency 0.02
+    python benchmark.py --stages offline --compare
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime
+
+import utils
+from mock_server import SyntheticLibrary, MockWeapiServer, MOCK_SEC_KEY
+
+# 基准结果文件路径
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmark_results.jsonl")
+
+DEFAULT_SIZES = (1000, 10000)
+
+
+def _best_of(func, repeat):
+    """重复执行并返回最短耗时（秒）"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+@contextlib.contextmanager
+def _quiet():
+    """屏蔽被测函数的进度输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def _in_temp_dir():
+    """在临时目录中执行，避免报告文件写入当前目录"""
+    old_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.chdir(temp_dir)
+        try:
+            yield temp_dir
+        finally:
+            os.chdir(old_cwd)
+
+
+def bench_offline(library, repeat):
+    """测量不涉及网络的各阶段"""
+    import extract_by_id
+    import cloud_music
+    from crypto_utils import encrypted_request
+    from reports import REPORT_FORMATS
+
+    songs = library.tracks()
+    song_urls = library.url_infos()
+    cloud_music_info = library.cloud_music_info()
+    vip_songs = extract_by_id.find_vip_songs(songs, song_urls)
+    song_names = [song.name for song in songs]
+    artist_names = [artist for song in songs for artist in song.artists]
+    artist_pairs = list(zip(artist_names, reversed(artist_names)))
+    detail_payload = {
+        'c': '[' + ','.join([f'{{"id":{song_id}}}' for song_id in library.track_ids[:1000]]) + ']',
+        'ids': '[' + ','.join([str(song_id) for song_id in library.track_ids[:1000]]) + ']',
+        'csrf_token': ''
+    }
+
+    def normalize_cold():
+        song_normalizer = utils.NameNormalizer(utils.VERSION_TAGS)
+        artist_normalizer = utils.NameNormalizer()
+        for name in song_names:
+            song_normalizer(name)
+        for name in artist_names:
+            artist_normalizer(name)
+
+    def similarity_all():
+        for s1, s2 in artist_pairs:
+            utils.similarity(s1, s2)
+
+    def similarity_threshold():
+        for s1, s2 in artist_pairs:
+            utils.similarity_exceeds(s1, s2, 0.7)
+
+    def encrypt_many():
+        for _ in range(200):
+            encrypted_request(detail_payload)
+
+    results = {}
+    with _quiet():
+        results['find_vip_songs'] = _best_of(lambda: extract_by_id.find_vip_songs(songs, song_urls), repeat)
+        results['filter_songs_by_cloud_music'] = _best_of(lambda: extract_by_id.filter_songs_by_cloud_music(vip_songs, cloud_music_info), repeat)
+        results['normalize_cold'] = _best_of(normalize_cold, repeat)
+        results['similarity'] = _best_of(similarity_all, repeat)
+        results['similarity_exceeds'] = _best_of(similarity_threshold, repeat)
+        results['encrypted_request_x200'] = _best_of(encrypt_many, repeat)
+        with _in_temp_dir():
+            results['save_to_markdown'] = _best_of(lambda: extract_by_id.save_to_markdown(library.playlist_name, vip_songs), repeat)
+            results['save_cloud_music_to_markdown'] = _best_of(lambda: cloud_music.save_cloud_music_to_markdown(cloud_music_info), repeat)
+            results['save_cloud_music_all_formats'] = _best_of(
+                lambda: cloud_music.save_cloud_music_to_markdown(iter(cloud_music_info), formats=REPORT_FORMATS), repeat)
+    return results
+
+
+def bench_crypto(library, repeat, requests_per_run=1000):
+    """加密吞吐量微基准，分别测量每次生成新密钥和复用密钥时的每秒请求数"""
+    from crypto_utils import encrypted_request, SecretKeyPool
+
+    small_payload = {'id': library.playlist_id, 'n': 1000, 'csrf_token': ''}
+    batch_ids = library.track_ids[:1000]
+    batch_payload = {
+        'c': '[' + ','.join([f'{{"id":{song_id}}}' for song_id in batch_ids]) + ']',
+        'ids': '[' + ','.join([str(song_id) for song_id in batch_ids]) + ']',
+        'csrf_token': ''
+    }
+
+    results = {}
+    for label, payload in (('small', small_payload), ('batch', batch_payload)):
+        count = requests_per_run if label == 'small' else max(1, requests_per_run // 5)
+        key_pool = SecretKeyPool()
+        fresh = _best_of(lambda: [encrypted_request(payload) for _ in range(count)], repeat)
+        pooled = _best_of(lambda: [encrypted_request(payload, key_pool=key_pool) for _ in range(count)], repeat)
+        results[f'encrypt_{label}_fresh_key_rps'] = count / fresh
+        results[f'encrypt_{label}_pooled_key_rps'] = count / pooled
+    return results
+
+
+def bench_http(library, repeat, latency):
+    """在本地模拟服务器上测量各网络阶段的端到端耗时"""
+    import extract_by_id
+    import cloud_music
+    from http_client import WeapiClient, set_client
+
+    results = {}
+    with MockWeapiServer(library, latency=latency) as server:
+        # 只测量请求本身，不经过客户端限流
+        set_client(WeapiClient(base_url=server.base_url, sec_key=MOCK_SEC_KEY, rate_limiter=False))
+        cookies = {}
+        track_ids = library.track_ids
+        with _quiet():
+            results['get_playlist_detail'] = _best_of(lambda: extract_by_id.get_playlist_detail(library.playlist_id, cookies), repeat)
+            results['get_songs_detail'] = _best_of(lambda: extract_by_id.get_songs_detail(track_ids, cookies), repeat)
+            results['get_song_urls'] = _best_of(lambda: extract_by_id.get_song_urls(track_ids, cookies), repeat)
+            results['get_all_cloud_music'] = _best_of(lambda: cloud_music.get_all_cloud_music(cookies), repeat)
+            results['extract_cloud_music_info'] = _best_of(lambda: cloud_music.extract_cloud_music_info(cookies), repeat)
+        results['requests'] = server.request_count
+        set_client(None)
+    return results
+
+
+def bench_throttle(library, latency, throttle=(8, 8)):
+    """在限流的模拟服务器上比较启用和不启用客户端限流时的耗时和被限流次数"""
+    import extract_by_id
+    from http_client import WeapiClient, set_client
+
+    results = {}
+    for label, rate_limiter in (('limited', None), ('unlimited', False)):
+        with MockWeapiServer(library, latency=latency, throttle=throttle) as server:
+            set_client(WeapiClient(base_url=server.base_url, sec_key=MOCK_SEC_KEY, rate_limiter=rate_limiter))
+            with _quiet():
+                start = time.perf_counter()
+                extract_by_id.get_songs_detail(library.track_ids, {})
+                extract_by_id.get_song_urls(library.track_ids, {})
+                results[f'throttled_fetch_{label}'] = time.perf_counter() - start
+            results[f'throttled_fetch_{label}_requests'] = server.request_count
+            results[f'throttled_fetch_{label}_rejected'] = server.throttled_count
+            set_client(None)
+    return results
+
+
+def bench_match(library, repeat):
+    """测量云盘比对在不同进程数下的耗时，全部歌单歌曲都作为候选，进程数从1翻倍到CPU数
+
+    同时比较在内存中构建索引与用mmap打开已保存的索引文件的耗时。
+    """
+    from matcher import CloudMusicIndex, match_all
+    from cloud_index import MappedCloudIndex, open_cloud_index
+
+    songs = library.tracks()
+    cloud_music_info = library.cloud_music_info()
+    index = CloudMusicIndex(cloud_music_info)
+    cpu_count = os.cpu_count() or 1
+    process_counts = [1]
+    while process_counts[-1] * 2 <= cpu_count:
+        process_counts.append(process_counts[-1] * 2)
+    if process_counts[-1] != cpu_count:
+        process_counts.append(cpu_count)
+
+    results = {'match_cpu_count': cpu_count}
+    for processes in process_counts:
+        results[f'match_all_p{processes}'] = _best_of(lambda: match_all(index, songs, processes), repeat)
+
+    with _in_temp_dir() as temp_dir:
+        index_file = os.path.join(temp_dir, 'cloud_index.bin')
+        results['cloud_index_build'] = _best_of(lambda: CloudMusicIndex(cloud_music_info), repeat)
+        results['cloud_index_write'] = _best_of(lambda: open_cloud_index(cloud_music_info, index_file) and
+                                                os.remove(index_file), repeat)
+        open_cloud_index(cloud_music_info, index_file)
+        results['cloud_index_open_mapped'] = _best_of(lambda: open_cloud_index(cloud_music_info, index_file).close(),
+                                                      repeat)
+        mapped = MappedCloudIndex(index_file)
+        results['match_all_mapped_p1'] = _best_of(lambda: match_all(mapped, songs, 1), repeat)
+        mapped.close()
+    return results
+
+
+# 在新进程中运行主流程直到第一个请求返回后立即退出；Cookie、缓存、配置和所有本地状态文件都替换到临时目录
+_STARTUP_DRIVER = """
+import os
+import sys
+sys.path.insert(0, {extractor_dir!r})
+import extract_by_id
+import checkpoint
+import cloud_index
+import cloud_music
+import song_cache
+from http_client import WeapiClient, set_client
+checkpoint.STATE_DIR = os.path.join({temp_dir!r}, 'state')
+cloud_index.CLOUD_INDEX_FILE = os.path.join({temp_dir!r}, 'cloud_index.bin')
+cloud_music.CLOUD_SNAPSHOT_FILE = os.path.join({temp_dir!r}, 'cloud_snapshot.json')
+song_cache.CACHE_FILE = os.path.join({temp_dir!r}, 'song_cache.db')
+extract_by_id.get_cookies = lambda: {{}}
+extract_by_id.get_default_cache = lambda: None
+extract_by_id.save_playlist_id = lambda playlist_id: None
+
+
+class _FirstRequestClient(WeapiClient):
+    def post(self, *args, **kwargs):
+        super().post(*args, **kwargs)
+        os._exit(0)
+
+
+set_client(_FirstRequestClient(base_url={base_url!r}, sec_key={sec_key!r}))
+extract_by_id.main([{playlist_id!r}])
+"""
+
+
+def bench_startup(library, repeat):
+    """测量冷启动耗时：新进程导入主模块的时间，以及从启动进程到发出第一个请求的时间"""
+    extractor_dir = os.path.dirname(os.path.abspath(__file__))
+    import_code = ("import time; start = time.perf_counter(); import extract_by_id; "
+                   "print(time.perf_counter() - start)")
+
+    results = {}
+    import_times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', import_code], capture_output=True, text=True,
+                                cwd=extractor_dir, check=True)
+        import_times.append(float(output.stdout.strip()))
+    results['import_extract_by_id'] = min(import_times)
+
+    first_request = []
+    with _in_temp_dir() as temp_dir:
+        for _ in range(repeat):
+            with MockWeapiServer(library) as server:
+                code = _STARTUP_DRIVER.format(extractor_dir=extractor_dir, temp_dir=temp_dir,
+                                              base_url=server.base_url, sec_key=MOCK_SEC_KEY,
+                                              playlist_id=str(library.playlist_id))
+                start = time.time()
+                subprocess.run([sys.executable, '-c', code], stdout=subprocess.DEVNULL, check=True)
+                first_request.append(server.first_request_at - start)
+    results['launch_to_first_request'] = min(first_request)
+    return results
+
+
+def _git_commit():
+    """获取当前提交，用于比较不同提交间的结果"""
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return output.stdout.strip() or 'unknown'
+    except Exception:
+        return 'unknown'
+
+
+def load_results(results_file=RESULTS_FILE):
+    """读取历史基准结果"""
+    records = []
+    if os.path.exists(results_file):
+        with open(results_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    return records
+
+
+def save_result(record, results_file=RESULTS_FILE):
+    """追加一条基准结果"""
+    with open(results_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def print_results(record, baseline=None):
+    """打印结果，提供baseline时同时显示相对变化"""
+    if baseline:
+        print(f"对比基准: 提交 {baseline['commit']} ({baseline['time']})")
+    for size, stages in record['results'].items():
+        print(f"\n规模 {size}:")
+        old_stages = baseline['results'].get(size, {}) if baseline else {}
+        for stage, value in stages.items():
+            line = f"  {stage:<32} {value:>12.4f}" if isinstance(value, float) else f"  {stage:<32} {value:>12}"
+            old_value = old_stages.get(stage)
+            if isinstance(value, float) and isinstance(old_value, float) and old_value > 0:
+                line += f"   {old_value:>10.4f}  x{value / old_value:.2f}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="网易云音乐VIP歌曲提取工具基准测试")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="合成数据规模，逗号分隔，例如 1000,10000,100000")
+    parser.add_argument('--stages', default='offline,crypto,http',
+                        help="要测量的阶段: offline, crypto, http, throttle, startup, match")
+    parser.add_argument('--latency', type=float, default=0.02, help="模拟服务器每个请求的延迟（秒）")
+    parser.add_argument('--repeat', type=int, default=3, help="每项重复次数，取最短耗时")
+    parser.add_argument('--output', default=RESULTS_FILE, help="结果记录文件")
+    parser.add_argument('--compare', nargs='?', const='', default=None,
+                        help="与指定提交（默认为上一条记录）的结果比较")
+    parser.add_argument('--no-save', action='store_true', help="不记录本次结果")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    stages = set(args.stages.split(','))
+    record = {
+        'commit': _git_commit(),
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'latency': args.latency,
+        'results': {},
+    }
+
+    for size in sizes:
+        print(f"正在测量规模 {size} ...")
+        library = SyntheticLibrary(size)
+        stage_results = {}
+        if 'offline' in stages:
+            stage_results.update(bench_offline(library, args.repeat))
+        if 'crypto' in stages:
+            stage_results.update(bench_crypto(library, args.repeat))
+        if 'http' in stages:
+            stage_results.update(bench_http(library, args.repeat, args.latency))
+        if 'startup' in stages:
+            stage_results.update(bench_startup(library, args.repeat))
+        if 'match' in stages:
+            stage_results.update(bench_match(library, args.repeat))
+        if 'throttle' in stages:
+            stage_results.update(bench_throttle(library, args.latency))
+        record['results'][str(size)] = stage_results
+
+    baseline = None
+    if args.compare is not None:
+        history = load_results(args.output)
+        if args.compare:
+            history = [item for item in history if item['commit'] == args.compare]
+        baseline = history[-1] if history else None
+        if baseline is None:
+            print("没有找到可比较的历史结果")
+
+    print_results(record, baseline)
+
+    if not args.no_save:
+        save_result(record, args.output)
+        print(f"\n结果已记录到 {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
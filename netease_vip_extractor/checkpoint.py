@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+断点续传模块，把已完成的歌单详情、歌曲详情批次、URL分组和云盘分页保存到本地状态目录
+
+中断或部分请求失败后，使用 --resume 重新运行时会跳过已完成的部分。
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+
+# 状态目录路径
+STATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".extract_state")
+
+
+def batch_key(ids):
+    """根据批次中的ID生成键，批次内容相同时键相同"""
+    return hashlib.sha1(','.join(str(item_id) for item_id in ids).encode('utf-8')).hexdigest()[:16]
+
+
+class RunCheckpoint:
+    """一次提取任务的断点状态，每个已完成的单元保存为 阶段/键.json
+
+    resume为False时丢弃同名任务遗留的状态。请求失败的单元不会保存，
+    相关函数会把incomplete置为True，任务结束时据此决定保留还是清除状态。
+    """
+
+    def __init__(self, run_key, resume=False, state_dir=None):
+        self.path = os.path.join(state_dir or STATE_DIR, re.sub(r'[^\w-]', '_', str(run_key)))
+        self.incomplete = False
+        self._lock = threading.Lock()
+        if not resume:
+            self.clear()
+        self.resumed = resume and os.path.isdir(self.path)
+
+    def _file(self, stage, key):
+        return os.path.join(self.path, stage, f"{key}.json")
+
+    def load(self, stage, key):
+        """读取已完成单元的数据，不存在或损坏时返回None"""
+        try:
+            with open(self._file(stage, key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, stage, key, data):
+        """保存已完成单元的数据，先写临时文件再替换，避免中断时留下不完整的文件"""
+        file_path = self._file(stage, key)
+        temp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, file_path)
+        except OSError as e:
+            print(f"保存断点状态失败: {e}")
+
+    def cached(self, stage, fetch, key=batch_key, encode=None, decode=None):
+        """包装批次请求函数：已完成的批次直接读取保存的结果，否则请求并保存
+
+        encode/decode在请求结果与可JSON序列化的数据之间转换。
+        """
+        def run(batch):
+            batch_id = key(batch)
+            data = self.load(stage, batch_id)
+            if data is not None:
+                return decode(data) if decode else data
+            result = fetch(batch)
+            self.save(stage, batch_id, encode(result) if encode else result)
+            return result
+        return run
+
+    def count(self, stage):
+        """已完成的单元数"""
+        try:
+            return sum(1 for name in os.listdir(os.path.join(self.path, stage)) if name.endswith('.json'))
+        except OSError:
+            return 0
+
+    def clear(self):
+        """删除该任务的全部状态"""
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+云盘索引文件模块，把CloudMusicIndex保存为紧凑的二进制文件，下次运行时用mmap直接打开
+
+文件由固定长度的文件头和若干连续的数组组成：所有字符串去重后存放在一块UTF-8数据中，
+按字符串哈希的开放寻址表查找；歌曲ID保存为有序数组，按二分查找；每个标准化歌曲名对应一条
+记录，指向其精确匹配和模糊匹配的艺术家列表。打开时不需要解析，fork出的匹配进程直接共享映射的页面。
+"""
+
+import os
+import sys
+import mmap
+import zlib
+import struct
+import hashlib
+import tempfile
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+import metrics
+from matcher import CloudMusicIndex, _NameBucket
+from records import CloudEntry
+from utils import normalize_song_name, normalize_artist_name, get_version_tags
+
+# 索引文件路径
+CLOUD_INDEX_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cloud_index.bin")
+
+MAGIC = b'NCIX'
+FORMAT_VERSION = 1
+
+# 各数组的名称和元素类型，按此顺序写入文件
+SECTIONS = (
+    ('string_offsets', 'I'),  # 第i个字符串在string_blob中的起止位置为 [offsets[i], offsets[i+1])
+    ('string_blob', 'B'),
+    ('string_slots', 'I'),  # 开放寻址哈希表，保存字符串序号+1，0为空位
+    ('name_of_string', 'i'),  # 字符串序号 -> 歌曲名记录序号，不是歌曲名时为-1
+    ('name_records', 'I'),  # 每条记录_RECORD_FIELDS个值，见_RECORD_FIELDS
+    ('artist_lists', 'I'),  # 艺术家字符串序号，精确匹配部分按序号排序
+    ('id_keys', 'q'),  # 有序的云盘歌曲ID
+    ('id_positions', 'I'),  # 与id_keys对应的云盘条目位置
+    ('entry_numbers', 'q'),  # 每个条目3个值: 歌曲ID, 文件大小, 上传时间
+    ('entry_strings', 'I'),  # 每个条目4个字符串序号: 名称, 艺术家, 匹配名称, 匹配艺术家
+)
+
+# 歌曲名记录: 第一个条目位置, 是否有空艺术家, 精确匹配艺术家起止, 模糊匹配艺术家起止
+_RECORD_FIELDS = 6
+
+_HEADER = struct.Struct('=4sHB1x40s' + 'QQ' * len(SECTIONS))
+_BYTEORDER = 0 if sys.byteorder == 'little' else 1
+
+
+def cloud_fingerprint(cloud_music_info):
+    """云盘列表的指纹，任何条目增删、匹配信息或歌曲名标准化规则变化时都会改变"""
+    digest = hashlib.sha1(f"{FORMAT_VERSION}\t{get_version_tags()}\n".encode('utf-8'))
+    for item in cloud_music_info:
+        digest.update(f"{item.song_id}\t{item.add_time}\t{item.name}\t{item.artist}\t"
+                      f"{item.matched_name}\t{item.matched_artist}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _string_hash(data):
+    return zlib.crc32(data)
+
+
+def write_index_file(index, path, fingerprint):
+    """把CloudMusicIndex写入索引文件，先写临时文件再替换
+
+    临时文件在同一目录下以唯一的文件名创建，多个进程或线程同时写入时互不干扰，最后一次替换的结果生效。
+    """
+    # 字符串去重，按首次出现的顺序编号
+    string_positions = {}
+
+    def intern(value):
+        return string_positions.setdefault(value, len(string_positions))
+
+    entry_numbers = array('q')
+    entry_strings = array('I')
+    for entry in index.entries:
+        entry_numbers.extend((int(entry.song_id or 0), int(entry.file_size or 0), int(entry.add_time or 0)))
+        entry_strings.extend((intern(entry.name or ''), intern(entry.artist or ''),
+                              intern(entry.matched_name or ''), intern(entry.matched_artist or '')))
+
+    exact_artists = {}
+    for name, artist in index.exact_keys:
+        exact_artists.setdefault(name, []).append(artist)
+
+    records = {}
+    name_records = array('I')
+    artist_lists = array('I')
+    for name, bucket in index.buckets.items():
+        records[intern(name)] = len(name_records) // _RECORD_FIELDS
+        exact_start = len(artist_lists)
+        # 精确匹配的艺术家按字符串序号排序，查询时二分查找
+        artist_lists.extend(sorted(intern(artist) for artist in exact_artists.get(name, ())))
+        fuzzy_start = len(artist_lists)
+        artist_lists.extend(intern(artist) for artist in bucket.artists)
+        name_records.extend((bucket.first_position, int(bucket.has_empty), exact_start, fuzzy_start,
+                             fuzzy_start, len(artist_lists)))
+
+    id_items = sorted(index.by_id.items())
+    id_keys = array('q', [int(song_id) for song_id, _ in id_items])
+    id_positions = array('I', [position for _, position in id_items])
+
+    encoded = [value.encode('utf-8') for value in string_positions]
+    string_offsets = array('I', [0])
+    string_offsets.extend(accumulate(map(len, encoded)))
+    name_of_string = array('i', [-1]) * len(encoded)
+    for string_position, record in records.items():
+        name_of_string[string_position] = record
+
+    slot_count = 8
+    while slot_count < len(encoded) * 2:
+        slot_count *= 2
+    mask = slot_count - 1
+    string_slots = array('I', [0]) * slot_count
+    for position, data in enumerate(encoded):
+        slot = _string_hash(data) & mask
+        while string_slots[slot]:
+            slot = (slot + 1) & mask
+        string_slots[slot] = position + 1
+
+    sections = {
+        'string_offsets': string_offsets.tobytes(),
+        'string_blob': b''.join(encoded),
+        'string_slots': string_slots.tobytes(),
+        'name_of_string': name_of_string.tobytes(),
+        'name_records': name_records.tobytes(),
+        'artist_lists': artist_lists.tobytes(),
+        'id_keys': id_keys.tobytes(),
+        'id_positions': id_positions.tobytes(),
+        'entry_numbers': entry_numbers.tobytes(),
+        'entry_strings': entry_strings.tobytes(),
+    }
+
+    # 各数组按8字节对齐
+    layout = []
+    offset = _HEADER.size
+    for name, _ in SECTIONS:
+        offset += -offset % 8
+        layout.extend((offset, len(sections[name])))
+        offset += len(sections[name])
+
+    directory, filename = os.path.split(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f"{filename}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, _BYTEORDER, fingerprint.encode('ascii'), *layout))
+            for section_index, (name, _) in enumerate(SECTIONS):
+                f.write(b'\0' * (layout[section_index * 2] - f.tell()))
+                f.write(sections[name])
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class MappedCloudIndex:
+    """用mmap打开的云盘索引文件，匹配规则和结果与CloudMusicIndex相同
+
+    只在需要模糊匹配时解码对应歌曲名下的艺术家，匹配到的云盘条目在首次访问时才创建。
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mmap) < _HEADER.size:
+                raise ValueError("索引文件不完整")
+            magic, version, byteorder, fingerprint, *layout = _HEADER.unpack_from(self._mmap)
+            if magic != MAGIC or version != FORMAT_VERSION or byteorder != _BYTEORDER:
+                raise ValueError("索引文件格式不匹配")
+            self.fingerprint = fingerprint.decode('ascii')
+            self._view = memoryview(self._mmap)
+            self._sections = []
+            for section_index, (name, type_code) in enumerate(SECTIONS):
+                offset, size = layout[section_index * 2], layout[section_index * 2 + 1]
+                if offset + size > len(self._mmap):
+                    raise ValueError("索引文件不完整")
+                section = self._view[offset:offset + size]
+                if type_code != 'B':
+                    section = section.cast(type_code)
+                self._sections.append(section)
+                setattr(self, f"_{name}", section)
+        except Exception:
+            self.close()
+            raise
+        self._slot_mask = len(self._string_slots) - 1
+        self._blob_offset = layout[SECTIONS.index(('string_blob', 'B')) * 2]
+        # 已查询过的字符串序号，歌单中的艺术家和歌曲名会重复出现
+        self._string_positions = {}
+        self._buckets = {}
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entry_numbers) // 3
+
+    def close(self):
+        """释放映射，之后不能再查询"""
+        for section in getattr(self, '_sections', ()):
+            section.release()
+        self._sections = []
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+            self._view = None
+        self._mmap.close()
+
+    def _string(self, position):
+        return str(self._string_blob[self._string_offsets[position]:self._string_offsets[position + 1]], 'utf-8')
+
+    def _find_string(self, value):
+        """返回字符串序号，索引中没有该字符串时返回None"""
+        try:
+            return self._string_positions[value]
+        except KeyError:
+            pass
+        data = value.encode('utf-8')
+        slots, offsets, mask, base = self._string_slots, self._string_offsets, self._slot_mask, self._blob_offset
+        slot = _string_hash(data) & mask
+        while True:
+            stored = slots[slot]
+            if not stored:
+                position = None
+                break
+            position = stored - 1
+            if self._mmap[base + offsets[position]:base + offsets[position + 1]] == data:
+                break
+            slot = (slot + 1) & mask
+        self._string_positions[value] = position
+        return position
+
+    def _bucket(self, record):
+        """还原歌曲名记录对应的_NameBucket，用于模糊匹配"""
+        bucket = self._buckets.get(record)
+        if bucket is None:
+            base = record * _RECORD_FIELDS
+            bucket = _NameBucket(self._name_records[base])
+            bucket.has_empty = bool(self._name_records[base + 1])
+            bucket.artists = [self._string(position) for position in
+                              self._artist_lists[self._name_records[base + 4]:self._name_records[base + 5]]]
+            self._buckets[record] = bucket
+        return bucket
+
+    def entry(self, position):
+        """返回指定位置的云盘条目"""
+        entry = self._entries.get(position)
+        if entry is None:
+            song_id, file_size, add_time = self._entry_numbers[position * 3:position * 3 + 3]
+            name, artist, matched_name, matched_artist = (
+                self._string(string_position) for string_position in self._entry_strings[position * 4:position * 4 + 4])
+            entry = self._entries[position] = CloudEntry(song_id, name, artist, matched_name, matched_artist,
+                                                         file_size, add_time)
+        return entry
+
+    def match(self, song):
+        """查找VIP歌曲在云盘中的匹配，返回值与CloudMusicIndex.match相同"""
+        match = self.match_position(song)
+        return None if match is None else (match[0], self.entry(match[1]))
+
+    def match_position(self, song):
+        """与match相同，但返回云盘条目的位置而不是条目本身"""
+        id_position = bisect_left(self._id_keys, song.id)
+        if id_position < len(self._id_keys) and self._id_keys[id_position] == song.id:
+            return 'id', self._id_positions[id_position]
+
+        name_position = self._find_string(normalize_song_name(song.name))
+        if name_position is None:
+            return None
+        record = self._name_of_string[name_position]
+        if record < 0:
+            return None
+
+        base = record * _RECORD_FIELDS
+        first_position = self._name_records[base]
+        normalized_artists = [normalize_artist_name(artist) for artist in song.artists]
+
+        # 精确匹配(歌曲名+艺术家)
+        artist_lists = self._artist_lists
+        exact_start, exact_end = self._name_records[base + 2], self._name_records[base + 3]
+        for normalized_artist in normalized_artists:
+            artist_position = self._find_string(normalized_artist)
+            if artist_position is not None:
+                found = bisect_left(artist_lists, artist_position, exact_start, exact_end)
+                if found < exact_end and artist_lists[found] == artist_position:
+                    return 'exact', first_position
+
+        # 只匹配歌曲名，再比较艺术家
+        bucket = self._bucket(record)
+        for normalized_artist in normalized_artists:
+            if bucket.matches_artist(normalized_artist):
+                return 'fuzzy', first_position
+
+        return None
+
+
+@metrics.timed('open_cloud_index')
+def open_cloud_index(cloud_music_info, path=None):
+    """返回云盘匹配索引
+
+    索引文件的指纹与当前云盘列表一致时直接用mmap打开；否则在内存中重建CloudMusicIndex并写入
+    索引文件供下次运行使用。索引文件无法读写时只使用内存索引。
+    """
+    path = path or CLOUD_INDEX_FILE
+    fingerprint = cloud_fingerprint(cloud_music_info)
+    if os.path.exists(path):
+        try:
+            index = MappedCloudIndex(path)
+            if index.fingerprint == fingerprint:
+                return index
+            index.close()
+        except (OSError, ValueError) as e:
+            print(f"云盘索引文件无法读取，将重新生成: {e}")
+
+    index = CloudMusicIndex(cloud_music_info)
+    try:
+        write_index_file(index, path, fingerprint)
+    except OSError as e:
+        print(f"保存云盘索引文件失败: {e}")
+    return index
@@ -6,59 +6,91 @@
 
 import os
 import json
-import requests
+import time
+import hashlib
 from datetime import datetime
-from crypto_utils import encrypted_request
-from utils import normalize_song_name, normalize_artist_name, format_timestamp, format_filesize, generate_timestamp
+from http_client import get_client, WeapiError
+from utils import format_timestamp, format_filesize, generate_timestamp
+import metrics
+from reports import Column, write_report
+from records import CloudEntry
+from song_detail import get_songs_detail
 
-# API地址
-BASE_URL = "https://music.163.com"
-CLOUD_MUSIC_URL = BASE_URL + "/weapi/v1/cloud/get"
-SONG_DETAIL_URL = BASE_URL + "/weapi/v3/song/detail"
-
-# 请求头
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Referer': 'https://music.163.com/',
-    'Content-Type': 'application/x-www-form-urlencoded',
-}
+# API路径
+CLOUD_MUSIC_PATH = "/weapi/v1/cloud/get"
 
 # Cookie文件路径
 COOKIE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cookie.json")
 
+# 云盘快照文件路径，登录后按账号分别保存
+CLOUD_SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cloud_snapshot.json")
 
-def get_cloud_music(limit=1000, offset=0, cookies=None):
-    """获取用户云盘音乐列表"""
+# 增量同步时每隔多久做一次全量核对（秒），用于发现已删除的云盘歌曲
+FULL_SYNC_INTERVAL = 7 * 24 * 3600
+
+
+def _request_cloud_page(limit, offset, cookies):
+    """请求一页云盘音乐，返回 (条目列表, 云盘总数)；请求失败时条目列表为None，以区别于空页"""
     data = {
         'limit': limit,
         'offset': offset,
         'csrf_token': ''
     }
     
+    try:
+        result = get_client().post(CLOUD_MUSIC_PATH, data, cookies=cookies)
+    except WeapiError as e:
+        print(f"获取云盘音乐失败（偏移 {offset}）: {e}")
+        return None, None
+    
+    if result.get('code') == 200:
+        return result.get('data', []), result.get('count')
+    print(f"获取云盘音乐失败（偏移 {offset}），错误码: {result.get('code')}")
+    return None, None
+
+
+def get_cloud_music(limit=1000, offset=0, cookies=None):
+    """获取用户云盘音乐列表"""
     if cookies is None:
         cookies = get_cookies()
-        
-    response = requests.post(CLOUD_MUSIC_URL, data=encrypted_request(data), headers=HEADERS, cookies=cookies)
-    result = response.json()
+    data, _ = _request_cloud_page(limit, offset, cookies)
+    return data or []
+
+
+def _get_cloud_page(limit, offset, cookies, checkpoint=None):
+    """获取一页云盘音乐，返回 (条目列表, 云盘总数)，请求失败时条目列表为None；传入checkpoint时复用已保存的分页"""
+    if checkpoint is None:
+        return _request_cloud_page(limit, offset, cookies)
     
-    if result.get('code') == 200:
-        return result.get('data', [])
-    return []
+    key = f"{offset}_{limit}"
+    page = checkpoint.load('cloud', key)
+    if page is None:
+        data, count = _request_cloud_page(limit, offset, cookies)
+        # 请求失败的分页不保存，保留断点状态以便继续
+        if data is None:
+            checkpoint.incomplete = True
+        else:
+            checkpoint.save('cloud', key, {'data': data, 'count': count})
+        return data, count
+    return page['data'], page['count']
+
 
+def _fetch_all_cloud_music(cookies, checkpoint=None):
+    """获取所有云盘音乐，返回 (条目列表, 是否完整)
 
-def get_all_cloud_music(cookies=None):
-    """获取所有云盘音乐"""
+    有分页请求失败，或获取到的条目少于接口返回的云盘总数时视为不完整。
+    """
     all_cloud_music = []
     limit = 1000
     offset = 0
-    
-    if cookies is None:
-        cookies = get_cookies()
+    total = None
     
     while True:
-        data = get_cloud_music(limit, offset, cookies)
-        if not data:
-            break
+        data, count = _get_cloud_page(limit, offset, cookies, checkpoint)
+        if data is None:
+            return all_cloud_music, False
+        if count is not None:
+            total = count
         
         all_cloud_music.extend(data)
         
@@ -68,31 +100,162 @@ def get_all_cloud_music(cookies=None):
         
         offset += limit
     
-    return all_cloud_music
+    complete = total is None or len(all_cloud_music) >= total
+    if not complete and checkpoint is not None:
+        checkpoint.incomplete = True
+    return all_cloud_music, complete
 
 
-def get_song_details(song_ids, cookies=None):
-    """获取歌曲详细信息"""
-    if not song_ids:
-        return {}
-    
+@metrics.timed('get_all_cloud_music')
+def get_all_cloud_music(cookies=None, checkpoint=None):
+    """获取所有云盘音乐，部分分页获取失败时返回已获取的部分并给出提示"""
     if cookies is None:
         cookies = get_cookies()
     
-    data = {
-        'c': '[' + ','.join([f'{{"id":{song_id}}}' for song_id in song_ids]) + ']',
-        'ids': '[' + ','.join([str(song_id) for song_id in song_ids]) + ']',
-        'csrf_token': ''
+    all_cloud_music, complete = _fetch_all_cloud_music(cookies, checkpoint)
+    if not complete:
+        print(f"警告: 云盘音乐列表获取不完整，只获取到 {len(all_cloud_music)} 首")
+    return all_cloud_music
+
+
+def _merge_cloud_entries(entries, fallback_entries):
+    """在获取到的条目后补上后备条目中没有出现的条目"""
+    keys = {_cloud_entry_key(item) for item in entries}
+    return entries + [item for item in fallback_entries if _cloud_entry_key(item) not in keys]
+
+
+def _cloud_entry_key(item):
+    """云盘条目的唯一标识"""
+    return (item.get('songId', 0), item.get('addTime', 0), item.get('fileName', '') or item.get('songName', ''))
+
+
+def cloud_snapshot_file(cookies=None):
+    """返回账号对应的云盘快照文件路径，以MUSIC_U Cookie的摘要区分账号，未登录时使用默认路径"""
+    music_u = (cookies or {}).get('MUSIC_U')
+    if not music_u:
+        return CLOUD_SNAPSHOT_FILE
+    account_key = hashlib.sha1(music_u.encode('utf-8')).hexdigest()[:16]
+    base, ext = os.path.splitext(CLOUD_SNAPSHOT_FILE)
+    return f"{base}_{account_key}{ext}"
+
+
+def load_cloud_snapshot(snapshot_file=None):
+    """从文件加载云盘快照"""
+    snapshot_file = snapshot_file or CLOUD_SNAPSHOT_FILE
+    try:
+        if os.path.exists(snapshot_file):
+            with open(snapshot_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"加载云盘快照失败: {e}")
+    return None
+
+
+def save_cloud_snapshot(snapshot, snapshot_file=None):
+    """保存云盘快照到文件"""
+    snapshot_file = snapshot_file or CLOUD_SNAPSHOT_FILE
+    try:
+        with open(snapshot_file, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        return True
+    except Exception as e:
+        print(f"保存云盘快照失败: {e}")
+        return False
+
+
+def _full_sync_cloud_music(cookies, snapshot, snapshot_file, checkpoint=None):
+    """全量获取云盘音乐并保存为新快照，获取不完整时不更新快照，返回与原快照合并后的列表"""
+    print("正在全量同步云盘音乐...")
+    entries, complete = _fetch_all_cloud_music(cookies, checkpoint)
+    if not complete:
+        # 不完整的列表不能作为快照，否则缺少的歌曲在下次全量核对前都会被当作不在云盘中
+        print(f"警告: 云盘音乐列表获取不完整（{len(entries)} 首），本次不更新云盘快照")
+        return _merge_cloud_entries(entries, snapshot['entries'] if snapshot else [])
+    snapshot = {
+        'watermark': max([item.get('addTime', 0) for item in entries], default=0),
+        'last_full_sync': time.time(),
+        'entries': entries,
     }
+    save_cloud_snapshot(snapshot, snapshot_file)
+    return entries
+
+
+@metrics.timed('sync_cloud_music')
+def sync_cloud_music(cookies=None, full=False, snapshot_file=None, checkpoint=None):
+    """增量同步云盘音乐
+
+    云盘列表按添加时间从新到旧返回，因此只需从第一页开始获取，
+    遇到早于快照中addTime水位线的条目即可停止，新条目合并到本地快照。
+    快照按账号分别保存；full为True、超过FULL_SYNC_INTERVAL未做全量核对，或合并后的条目数
+    与接口返回的云盘总数不一致（如有歌曲被删除）时改为全量获取。
+    有分页请求失败时不更新快照，返回已获取的条目与原快照合并后的列表。
+    """
+    if cookies is None:
+        cookies = get_cookies()
     
-    response = requests.post(SONG_DETAIL_URL, data=encrypted_request(data), headers=HEADERS, cookies=cookies)
-    result = response.json()
+    snapshot_file = snapshot_file or cloud_snapshot_file(cookies)
+    snapshot = load_cloud_snapshot(snapshot_file)
+    if full or not snapshot or time.time() - snapshot.get('last_full_sync', 0) > FULL_SYNC_INTERVAL:
+        return _full_sync_cloud_music(cookies, snapshot, snapshot_file, checkpoint)
     
-    if result.get('code') == 200:
-        songs = result.get('songs', [])
-        return {song['id']: song for song in songs}
+    watermark = snapshot.get('watermark', 0)
+    known_keys = {_cloud_entry_key(item) for item in snapshot['entries']}
+    new_entries = []
+    total = None
+    limit = 1000
+    offset = 0
+    
+    while True:
+        data, count = _get_cloud_page(limit, offset, cookies, checkpoint)
+        if data is None:
+            # 水位线之后的新条目可能没有取全，不更新快照，下次运行重新同步
+            print("警告: 增量同步未完成，本次不更新云盘快照")
+            return new_entries + snapshot['entries']
+        if total is None:
+            total = count
+        reached_known = False
+        for item in data:
+            add_time = item.get('addTime', 0)
+            if add_time < watermark:
+                reached_known = True
+                break
+            if _cloud_entry_key(item) not in known_keys:
+                new_entries.append(item)
+        
+        if reached_known or len(data) < limit:
+            break
+        offset += limit
+    
+    entries = new_entries + snapshot['entries']
+    if total is not None and len(entries) != total:
+        print(f"云盘共有 {total} 首音乐，与快照合并后的 {len(entries)} 首不一致，改为全量同步")
+        return _full_sync_cloud_music(cookies, snapshot, snapshot_file, checkpoint)
+    
+    print(f"增量同步完成，新增 {len(new_entries)} 首云盘音乐")
+    if new_entries:
+        snapshot['entries'] = entries
+        snapshot['watermark'] = max(watermark, max(item.get('addTime', 0) for item in new_entries))
+        save_cloud_snapshot(snapshot, snapshot_file)
+    
+    return entries
+
+
+@metrics.timed('get_song_details')
+def get_song_details(song_ids, cookies=None, cache=None, checkpoint=None):
+    """获取云盘匹配歌曲的详细信息，返回 {歌曲ID: Track}
+
+    同一首歌曲可能被上传多次，ID先去重，再交给与歌单相同的分批并发获取逻辑；
+    比对只需要名称和艺术家，缓存命中的歌曲不再请求。部分批次失败时返回已获取的部分。
+    """
+    song_ids = list(dict.fromkeys(song_ids))
+    if not song_ids:
+        return {}
+    
+    if cookies is None:
+        cookies = get_cookies()
     
-    return {}
+    songs = get_songs_detail(song_ids, cookies, cache=cache, checkpoint=checkpoint, with_fees=False)
+    return {song.id: song for song in songs}
 
 
 def save_cookies(cookies):
@@ -142,94 +305,79 @@ def get_cookies():
     return cookies
 
 
-def save_cloud_music_to_markdown(cloud_music_info):
-    """将云盘音乐列表保存为Markdown文件"""
+# 云盘音乐报告的列，没有匹配信息时显示原始信息
+CLOUD_MUSIC_COLUMNS = [
+    Column('歌曲ID', 'song_id', 'song_id', markdown=False),
+    Column('原始歌曲名称', 'name', 'name', separator='------------'),
+    Column('原始艺术家', 'artist', 'artist', separator='----------'),
+    Column('匹配歌曲名称', 'matched_name', lambda song: song.matched_name or song.name, separator='------------'),
+    Column('匹配艺术家', 'matched_artist', lambda song: song.matched_artist or song.artist, separator='----------'),
+    Column('文件大小', 'file_size', 'file_size', display=format_filesize, separator='---------'),
+    Column('添加时间', 'add_time', 'add_time', display=format_timestamp),
+]
+
+
+@metrics.timed('save_cloud_music_to_markdown')
+def save_cloud_music_to_markdown(cloud_music_info, formats=None):
+    """将云盘音乐列表保存为报告文件，返回第一个报告的文件名
+
+    cloud_music_info可以是任意可迭代对象；无法预先得到总数时，总计写在Markdown末尾。
+    """
     timestamp = generate_timestamp()
-    filename = f"云盘音乐列表_{timestamp}.md"
+    base_name = f"云盘音乐列表_{timestamp}"
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(f"# 网易云音乐云盘音乐列表\n\n")
-        f.write(f"提取时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"总计: {len(cloud_music_info)} 首歌曲\n\n")
-        
-        f.write("| 序号 | 原始歌曲名称 | 原始艺术家 | 匹配歌曲名称 | 匹配艺术家 | 文件大小 | 添加时间 |\n")
-        f.write("|------|------------|----------|------------|----------|---------|--------|\n")
-        
-        for i, song in enumerate(cloud_music_info, 1):
-            # 原始信息
-            original_name = song.get('name', '')
-            original_artist = song.get('artist', '')
-            
-            # 匹配信息
-            matched_name = song.get('matched_name', '') or original_name
-            matched_artist = song.get('matched_artist', '') or original_artist
-            
-            # 格式化信息
-            file_size_str = format_filesize(song.get('fileSize', 0))
-            add_time_str = format_timestamp(song.get('addTime', 0))
-            
-            f.write(f"| {i} | {original_name} | {original_artist} | {matched_name} | {matched_artist} | {file_size_str} | {add_time_str} |\n")
-    
-    print(f"已将{len(cloud_music_info)}首云盘音乐信息保存到文件: {filename}")
-    return filename
-
-
-def extract_cloud_music_info(cookies=None):
-    """提取云盘音乐信息"""
+    header_lines = [
+        "# 网易云音乐云盘音乐列表\n\n",
+        f"提取时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+    ]
+    footer_lines = None
+    if hasattr(cloud_music_info, '__len__'):
+        header_lines.append(f"总计: {len(cloud_music_info)} 首歌曲\n\n")
+    else:
+        header_lines.append("\n")
+        footer_lines = lambda count: [f"\n总计: {count} 首歌曲\n"]
+    
+    filenames, count = write_report(base_name, CLOUD_MUSIC_COLUMNS, cloud_music_info, header_lines,
+                                    footer_lines, formats=formats)
+    
+    print(f"已将{count}首云盘音乐信息保存到文件: {', '.join(filenames)}")
+    return filenames[0]
+
+
+@metrics.timed('extract_cloud_music_info')
+def extract_cloud_music_info(cookies=None, cache=None, incremental=False, checkpoint=None, full_sync=False):
+    """提取云盘音乐信息，返回CloudEntry列表；incremental为True时基于本地快照增量同步
+
+    full_sync为True时忽略快照重新全量同步，并用结果刷新快照。
+    传入checkpoint时已获取的云盘分页保存到断点状态中。
+    """
     print("正在获取云盘音乐列表...")
     
     if cookies is None:
         cookies = get_cookies()
-        
-    cloud_music_list = get_all_cloud_music(cookies)
+    
+    if incremental or full_sync:
+        cloud_music_list = sync_cloud_music(cookies, full=full_sync, checkpoint=checkpoint)
+    else:
+        cloud_music_list = get_all_cloud_music(cookies, checkpoint=checkpoint)
     
     print(f"共找到 {len(cloud_music_list)} 首云盘音乐")
     
-    # 收集所有已匹配的歌曲ID
-    song_ids = []
-    for item in cloud_music_list:
-        # 检查是否有匹配的歌曲ID
-        if 'songId' in item and item['songId']:
-            song_ids.append(item['songId'])
+    # 收集所有已匹配的歌曲ID，同一首歌曲上传多次时只保留一个
+    song_ids = list(dict.fromkeys(item['songId'] for item in cloud_music_list if item.get('songId')))
     
     # 获取歌曲详细信息
     print("正在获取匹配的歌曲详细信息...")
-    song_details = get_song_details(song_ids, cookies)
+    song_details = get_song_details(song_ids, cookies, cache=cache, checkpoint=checkpoint)
     print(f"成功获取 {len(song_details)} 首匹配歌曲的详细信息")
+    if len(song_details) < len(song_ids):
+        print(f"{len(song_ids) - len(song_details)} 首匹配歌曲的详细信息获取失败，将使用云盘中的原始信息比对")
     
-    # 提取歌曲信息
+    # 提取歌曲信息，同时记录网易云匹配到的歌曲
     cloud_music_info = []
     for item in cloud_music_list:
-        song_name = item.get('songName', '')
-        artist_name = item.get('artist', '')
-        
-        # 标准化歌曲名称和艺术家名称
-        normalized_name = normalize_song_name(song_name)
-        normalized_artist = normalize_artist_name(artist_name)
-        
-        # 获取匹配的歌曲信息
-        matched_name = ""
-        matched_artist = ""
-        if 'songId' in item and item['songId'] and item['songId'] in song_details:
-            song_detail = song_details[item['songId']]
-            matched_name = song_detail.get('name', '')
-            artists = song_detail.get('ar', [])
-            # 安全处理艺术家列表，过滤掉None值
-            if artists:
-                artist_names = [artist.get('name', '') for artist in artists if artist is not None and artist.get('name') is not None]
-                matched_artist = ', '.join(artist_names)
-        
-        cloud_music_info.append({
-            'name': song_name,
-            'artist': artist_name,
-            'normalized_name': normalized_name,
-            'normalized_artist': normalized_artist,
-            'matched_name': matched_name,
-            'matched_artist': matched_artist,
-            'fileSize': item.get('fileSize', 0),
-            'addTime': item.get('addTime', 0),
-            'songId': item.get('songId', 0)
-        })
+        matched_track = song_details.get(item['songId']) if item.get('songId') else None
+        cloud_music_info.append(CloudEntry.from_api(item, matched_track))
     
     return cloud_music_info
 
@@ -242,5 +390,5 @@ if __name__ == "__main__":
     
     print(f"云盘音乐列表：")
     for i, song in enumerate(cloud_music_info, 1):
-        matched_info = f" (匹配: {song['matched_name']} - {song['matched_artist']})" if song['matched_name'] else ""
-        print(f"{i}. {song['name']} - {song['artist']}{matched_info}") 
\ No newline at end of file
+        matched_info = f" (匹配: {song.matched_name} - {song.matched_artist})" if song.matched_name else ""
+        print(f"{i}. {song.name} - {song.artist}{matched_info}") 
\ No newline at end of file
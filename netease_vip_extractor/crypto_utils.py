@@ -3,9 +3,12 @@
 
 import os
 import json
+import time
 import base64
-from Crypto.Cipher import AES
+import threading
+from functools import lru_cache
 from binascii import hexlify
+import metrics
 
 # AES加密相关参数
 MODULUS = '00e0b509f6259df8642dbc35662901477df22677ec152b5ff68ace615bb7b725152b3ab17a876aea8a5aa76d2e417629ec4ee341f56135fccf695280104e0312ecbda92557c93870114af6c9d05c4f7f0c3685b7a46bee255932575cce10b424d813cfe4875d3e82047b97ddef52741d546b8e289dc6935b3ece0462db0a22b8e7'
@@ -14,35 +17,107 @@ PUBKEY = '010001'
 IV = '0102030405060708'
 
 
+# 预先解析的常量
+_MODULUS_INT = int(MODULUS, 16)
+_PUBKEY_INT = int(PUBKEY, 16)
+_NONCE_BYTES = NONCE.encode()
+_IV_BYTES = IV.encode()
+
+# 密钥复用的默认参数：每对密钥最多使用的次数和时长（秒）
+KEY_MAX_USES = 1000
+KEY_MAX_AGE = 600
+
+
 def create_secret_key(size):
     """生成指定长度的随机字符串作为密钥"""
     return hexlify(os.urandom(size))[:16].decode('utf-8')
 
 
+_AES = None
+
+
+def _load_aes():
+    """首次加密时才导入PyCryptodome，不发请求的路径无需加载"""
+    global _AES
+    from Crypto.Cipher import AES
+    _AES = AES
+    return AES
+
+
+def _aes_encrypt_bytes(data, key):
+    """对字节数据做PKCS7填充和AES-CBC加密，返回base64编码的字节"""
+    pad = 16 - len(data) % 16
+    aes = _AES or _load_aes()
+    encryptor = aes.new(key, aes.MODE_CBC, _IV_BYTES)
+    return base64.b64encode(encryptor.encrypt(data + bytes([pad]) * pad))
+
+
 def aes_encrypt(text, key):
     """AES加密"""
-    pad = 16 - len(text) % 16
-    text = text + chr(pad) * pad
-    encryptor = AES.new(key.encode(), AES.MODE_CBC, IV.encode())
-    encrypt_text = encryptor.encrypt(text.encode())
-    encrypt_text = base64.b64encode(encrypt_text).decode('utf-8')
-    return encrypt_text
+    return _aes_encrypt_bytes(text.encode(), key.encode()).decode('utf-8')
+
+
+@lru_cache(maxsize=8)
+def _parse_hex(value):
+    return int(value, 16)
 
 
 def rsa_encrypt(text, pubkey, modulus):
     """RSA加密"""
     text = text[::-1]
-    rs = pow(int(hexlify(text.encode('utf-8')), 16), int(pubkey, 16), int(modulus, 16))
+    rs = pow(int(hexlify(text.encode('utf-8')), 16), _parse_hex(pubkey), _parse_hex(modulus))
     return format(rs, 'x').zfill(256)
 
 
-def encrypted_request(text):
-    """加密请求数据"""
-    text = json.dumps(text)
-    sec_key = create_secret_key(16)
-    enc_text = aes_encrypt(aes_encrypt(text, NONCE), sec_key)
-    enc_sec_key = rsa_encrypt(sec_key, PUBKEY, MODULUS)
+@lru_cache(maxsize=64)
+def _enc_sec_key(sec_key):
+    """计算密钥对应的encSecKey，结果缓存以便同一密钥重复使用"""
+    rs = pow(int(hexlify(sec_key[::-1].encode('utf-8')), 16), _PUBKEY_INT, _MODULUS_INT)
+    return format(rs, 'x').zfill(256)
+
+
+class SecretKeyPool:
+    """复用 (secKey, encSecKey)，每对密钥使用max_uses次或max_age秒后更换，省去每次请求的RSA运算"""
+
+    def __init__(self, max_uses=KEY_MAX_USES, max_age=KEY_MAX_AGE):
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._key = None
+        self._uses = 0
+        self._created = 0.0
+
+    def get(self):
+        """返回当前可用的 (secKey, encSecKey)"""
+        with self._lock:
+            now = time.monotonic()
+            if self._key is None or self._uses >= self.max_uses or now - self._created > self.max_age:
+                sec_key = create_secret_key(16)
+                self._key = (sec_key, _enc_sec_key(sec_key))
+                self._uses = 0
+                self._created = now
+            self._uses += 1
+            return self._key
+
+
+@metrics.timed('encrypted_request')
+def encrypted_request(text, sec_key=None, key_pool=None):
+    """加密请求数据
+
+    sec_key为空时从key_pool获取密钥；两者都为空时为本次请求随机生成密钥。
+    """
+    if sec_key is not None:
+        enc_sec_key = _enc_sec_key(sec_key)
+    elif key_pool is not None:
+        sec_key, enc_sec_key = key_pool.get()
+    else:
+        sec_key = create_secret_key(16)
+        enc_sec_key = rsa_encrypt(sec_key, PUBKEY, MODULUS)
+    
+    # json.dumps默认只输出ASCII字符，全程以字节处理
+    data = json.dumps(text).encode('ascii')
+    params = _aes_encrypt_bytes(_aes_encrypt_bytes(data, _NONCE_BYTES), sec_key.encode())
     return {
-        'params': enc_text,
+        'params': params.decode('ascii'),
         'encSecKey': enc_sec_key
-    } 
\ No newline at end of file
+    }
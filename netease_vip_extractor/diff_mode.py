@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+差异模式，只报告与上次运行相比发生变化的歌曲
+
+每个歌单保存一份快照，记录每首歌曲的fee状态、VIP类型和云盘匹配结果。再次运行时只重新查询
+新增或状态过期的歌曲；云盘列表没有变化时，未变化歌曲直接沿用上次的匹配结果。
+"""
+
+import os
+import json
+import time
+from datetime import datetime
+from cloud_music import extract_cloud_music_info
+from extract_by_id import get_playlist_detail, get_songs_detail, get_song_urls, find_vip_songs
+from cloud_index import cloud_fingerprint, open_cloud_index
+from records import Track, UrlInfo
+from reports import Column, write_report
+from utils import generate_timestamp
+
+# 歌单快照目录
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "playlist_snapshots")
+
+# fee状态超过该时长（秒）未重新查询即视为过期
+STALE_AFTER = 7 * 24 * 3600
+
+# 变化类型
+ADDED = '新增'
+VIP_CHANGED = 'VIP状态变化'
+NEWLY_COVERED = '云盘新覆盖'
+NO_LONGER_COVERED = '云盘不再覆盖'
+REMOVED = '移出歌单'
+
+MATCH_LABELS = {'id': 'ID精确匹配', 'exact': '名称精确匹配', 'fuzzy': '模糊匹配'}
+
+
+class TrackChange:
+    """一条变化记录，detail为变化说明"""
+
+    __slots__ = ('change', 'id', 'name', 'artists', 'vip_type', 'detail')
+
+    def __init__(self, change, song, vip_type, detail=''):
+        self.change = change
+        self.id = song.id
+        self.name = song.name
+        self.artists = song.artists
+        self.vip_type = vip_type
+        self.detail = detail
+
+
+CHANGE_COLUMNS = [
+    Column('变化', 'change', 'change'),
+    Column('歌曲ID', 'id', 'id', markdown=False),
+    Column('歌曲名称', 'name', 'name'),
+    Column('艺术家', 'artists', 'artists', display=', '.join),
+    Column('VIP类型', 'vip_type', 'vip_type', display=lambda vip_type: vip_type or '非VIP'),
+    Column('说明', 'detail', 'detail'),
+]
+
+
+def snapshot_path(playlist_id, snapshot_dir=None):
+    return os.path.join(snapshot_dir or SNAPSHOT_DIR, f"{playlist_id}.json")
+
+
+def load_playlist_snapshot(playlist_id, snapshot_dir=None):
+    """加载歌单快照，不存在或损坏时返回None"""
+    path = snapshot_path(playlist_id, snapshot_dir)
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"加载歌单快照失败: {e}")
+    return None
+
+
+def save_playlist_snapshot(playlist_id, snapshot, snapshot_dir=None):
+    """保存歌单快照，先写临时文件再替换"""
+    path = snapshot_path(playlist_id, snapshot_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        return True
+    except Exception as e:
+        print(f"保存歌单快照失败: {e}")
+        return False
+
+
+def _restore(track_id, entry):
+    """从快照条目还原Track和UrlInfo"""
+    song = Track(track_id, entry['name'], tuple(entry['artists']), entry['fee'], entry['privilege_fee'])
+    url_info = None
+    if entry.get('url_fee') is not None or entry.get('trial'):
+        url_info = UrlInfo(track_id, entry.get('url_fee'), entry.get('trial', False))
+    return song, url_info
+
+
+def run_diff(playlist_id, cookies, cache=None, stale_after=STALE_AFTER, snapshot_dir=None, full_sync=False):
+    """以差异模式处理歌单，保存变化报告并更新快照，返回 (歌单名称, 变化记录列表)"""
+    print("正在获取歌单详情...")
+    playlist_name, track_ids = get_playlist_detail(playlist_id, cookies)
+    print(f"歌单名称: {playlist_name}")
+    print(f"共找到 {len(track_ids)} 首歌曲")
+    if not track_ids:
+        print("歌单中没有歌曲")
+        return playlist_name, []
+
+    snapshot = load_playlist_snapshot(playlist_id, snapshot_dir)
+    previous = snapshot['tracks'] if snapshot else {}
+    now = time.time()
+
+    # 只重新查询新增和状态过期的歌曲，其余歌曲沿用快照中的fee状态
+    new_ids = [track_id for track_id in track_ids if str(track_id) not in previous]
+    stale_ids = [track_id for track_id in track_ids
+                 if str(track_id) in previous and now - previous[str(track_id)]['checked_at'] > stale_after]
+    refresh_ids = new_ids + stale_ids
+    print(f"新增 {len(new_ids)} 首，状态过期 {len(stale_ids)} 首，需要查询 {len(refresh_ids)} 首")
+
+    songs_by_id = {}
+    song_urls = {}
+    refreshed = set(refresh_ids)
+    for track_id in track_ids:
+        if track_id not in refreshed:
+            song, url_info = _restore(track_id, previous[str(track_id)])
+            songs_by_id[track_id] = song
+            if url_info is not None:
+                song_urls[track_id] = url_info
+    fetched = set()
+    if refresh_ids:
+        print("正在获取歌曲详情...")
+        # 新增和过期歌曲一次请求，不读缓存以取得最新的fee状态，名称和艺术家再写入缓存
+        refreshed_songs = get_songs_detail(refresh_ids, cookies)
+        if cache is not None:
+            cache.put_many(refreshed_songs)
+        for song in refreshed_songs:
+            songs_by_id[song.id] = song
+        print("正在判断VIP歌曲...")
+        song_urls.update(get_song_urls(refresh_ids, cookies))
+        fetched = {track_id for track_id in refresh_ids if track_id in songs_by_id}
+        # 查询失败的过期歌曲沿用快照中的状态，下次运行时再查询
+        for track_id in stale_ids:
+            if track_id not in fetched:
+                song, url_info = _restore(track_id, previous[str(track_id)])
+                songs_by_id[track_id] = song
+                if url_info is not None:
+                    song_urls[track_id] = url_info
+
+    songs = [songs_by_id[track_id] for track_id in track_ids if track_id in songs_by_id]
+    vip_songs = find_vip_songs(songs, song_urls)
+    vip_types = {song.id: song.vip_type for song in vip_songs}
+    print(f"找到 {len(vip_songs)} 首VIP歌曲")
+
+    # 云盘列表未变化时，fee状态未重新查询的歌曲沿用上次的匹配结果
+    cloud_music_info = extract_cloud_music_info(cookies, cache=cache, incremental=True, full_sync=full_sync)
+    fingerprint = cloud_fingerprint(cloud_music_info)
+    cloud_unchanged = snapshot is not None and snapshot.get('cloud_fingerprint') == fingerprint
+
+    index = None
+    cloud_results = {}
+    reused = 0
+    for song in vip_songs:
+        entry = previous.get(str(song.id))
+        if cloud_unchanged and entry is not None and song.id not in fetched and entry.get('vip_type'):
+            cloud_results[song.id] = entry.get('cloud')
+            reused += 1
+            continue
+        if index is None:
+            index = open_cloud_index(cloud_music_info)
+        match = index.match(song)
+        cloud_results[song.id] = match[0] if match else None
+    print(f"云盘比对: 沿用上次结果 {reused} 首，重新比对 {len(vip_songs) - reused} 首")
+
+    changes = []
+    if snapshot is not None:
+        for song in songs:
+            entry = previous.get(str(song.id))
+            vip_type = vip_types.get(song.id, '')
+            if entry is None:
+                detail = MATCH_LABELS.get(cloud_results.get(song.id), '') if vip_type else ''
+                changes.append(TrackChange(ADDED, song, vip_type, f"云盘已有（{detail}）" if detail else ''))
+                continue
+            if entry.get('vip_type', '') != vip_type:
+                changes.append(TrackChange(VIP_CHANGED, song, vip_type,
+                                           f"{entry.get('vip_type') or '非VIP'} → {vip_type or '非VIP'}"))
+            elif vip_type:
+                old_cloud, new_cloud = entry.get('cloud'), cloud_results.get(song.id)
+                if old_cloud is None and new_cloud is not None:
+                    changes.append(TrackChange(NEWLY_COVERED, song, vip_type, MATCH_LABELS[new_cloud]))
+                elif old_cloud is not None and new_cloud is None:
+                    changes.append(TrackChange(NO_LONGER_COVERED, song, vip_type))
+
+        current_ids = set(songs_by_id)
+        for key, entry in previous.items():
+            if int(key) not in current_ids:
+                song, _ = _restore(int(key), entry)
+                changes.append(TrackChange(REMOVED, song, entry.get('vip_type', '')))
+
+    # 更新快照
+    tracks = {}
+    for song in songs:
+        entry = previous.get(str(song.id))
+        url_info = song_urls.get(song.id)
+        tracks[str(song.id)] = {
+            'name': song.name,
+            'artists': list(song.artists),
+            'fee': song.fee,
+            'privilege_fee': song.privilege_fee,
+            'url_fee': url_info.fee if url_info is not None else None,
+            'trial': url_info.trial if url_info is not None else False,
+            'vip_type': vip_types.get(song.id, ''),
+            'cloud': cloud_results.get(song.id),
+            'checked_at': now if song.id in fetched or entry is None else entry['checked_at'],
+        }
+    save_playlist_snapshot(playlist_id, {
+        'playlist_id': playlist_id,
+        'name': playlist_name,
+        'time': now,
+        'cloud_fingerprint': fingerprint,
+        'tracks': tracks,
+    }, snapshot_dir)
+
+    if snapshot is None:
+        print("没有找到该歌单的上次快照，本次结果已记录为比较基准")
+        return playlist_name, changes
+
+    if snapshot.get('time'):
+        print(f"上次运行时间: {datetime.fromtimestamp(snapshot['time']).strftime('%Y-%m-%d %H:%M:%S')}")
+    if not changes:
+        print("与上次运行相比没有变化")
+        return playlist_name, changes
+
+    counts = {}
+    for change in changes:
+        counts[change.change] = counts.get(change.change, 0) + 1
+    print("变化: " + '，'.join(f"{change} {count} 首" for change, count in counts.items()))
+
+    header_lines = [
+        f"# {playlist_name} - 变化列表\n\n",
+        f"提取时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        f"上次运行: {datetime.fromtimestamp(snapshot.get('time', now)).strftime('%Y-%m-%d %H:%M:%S')}\n\n",
+    ]
+    filenames, _ = write_report(f"{playlist_name}_vip_changes_{generate_timestamp()}", CHANGE_COLUMNS, changes,
+                                header_lines)
+    print(f"变化列表已保存到 {', '.join(filenames)}")
+    return playlist_name, changes
@@ -5,262 +5,359 @@
 """
 
 import json
-import requests
-import sys
+import argparse
 from datetime import datetime
-from crypto_utils import encrypted_request
+from http_client import get_client, WeapiError
 from cloud_music import extract_cloud_music_info, save_cloud_music_to_markdown, get_cookies
-from utils import normalize_song_name, normalize_artist_name, similarity, generate_timestamp
-from utils import save_playlist_id, get_playlist_id
+from utils import generate_timestamp
+from utils import save_playlist_id, get_playlist_id, chunk_list, run_batches
+from utils import load_config, set_version_tags
+from song_cache import get_default_cache
+from song_detail import get_songs_detail
+from matcher import CloudMusicIndex, match_all
+from cloud_index import open_cloud_index
+from records import UrlInfo
+import metrics
+from checkpoint import RunCheckpoint
+from reports import Column, write_report, parse_formats, set_report_formats
+from vip_classifier import MEMBER_ONLY, classify_tracks, select_tracks, true_indices
 
-# API地址
-BASE_URL = "https://music.163.com"
-PLAYLIST_DETAIL_URL = BASE_URL + "/weapi/v6/playlist/detail"
-SONG_DETAIL_URL = BASE_URL + "/weapi/v3/song/detail"
-SONG_URL_URL = BASE_URL + "/weapi/song/enhance/player/url"
+# API路径
+PLAYLIST_DETAIL_PATH = "/weapi/v6/playlist/detail"
+SONG_URL_PATH = "/weapi/song/enhance/player/url"
 
-# 请求头
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Referer': 'https://music.163.com/',
-    'Content-Type': 'application/x-www-form-urlencoded',
-}
+# 歌单详情中一次返回的歌曲详情数量
+PLAYLIST_TRACK_LIMIT = 1000
 
+# 歌曲URL分组请求参数
+URL_CHUNK_SIZE = 500
+URL_MAX_WORKERS = 4
+URL_MAX_RETRIES = 2
 
-def get_playlist_detail(playlist_id, cookies=None):
-    """获取歌单详情"""
+
+def _fetch_playlist(playlist_id, cookies=None, track_limit=PLAYLIST_TRACK_LIMIT):
+    """请求歌单详情，返回playlist字段，失败时返回None"""
     data = {
         'id': playlist_id,
-        'n': 1000,
+        'n': track_limit,
         'csrf_token': ''
     }
-    response = requests.post(PLAYLIST_DETAIL_URL, data=encrypted_request(data), headers=HEADERS, cookies=cookies)
-    result = response.json()
+    try:
+        result = get_client().post(PLAYLIST_DETAIL_PATH, data, cookies=cookies)
+    except WeapiError as e:
+        print(f"获取歌单详情失败: {e}")
+        return None
     if result.get('code') == 200:
-        playlist_name = result.get('playlist', {}).get('name', '未知歌单')
-        tracks = result.get('playlist', {}).get('tracks', [])
-        track_ids = [track['id'] for track in tracks]
-        trackCount = result.get('playlist', {}).get('trackCount', 0)
-        
-        # 如果歌单中的歌曲数量大于获取到的歌曲数量，可能需要多次请求
-        if trackCount > len(tracks) and 'trackIds' in result.get('playlist', {}):
-            print(f"歌单中实际有 {trackCount} 首歌曲，但API只返回了 {len(tracks)} 首，将尝试获取更多...")
-            all_track_ids = []
-            for track_id_obj in result['playlist']['trackIds']:
-                all_track_ids.append(track_id_obj['id'])
-            return playlist_name, all_track_ids
-        
-        return playlist_name, track_ids
-    return "未知歌单", []
-
-
-def get_songs_detail(track_ids, cookies=None):
-    """获取歌曲详情"""
-    songs = []
-    # 由于API限制，每次最多获取1000首歌曲，所以需要分批请求
-    for i in range(0, len(track_ids), 1000):
-        batch_ids = track_ids[i:i+1000]
-        data = {
-            'c': '[' + ','.join([f'{{"id":{track_id}}}' for track_id in batch_ids]) + ']',
-            'ids': '[' + ','.join([str(track_id) for track_id in batch_ids]) + ']',
-            'csrf_token': ''
-        }
-        response = requests.post(SONG_DETAIL_URL, data=encrypted_request(data), headers=HEADERS, cookies=cookies)
-        result = response.json()
-        if result.get('code') == 200:
-            songs.extend(result.get('songs', []))
-    return songs
-
-
-def get_song_urls(track_ids, cookies=None):
-    """获取歌曲URL，以判断是否需要VIP"""
-    data = {
-        'ids': '[' + ','.join([str(track_id) for track_id in track_ids]) + ']',
+        return result.get('playlist', {})
+    print(f"获取歌单详情失败，错误码: {result.get('code')}")
+    return None
+
+
+def _iter_track_ids(playlist_id, playlist, track_count, cookies=None):
+    """逐个产出歌单中的歌曲ID，必要时补充请求，并检查数量是否与trackCount一致"""
+    seen = set()
+    
+    def new_ids(items):
+        for item in items:
+            track_id = item['id']
+            if track_id not in seen:
+                seen.add(track_id)
+                yield track_id
+    
+    # trackIds包含完整的歌曲ID列表，tracks只包含前n首歌曲的详情
+    yield from new_ids(playlist.get('trackIds') or [])
+    yield from new_ids(playlist.get('tracks') or [])
+    
+    # trackIds已经是完整列表，数量仍少于trackCount时是歌单中有已失效的歌曲，重新请求也不会更多；
+    # 只有响应中没有trackIds时才按歌曲总数重新请求
+    if len(seen) < track_count and 'trackIds' not in playlist:
+        print(f"歌单中实际有 {track_count} 首歌曲，但API只返回了 {len(seen)} 首，将尝试获取更多...")
+        full_playlist = _fetch_playlist(playlist_id, cookies, track_limit=track_count)
+        if full_playlist:
+            yield from new_ids(full_playlist.get('trackIds') or [])
+            yield from new_ids(full_playlist.get('tracks') or [])
+    
+    if len(seen) != track_count:
+        print(f"警告: 歌单显示有 {track_count} 首歌曲，实际获取到 {len(seen)} 首")
+
+
+def open_playlist(playlist_id, cookies=None):
+    """打开歌单，返回 (歌单名称, 歌曲总数, 歌曲ID生成器)
+
+    生成器按歌单顺序逐个产出去重后的歌曲ID，后续阶段无需等待枚举完成即可开始处理。
+    """
+    playlist = _fetch_playlist(playlist_id, cookies)
+    if playlist is None:
+        return "未知歌单", 0, iter(())
+    playlist_name = playlist.get('name', '未知歌单')
+    track_count = playlist.get('trackCount', 0)
+    return playlist_name, track_count, _iter_track_ids(playlist_id, playlist, track_count, cookies)
+
+
+@metrics.timed('get_playlist_detail')
+def get_playlist_detail(playlist_id, cookies=None, checkpoint=None):
+    """获取歌单详情，传入checkpoint时复用已保存的歌单名称和歌曲ID"""
+    if checkpoint is not None:
+        saved = checkpoint.load('playlist', playlist_id)
+        if saved is not None:
+            return saved['name'], saved['track_ids']
+    
+    playlist_name, _, track_ids = open_playlist(playlist_id, cookies)
+    track_ids = list(track_ids)
+    if checkpoint is not None and track_ids:
+        checkpoint.save('playlist', playlist_id, {'name': playlist_name, 'track_ids': track_ids})
+    return playlist_name, track_ids
+
+
+def song_urls_request(chunk_ids):
+    """单组歌曲URL的请求数据"""
+    return {
+        'ids': '[' + ','.join([str(track_id) for track_id in chunk_ids]) + ']',
         'br': 320000,  # 比特率
         'csrf_token': ''
     }
-    response = requests.post(SONG_URL_URL, data=encrypted_request(data), headers=HEADERS, cookies=cookies)
-    result = response.json()
-    if result.get('code') == 200:
-        return {item['id']: item for item in result.get('data', [])}
-    return {}
 
 
-def save_to_markdown(playlist_name, vip_songs, filtered=False):
-    """将VIP歌曲信息保存为Markdown文件"""
+def _fetch_song_urls_chunk(chunk_ids, cookies=None):
+    """获取单组歌曲URL信息，接口返回错误码时抛出异常"""
+    result = get_client().post(SONG_URL_PATH, song_urls_request(chunk_ids), cookies=cookies)
+    if result.get('code') != 200:
+        raise RuntimeError(f"接口返回错误码: {result.get('code')}")
+    return result.get('data', [])
+
+
+@metrics.timed('get_song_urls')
+def get_song_urls(track_ids, cookies=None, chunk_size=URL_CHUNK_SIZE, max_workers=URL_MAX_WORKERS, max_retries=URL_MAX_RETRIES,
+                  checkpoint=None):
+    """获取歌曲URL，以判断是否需要VIP，返回 {歌曲ID: UrlInfo}；传入checkpoint时跳过已完成的分组"""
+    # 分组并发请求，避免一次请求携带整个歌单的ID
+    chunks = chunk_list(track_ids, chunk_size)
+    fetch = lambda chunk: _fetch_song_urls_chunk(chunk, cookies)
+    if checkpoint is not None:
+        fetch = checkpoint.cached('urls', fetch)
+    results, failures = run_batches(fetch, chunks, max_workers=max_workers, max_retries=max_retries)
+    if failures and checkpoint is not None:
+        checkpoint.incomplete = True
+    
+    for index, error in failures:
+        start = index * chunk_size
+        print(f"第 {index + 1} 组歌曲URL获取失败（第 {start + 1}-{start + len(chunks[index])} 首）: {error}")
+    
+    song_urls = {}
+    for chunk_data in results:
+        if chunk_data:
+            for item in chunk_data:
+                song_urls[item['id']] = UrlInfo.from_api(item)
+    return song_urls
+
+
+# VIP歌曲报告的列
+VIP_SONG_COLUMNS = [
+    Column('歌曲ID', 'id', 'id', markdown=False),
+    Column('歌曲名称', 'name', 'name'),
+    Column('艺术家', 'artists', 'artists', display=', '.join),
+    Column('VIP类型', 'vip_type', 'vip_type', display=lambda vip_type: vip_type or '未知'),
+]
+
+
+@metrics.timed('save_to_markdown')
+def save_to_markdown(playlist_name, vip_songs, filtered=False, formats=None, playlist_id=None):
+    """将VIP歌曲信息保存为报告文件，vip_songs可以是任意可迭代对象
+
+    默认只输出Markdown，formats或set_report_formats可同时输出CSV和JSONL，返回第一个报告的文件名。
+    一次保存多个歌单时传入playlist_id，文件名中加上歌单ID，避免同名歌单在同一秒内互相覆盖。
+    """
     timestamp = generate_timestamp()
-    filename = f"{playlist_name}_vip_songs_{timestamp}.md"
+    prefix = playlist_name if playlist_id is None else f"{playlist_name}_{playlist_id}"
+    base_name = f"{prefix}_vip_songs_{timestamp}"
     
     if filtered:
-        filename = f"{playlist_name}_vip_songs_filtered_{timestamp}.md"
+        base_name = f"{prefix}_vip_songs_filtered_{timestamp}"
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(f"# {playlist_name} - VIP歌曲列表\n\n")
-        f.write(f"提取时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        
-        if filtered:
-            f.write("**注意：已过滤掉云盘中已有的歌曲**\n\n")
-        
-        f.write("| 序号 | 歌曲名称 | 艺术家 | VIP类型 |\n")
-        f.write("|------|--------|--------|--------|\n")
-        
-        for i, song in enumerate(vip_songs, 1):
-            song_name = song['name']
-            artists = ', '.join([artist['name'] for artist in song['ar']])
-            vip_type = song.get('vip_type', '未知')
-            f.write(f"| {i} | {song_name} | {artists} | {vip_type} |\n")
+    header_lines = [
+        f"# {playlist_name} - VIP歌曲列表\n\n",
+        f"提取时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n",
+    ]
+    if filtered:
+        header_lines.append("**注意：已过滤掉云盘中已有的歌曲**\n\n")
+    
+    filenames, count = write_report(base_name, VIP_SONG_COLUMNS, vip_songs, header_lines, formats=formats)
     
-    print(f"已将{len(vip_songs)}首VIP歌曲信息保存到文件: {filename}")
-    return filename
+    print(f"已将{count}首VIP歌曲信息保存到文件: {', '.join(filenames)}")
+    return filenames[0]
 
 
-def filter_songs_by_cloud_music(vip_songs, cloud_music_info):
-    """过滤掉云盘中已有的歌曲"""
+@metrics.timed('filter_songs_by_cloud_music')
+def filter_songs_by_cloud_music(vip_songs, cloud_music_info, index=None, processes=None):
+    """过滤掉云盘中已有的歌曲，可传入预先构建的CloudMusicIndex
+
+    processes为匹配使用的进程数，None时由候选歌曲数量决定，见matcher.match_all
+    """
     filtered_songs = []
     removed_songs = []
     
-    # 将云盘歌曲信息转换为易于查找的格式
-    cloud_music_dict = {}
-    cloud_music_id_dict = {}  # 按歌曲ID索引
+    # 将云盘歌曲信息转换为易于查找的索引
+    if index is None:
+        index = CloudMusicIndex(cloud_music_info)
     
-    for item in cloud_music_info:
-        # 优先使用匹配的歌曲信息
-        if item['matched_name'] and item['matched_artist']:
-            song_name = item['matched_name']
-            artist_name = item['matched_artist']
-        else:
-            song_name = item['name']
-            artist_name = item['artist']
-            
-        normalized_name = normalize_song_name(song_name)
-        normalized_artist = normalize_artist_name(artist_name)
-        
-        # 记录歌曲ID，用于精确匹配
-        if item['songId']:
-            cloud_music_id_dict[item['songId']] = item
-        
-        if normalized_name:
-            # 使用(歌曲名,艺术家)作为键
-            key = (normalized_name, normalized_artist)
-            if key not in cloud_music_dict:
-                cloud_music_dict[key] = []
-            cloud_music_dict[key].append(item)
-            
-            # 同时添加只有歌曲名的键，用于模糊匹配
-            key_name_only = normalized_name
-            if key_name_only not in cloud_music_dict:
-                cloud_music_dict[key_name_only] = []
-            cloud_music_dict[key_name_only].append(item)
-    
-    # 过滤VIP歌曲
-    for song in vip_songs:
-        song_id = song['id']
-        song_name = song['name']
-        # 获取艺术家名称
-        artists = [artist['name'] for artist in song['ar']]
-        artists_str = ', '.join(artists)
-        
-        # 标准化处理
-        normalized_name = normalize_song_name(song_name)
-        normalized_artists = [normalize_artist_name(artist) for artist in artists]
-        
-        # 首先检查歌曲ID是否在云盘中（最精确的匹配）
-        if song_id in cloud_music_id_dict:
-            cloud_item = cloud_music_id_dict[song_id]
-            removed_songs.append(song)
-            print(f"ID精确匹配: {song_name} - {artists_str} (ID: {song_id})")
-            continue
-        
-        # 检查是否在云盘中 - 精确匹配(歌曲名+艺术家)
-        found = False
-        for normalized_artist in normalized_artists:
-            key = (normalized_name, normalized_artist)
-            if key in cloud_music_dict:
-                removed_songs.append(song)
-                found = True
-                print(f"名称精确匹配: {song_name} - {artists_str}")
-                break
-        
-        # 如果精确匹配没找到，尝试只匹配歌曲名
-        if not found and normalized_name in cloud_music_dict:
-            # 获取云盘中该歌曲名的所有艺术家
-            cloud_artists = []
-            for item in cloud_music_dict[normalized_name]:
-                # 优先使用匹配的艺术家名称
-                if item['matched_artist']:
-                    cloud_artists.append(normalize_artist_name(item['matched_artist']))
-                else:
-                    cloud_artists.append(item['normalized_artist'])
-            
-            # 检查是否有相似的艺术家名称
-            for normalized_artist in normalized_artists:
-                for cloud_artist in cloud_artists:
-                    # 如果艺术家名称包含关系或相似度高，认为是同一首歌
-                    if (normalized_artist in cloud_artist or 
-                        cloud_artist in normalized_artist or 
-                        similarity(normalized_artist, cloud_artist) > 0.7):
-                        removed_songs.append(song)
-                        found = True
-                        cloud_item = cloud_music_dict[normalized_name][0]
-                        cloud_name = cloud_item['matched_name'] or cloud_item['name']
-                        cloud_artist = cloud_item['matched_artist'] or cloud_item['artist']
-                        print(f"模糊匹配: {song_name} - {artists_str} 与云盘中的 {cloud_name} - {cloud_artist}")
-                        break
-                if found:
-                    break
-        
+    # 过滤VIP歌曲，匹配结果与vip_songs顺序一致
+    for song, match in zip(vip_songs, match_all(index, vip_songs, processes)):
         # 如果没有找到匹配，则保留该歌曲
-        if not found:
+        if match is None:
             filtered_songs.append(song)
+            continue
+        
+        removed_songs.append(song)
+        match_type, cloud_item = match
+        if match_type == 'id':
+            print(f"ID精确匹配: {song.name} - {song.artists_str} (ID: {song.id})")
+        elif match_type == 'exact':
+            print(f"名称精确匹配: {song.name} - {song.artists_str}")
+        else:
+            cloud_name = cloud_item.matched_name or cloud_item.name
+            cloud_artist = cloud_item.matched_artist or cloud_item.artist
+            print(f"模糊匹配: {song.name} - {song.artists_str} 与云盘中的 {cloud_name} - {cloud_artist}")
     
     return filtered_songs, removed_songs
 
 
-def find_vip_songs(songs, song_urls):
-    """从歌曲列表中找出VIP歌曲"""
-    vip_songs = []
+@metrics.timed('find_vip_songs')
+def find_vip_songs(songs, song_urls, categories=(MEMBER_ONLY,)):
+    """从歌曲列表中找出VIP歌曲
+
+    默认只识别会员专享歌曲；categories可加入vip_classifier中的其他类别，
+    命中多个类别时以categories中靠前的类别作为VIP类型。
+    """
+    if len(categories) == 1:
+        vip_songs = select_tracks(songs, song_urls, categories[0])
+        for song in vip_songs:
+            song.vip_type = categories[0]
+        return vip_songs
     
-    for song in songs:
-        song_id = song['id']
-        
-        # 只识别会员专享歌曲
-        is_vip = False
-        vip_type = ""
-        
-        # 检查歌曲属性，只保留会员专享的判断条件
-        if song.get('fee') == 1:
-            is_vip = True
-            vip_type = "会员专享"
-        elif song.get('privilege', {}).get('fee') == 1:
-            is_vip = True
-            vip_type = "会员专享"
-        
-        # 检查URL信息，只保留会员专享的判断条件
-        if song_id in song_urls:
-            url_info = song_urls[song_id]
-            if url_info.get('fee') == 1:
-                if not is_vip:  # 避免重复添加
-                    is_vip = True
-                    vip_type = "会员专享"
-        
-        if is_vip:
-            song['vip_type'] = vip_type
-            vip_songs.append(song)
+    masks = classify_tracks(songs, song_urls, categories)
+    
+    # 靠前的类别后写入，覆盖靠后的类别
+    vip_types = {}
+    for category in reversed(categories):
+        for index in true_indices(masks[category]):
+            vip_types[index] = category
+    
+    vip_songs = []
+    for index in sorted(vip_types):
+        song = songs[index]
+        song.vip_type = vip_types[index]
+        vip_songs.append(song)
     
     return vip_songs
 
 
-def main():
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="网易云音乐歌单VIP歌曲提取工具")
+    parser.add_argument('playlist_id', nargs='?', help="歌单ID，不提供时使用上次保存的歌单ID")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="流水线模式：云盘与歌单并行获取，歌曲按批次边获取边判断")
+    parser.add_argument('--diff', action='store_true',
+                        help="差异模式：只报告与上次运行相比新增、VIP状态变化和云盘新覆盖的歌曲")
+    parser.add_argument('--batch', nargs='+', metavar='ID', help="批量模式：一次处理多个歌单ID或歌单链接")
+    parser.add_argument('--batch-file', metavar='FILE', help="批量模式：从文件读取歌单ID，每行一个")
+    parser.add_argument('--resume', action='store_true',
+                        help="从上次中断或失败的位置继续，跳过已完成的歌单详情、歌曲详情、URL和云盘分页")
+    parser.add_argument('--full-sync', action='store_true', help="忽略本地云盘快照，重新全量获取云盘音乐列表")
+    parser.add_argument('--metrics', action='store_true', help="运行结束后打印各阶段耗时和请求统计")
+    parser.add_argument('--metrics-json', metavar='FILE', help="把运行指标导出为JSON文件（同时开启--metrics）")
+    parser.add_argument('--match-processes', type=int, metavar='N',
+                        help="云盘比对使用的进程数，默认在VIP歌曲很多时使用全部CPU，1为单进程")
+    parser.add_argument('--formats', metavar='FORMATS',
+                        help="报告格式，逗号分隔，可选 md,csv,jsonl，默认为md")
+    return parser.parse_args(argv)
+
+
+def save_pipeline_results(playlist_name, vip_songs, filtered_songs, removed_songs, cloud_music_info):
+    """保存流水线模式的结果"""
+    print(f"找到 {len(vip_songs)} 首VIP歌曲")
+    if not vip_songs:
+        print("未找到VIP歌曲")
+        return
+    
+    filename = save_to_markdown(playlist_name, vip_songs)
+    print(f"原始结果已保存到 {filename}")
+    
+    cloud_filename = save_cloud_music_to_markdown(cloud_music_info)
+    print(f"云盘音乐列表已保存到 {cloud_filename}")
+    
+    print(f"过滤后剩余 {len(filtered_songs)} 首VIP歌曲")
+    print(f"已从列表中移除 {len(removed_songs)} 首云盘中已有的歌曲")
+    
+    if filtered_songs:
+        filtered_filename = save_to_markdown(playlist_name, filtered_songs, filtered=True)
+        print(f"过滤后的结果已保存到 {filtered_filename}")
+    else:
+        print("过滤后没有剩余VIP歌曲")
+
+
+def main(argv=None):
     """主函数"""
+    args = parse_args(argv)
+    
+    if args.metrics or args.metrics_json:
+        metrics.enable()
+    try:
+        run(args)
+    finally:
+        if metrics.is_enabled():
+            report_metrics(args.metrics_json)
+
+
+def report_metrics(json_path=None):
+    """打印运行指标，并在指定路径时导出为JSON"""
+    data = metrics.summary()
+    rate_limiter = get_client().rate_limiter
+    if rate_limiter is not None:
+        data['rate_limiter'] = rate_limiter.stats()
+    metrics.print_summary(data)
+    if json_path and metrics.export_json(json_path, data):
+        print(f"运行指标已导出到 {json_path}")
+
+
+def run(args):
+    """按命令行参数执行提取"""
     print("网易云音乐歌单VIP歌曲提取工具")
     print("=" * 30)
     
+    # 可在配置文件中自定义需要移除的版本标识
+    config = load_config()
+    version_tags = config.get('version_tags')
+    if version_tags:
+        set_version_tags(version_tags)
+    
+    # 报告格式：命令行参数优先于配置文件
+    report_formats = config.get('report_formats')
+    if args.formats:
+        try:
+            report_formats = parse_formats(args.formats)
+        except ValueError as e:
+            print(e)
+            return
+    if report_formats:
+        set_report_formats(report_formats)
+    
+    if args.batch or args.batch_file:
+        # 批量模式依赖本模块的各阶段函数，在此处导入以避免循环导入
+        from batch import read_playlist_ids, run_batch
+        playlist_ids = read_playlist_ids(args.batch, args.batch_file)
+        if not playlist_ids:
+            print("没有可处理的歌单ID")
+            return
+        run_batch(playlist_ids, get_cookies(), cache=get_default_cache(), full_sync=args.full_sync)
+        return
+    
     # 获取歌单ID
     playlist_id = ""
     saved_playlist_id = get_playlist_id()
     
-    if len(sys.argv) > 1:
-        playlist_id = sys.argv[1]
+    if args.playlist_id:
+        playlist_id = args.playlist_id
         # 保存新提供的歌单ID
         save_playlist_id(playlist_id)
     elif saved_playlist_id:
@@ -276,10 +373,31 @@ def main():
     
     # 获取Cookie
     cookies = get_cookies()
+    # 歌曲详情本地缓存
+    cache = get_default_cache()
+    
+    if args.pipeline:
+        # 流水线模式依赖本模块的各阶段函数，在此处导入以避免循环导入
+        from pipeline import run_pipeline
+        print("正在以流水线模式处理歌单...")
+        save_pipeline_results(*run_pipeline(playlist_id, cookies, cache=cache, full_sync=args.full_sync))
+        return
+    
+    if args.diff:
+        # 差异模式依赖本模块的各阶段函数，在此处导入以避免循环导入
+        from diff_mode import run_diff
+        print("正在以差异模式处理歌单...")
+        run_diff(playlist_id, cookies, cache=cache, full_sync=args.full_sync)
+        return
+    
+    # 断点状态按歌单ID保存，不带--resume时丢弃上次遗留的状态
+    checkpoint = RunCheckpoint(f"playlist_{playlist_id}", resume=args.resume)
+    if checkpoint.resumed:
+        print("正在从上次的断点继续...")
     
     # 获取歌单中的歌曲ID
     print("正在获取歌单详情...")
-    playlist_name, track_ids = get_playlist_detail(playlist_id, cookies)
+    playlist_name, track_ids = get_playlist_detail(playlist_id, cookies, checkpoint=checkpoint)
     print(f"歌单名称: {playlist_name}")
     print(f"共找到 {len(track_ids)} 首歌曲")
     
@@ -289,11 +407,11 @@ def main():
     
     # 获取歌曲详情
     print("正在获取歌曲详情...")
-    songs = get_songs_detail(track_ids, cookies)
+    songs = get_songs_detail(track_ids, cookies, cache=cache, checkpoint=checkpoint)
     
     # 获取歌曲URL信息，判断VIP歌曲
     print("正在判断VIP歌曲...")
-    song_urls = get_song_urls(track_ids, cookies)
+    song_urls = get_song_urls(track_ids, cookies, checkpoint=checkpoint)
     
     # 筛选出VIP歌曲
     vip_songs = find_vip_songs(songs, song_urls)
@@ -306,20 +424,24 @@ def main():
         print(f"原始结果已保存到 {filename}")
     else:
         print("未找到VIP歌曲")
+        finish_checkpoint(checkpoint)
         return
     
     # 默认过滤云盘中已有的歌曲
     print("正在过滤云盘中已有的歌曲...")
     
     # 获取云盘音乐列表
-    cloud_music_info = extract_cloud_music_info(cookies)
+    cloud_music_info = extract_cloud_music_info(cookies, cache=cache, incremental=True, checkpoint=checkpoint,
+                                                full_sync=args.full_sync)
     
     # 单独保存云盘音乐列表
     cloud_filename = save_cloud_music_to_markdown(cloud_music_info)
     print(f"云盘音乐列表已保存到 {cloud_filename}")
     
     # 过滤掉云盘中已有的歌曲
-    filtered_songs, removed_songs = filter_songs_by_cloud_music(vip_songs, cloud_music_info)
+    filtered_songs, removed_songs = filter_songs_by_cloud_music(vip_songs, cloud_music_info,
+                                                                 index=open_cloud_index(cloud_music_info),
+                                                                 processes=args.match_processes)
     
     print(f"过滤后剩余 {len(filtered_songs)} 首VIP歌曲")
     print(f"已从列表中移除 {len(removed_songs)} 首云盘中已有的歌曲")
@@ -330,6 +452,16 @@ def main():
         print(f"过滤后的结果已保存到 {filtered_filename}")
     else:
         print("过滤后没有剩余VIP歌曲")
+    
+    finish_checkpoint(checkpoint)
+
+
+def finish_checkpoint(checkpoint):
+    """任务结束时，全部完成则清除断点状态，否则保留以便下次使用--resume继续"""
+    if checkpoint.incomplete:
+        print("部分请求失败，已完成的部分已保存，可使用 --resume 参数重新运行以继续")
+    else:
+        checkpoint.clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+HTTP客户端模块，所有weapi请求共用一个带连接池的会话，并经过客户端限流
+"""
+
+import time
+import threading
+import metrics
+from crypto_utils import encrypted_request, SecretKeyPool
+from rate_limiter import RateLimiter, THROTTLE_STATUS, THROTTLE_CODES
+
+# API地址
+BASE_URL = "https://music.163.com"
+
+# 请求头
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Referer': 'https://music.163.com/',
+    'Content-Type': 'application/x-www-form-urlencoded',
+}
+
+# 连接池与重试参数
+DEFAULT_TIMEOUT = 15
+POOL_SIZE = 16
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+# 429和503由限流器处理，不在连接层重试
+RETRY_STATUS = (500, 502, 504)
+
+# 被限流时的最大重试次数
+THROTTLE_RETRIES = 4
+
+
+class WeapiError(RuntimeError):
+    """请求被持续限流或响应无法解析"""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def _retry_after(response):
+    """解析Retry-After响应头（秒），没有或无法解析时返回None"""
+    value = response.headers.get('Retry-After')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class WeapiClient:
+    """weapi客户端，保持长连接并统一管理Cookie、请求头、超时、重试和限流策略
+
+    rate_limiter默认按rate_limiter.ENDPOINT_BUDGETS限流，传入False时不限流。
+    """
+
+    def __init__(self, base_url=BASE_URL, cookies=None, headers=None, timeout=DEFAULT_TIMEOUT,
+                 pool_size=POOL_SIZE, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, sec_key=None,
+                 key_reuse=True, rate_limiter=None, throttle_retries=THROTTLE_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter() if rate_limiter is None else (rate_limiter or None)
+        self.throttle_retries = throttle_retries
+        # requests导入较慢，创建客户端时才导入
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        # 固定的AES密钥，仅用于本地模拟服务器解密请求；为空时每次请求随机生成
+        self.sec_key = sec_key
+        # 批量请求时复用密钥对，避免每次请求都做RSA运算
+        self.key_pool = SecretKeyPool() if key_reuse else None
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS if headers is None else headers)
+        if cookies:
+            self.session.cookies.update(cookies)
+
+        # weapi接口均为只读查询，POST请求也可以安全重试
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def set_cookies(self, cookies):
+        """更新会话Cookie"""
+        if cookies:
+            self.session.cookies.update(cookies)
+
+    def _send(self, path, data, cookies):
+        start = time.perf_counter()
+        response = self.session.post(self.base_url + path, data=encrypted_request(data, self.sec_key, self.key_pool),
+                                     cookies=cookies, timeout=self.timeout)
+        if metrics.is_enabled():
+            body = response.request.body or b''
+            metrics.record_request(path, time.perf_counter() - start, len(body), len(response.content),
+                                   response.status_code)
+        result = None
+        if response.status_code not in THROTTLE_STATUS:
+            try:
+                result = response.json()
+            except ValueError:
+                raise WeapiError(f"接口返回了无法解析的响应，HTTP状态码: {response.status_code}", response.status_code)
+        return response, result
+
+    def post(self, path, data, cookies=None):
+        """加密请求数据并发送到指定接口，返回解析后的JSON
+
+        被限流（HTTP 429/503或限流错误码）时由限流器降速并重试，重试耗尽后抛出WeapiError；
+        其他错误码原样返回，由调用方处理。
+        """
+        limiter = self.rate_limiter.get(path) if self.rate_limiter is not None else None
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                response, result = self._send(path, data, cookies)
+            except Exception:
+                if limiter is not None:
+                    limiter.release(failed=True)
+                raise
+            
+            code = response.status_code if result is None else result.get('code')
+            throttled = result is None or code in THROTTLE_CODES
+            retry_after = _retry_after(response) if throttled else None
+            if limiter is not None:
+                limiter.release(throttled, retry_after)
+            if not throttled:
+                return result
+            if attempt >= self.throttle_retries:
+                raise WeapiError(f"请求被限流（{path}，错误码: {code}），重试{attempt}次后放弃", code)
+            if limiter is None:
+                # 不限流时按指数退避等待，限流器会自行暂停该接口
+                time.sleep(retry_after if retry_after is not None else BACKOFF_FACTOR * 2 ** attempt)
+            attempt += 1
+            metrics.record_retry('throttle')
+
+    def close(self):
+        """关闭会话及其连接池"""
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """获取共享的weapi客户端，首次调用时创建"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = WeapiClient()
+    return _client
+
+
+def set_client(client):
+    """替换共享的weapi客户端，例如指向本地测试服务器"""
+    global _client
+    with _client_lock:
+        old_client, _client = _client, client
+    if old_client is not None and old_client is not client:
+        old_client.close()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+云盘匹配模块，预先为云盘音乐建立索引，供VIP歌曲反复查询
+"""
+
+import os
+from utils import normalize_song_name, normalize_artist_name, similarity_exceeds
+
+# 艺术家相似度阈值，超过该值视为同一艺术家
+ARTIST_SIMILARITY_THRESHOLD = 0.7
+
+# 同名歌曲的艺术家数量超过该值时才建立字符倒排索引
+_CHAR_INDEX_MIN_ARTISTS = 8
+
+# 候选歌曲达到该数量时才自动使用多进程匹配，歌曲较少时进程开销大于收益
+PARALLEL_MIN_SONGS = 20000
+
+# 每个进程分到的分片数，分片越多各进程负载越均衡
+SHARDS_PER_PROCESS = 4
+
+# fork出的子进程继承的 (索引, 歌曲列表)，子进程只读取，依靠写时复制共享
+_shared = None
+
+
+class _NameBucket:
+    """同一标准化歌曲名下的云盘歌曲"""
+
+    __slots__ = ('first_position', 'artists', 'has_empty', '_char_index')
+
+    def __init__(self, first_position):
+        self.first_position = first_position
+        self.artists = []
+        self.has_empty = False
+        self._char_index = None
+
+    def add_artist(self, artist):
+        if not artist:
+            self.has_empty = True
+        elif artist not in self.artists:
+            self.artists.append(artist)
+
+    def candidates(self, artist):
+        """返回与给定艺术家至少有一个相同字符的云盘艺术家
+
+        包含关系和相似度>0.7都要求两者有相同字符，因此按字符分块不会漏掉匹配。
+        """
+        if len(self.artists) < _CHAR_INDEX_MIN_ARTISTS:
+            return self.artists
+        if self._char_index is None:
+            self._char_index = {}
+            for position, cloud_artist in enumerate(self.artists):
+                for char in set(cloud_artist):
+                    self._char_index.setdefault(char, []).append(position)
+        positions = set()
+        for char in set(artist):
+            positions.update(self._char_index.get(char, ()))
+        return [self.artists[position] for position in sorted(positions)]
+
+    def matches_artist(self, artist):
+        """判断艺术家是否与该歌曲名下的某个云盘艺术家相同或相似"""
+        # 空字符串与任何艺术家都构成包含关系
+        if not artist or self.has_empty:
+            return True
+        for cloud_artist in self.candidates(artist):
+            # 如果艺术家名称包含关系或相似度高，认为是同一首歌
+            if (artist in cloud_artist or
+                    cloud_artist in artist or
+                    similarity_exceeds(artist, cloud_artist, ARTIST_SIMILARITY_THRESHOLD)):
+                return True
+        return False
+
+
+class CloudMusicIndex:
+    """云盘音乐匹配索引，构建一次后可多次查询
+
+    匹配顺序与规则：
+    1. 歌曲ID精确匹配
+    2. 标准化后的(歌曲名, 艺术家)精确匹配
+    3. 歌曲名相同且艺术家名称存在包含关系或相似度高于阈值
+    """
+
+    def __init__(self, cloud_music_info):
+        """cloud_music_info为CloudEntry列表"""
+        self.entries = []
+        self.by_id = {}
+        self.exact_keys = set()
+        self.buckets = {}
+
+        for position, item in enumerate(cloud_music_info):
+            self.entries.append(item)
+            # 优先使用匹配的歌曲信息
+            if item.matched_name and item.matched_artist:
+                song_name = item.matched_name
+                artist_name = item.matched_artist
+            else:
+                song_name = item.name
+                artist_name = item.artist
+
+            normalized_name = normalize_song_name(song_name)
+            normalized_artist = normalize_artist_name(artist_name)
+
+            # 记录歌曲ID对应的条目位置，用于精确匹配
+            if item.song_id:
+                self.by_id[item.song_id] = position
+
+            if normalized_name:
+                self.exact_keys.add((normalized_name, normalized_artist))
+
+                bucket = self.buckets.get(normalized_name)
+                if bucket is None:
+                    bucket = self.buckets[normalized_name] = _NameBucket(position)
+                # 模糊匹配时优先使用匹配的艺术家名称
+                if item.matched_artist:
+                    bucket.add_artist(normalize_artist_name(item.matched_artist))
+                else:
+                    bucket.add_artist(item.normalized_artist)
+
+    def entry(self, position):
+        """返回指定位置的云盘条目"""
+        return self.entries[position]
+
+    def match(self, song):
+        """查找VIP歌曲在云盘中的匹配
+
+        返回 (匹配方式, 云盘条目)，匹配方式为 'id'、'exact' 或 'fuzzy'；没有匹配时返回None。
+        """
+        match = self.match_position(song)
+        return None if match is None else (match[0], self.entries[match[1]])
+
+    def match_position(self, song):
+        """与match相同，但返回云盘条目的位置而不是条目本身"""
+        # 首先检查歌曲ID是否在云盘中（最精确的匹配）
+        position = self.by_id.get(song.id)
+        if position is not None:
+            return 'id', position
+
+        normalized_name = normalize_song_name(song.name)
+        bucket = self.buckets.get(normalized_name)
+        if bucket is None:
+            return None
+
+        normalized_artists = [normalize_artist_name(artist) for artist in song.artists]
+
+        # 精确匹配(歌曲名+艺术家)
+        for normalized_artist in normalized_artists:
+            if (normalized_name, normalized_artist) in self.exact_keys:
+                return 'exact', bucket.first_position
+
+        # 只匹配歌曲名，再比较艺术家
+        for normalized_artist in normalized_artists:
+            if bucket.matches_artist(normalized_artist):
+                return 'fuzzy', bucket.first_position
+
+        return None
+
+
+def _fork_context():
+    """返回fork方式的multiprocessing上下文，平台不支持fork时（如Windows）返回None"""
+    import multiprocessing
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context('fork')
+
+
+def _match_shard(bounds):
+    """在子进程中匹配一个分片，返回 (匹配方式, 云盘条目位置) 列表，没有匹配时为None"""
+    index, songs = _shared
+    return [index.match_position(song) for song in songs[bounds[0]:bounds[1]]]
+
+
+def match_all(index, songs, processes=None):
+    """按歌曲顺序返回每首歌曲的匹配结果，与逐首调用index.match的结果相同
+
+    index可以是CloudMusicIndex或cloud_index.MappedCloudIndex。processes大于1时把歌曲分片交给
+    fork出的进程池，索引和歌曲列表通过写时复制共享，子进程只返回匹配方式和云盘条目位置。processes为None时，候选歌曲达到PARALLEL_MIN_SONGS
+    时使用全部CPU。平台不支持fork时退回单进程。
+    """
+    global _shared
+    songs = songs if isinstance(songs, list) else list(songs)
+    if processes is None:
+        processes = (os.cpu_count() or 1) if len(songs) >= PARALLEL_MIN_SONGS else 1
+    context = _fork_context() if processes > 1 and len(songs) > 1 else None
+    if context is None:
+        return [index.match(song) for song in songs]
+
+    shard_size = -(-len(songs) // (processes * SHARDS_PER_PROCESS))
+    bounds = [(start, min(start + shard_size, len(songs))) for start in range(0, len(songs), shard_size)]
+    _shared = (index, songs)
+    try:
+        with context.Pool(min(processes, len(bounds))) as pool:
+            shards = pool.map(_match_shard, bounds, chunksize=1)
+    finally:
+        _shared = None
+    return [None if result is None else (result[0], index.entry(result[1])) for shard in shards for result in shard]
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+运行指标模块，记录各阶段耗时、请求数、收发字节数、请求延迟分布和重试次数
+
+默认关闭，关闭时被计时的函数只多一次全局变量判断。
+"""
+
+import json
+import time
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+# 协程函数的代码标志位，与inspect.CO_COROUTINE相同，避免为此导入inspect
+_CO_COROUTINE = 0x80
+
+# 请求延迟直方图的桶上界（秒），最后一个桶收集更慢的请求
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = False
+_lock = threading.Lock()
+_stages = {}
+_requests = {}
+_retries = {}
+_started = None
+
+
+def enable():
+    """开启指标记录并清空已有数据"""
+    global _enabled
+    reset()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """清空已记录的指标"""
+    global _started
+    with _lock:
+        _stages.clear()
+        _requests.clear()
+        _retries.clear()
+        _started = time.perf_counter()
+
+
+def record_stage(name, elapsed):
+    """累计一个阶段的调用次数和耗时"""
+    with _lock:
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = {'calls': 0, 'seconds': 0.0}
+        stage['calls'] += 1
+        stage['seconds'] += elapsed
+
+
+def timed(name):
+    """装饰器，开启指标时记录函数每次调用的耗时；协程函数记录到完成为止，生成器函数只计入创建时间"""
+    def decorator(func):
+        if func.__code__.co_flags & _CO_COROUTINE:
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record_stage(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_stage(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def record_request(path, latency, sent, received, status):
+    """记录一次HTTP请求的延迟、收发字节数和状态码"""
+    with _lock:
+        endpoint = _requests.get(path)
+        if endpoint is None:
+            endpoint = _requests[path] = {
+                'requests': 0, 'seconds': 0.0, 'bytes_sent': 0, 'bytes_received': 0,
+                'status': {}, 'histogram': [0] * (len(LATENCY_BUCKETS) + 1),
+            }
+        endpoint['requests'] += 1
+        endpoint['seconds'] += latency
+        endpoint['bytes_sent'] += sent
+        endpoint['bytes_received'] += received
+        endpoint['status'][status] = endpoint['status'].get(status, 0) + 1
+        endpoint['histogram'][bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+
+def record_retry(kind):
+    """记录一次重试，kind区分重试原因，例如 throttle、batch"""
+    if not _enabled:
+        return
+    with _lock:
+        _retries[kind] = _retries.get(kind, 0) + 1
+
+
+def _percentile(histogram, fraction):
+    """根据直方图估计分位数，返回所在桶的上界，落在最后一个桶时返回None"""
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    target = total * fraction
+    count = 0
+    for index, bucket_count in enumerate(histogram):
+        count += bucket_count
+        if count >= target:
+            return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else None
+    return None
+
+
+def _format_bound(bound):
+    return f"<= {bound}s" if bound is not None else f"> {LATENCY_BUCKETS[-1]}s"
+
+
+def summary():
+    """返回可JSON序列化的指标汇总"""
+    with _lock:
+        requests = {}
+        for path, endpoint in _requests.items():
+            item = dict(endpoint)
+            item['status'] = {str(status): count for status, count in endpoint['status'].items()}
+            item['histogram'] = dict(zip([f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"],
+                                         endpoint['histogram']))
+            item['p50'] = _percentile(endpoint['histogram'], 0.5)
+            item['p95'] = _percentile(endpoint['histogram'], 0.95)
+            requests[path] = item
+        return {
+            'total_seconds': time.perf_counter() - _started if _started is not None else 0.0,
+            'stages': {name: dict(stage) for name, stage in _stages.items()},
+            'requests': requests,
+            'retries': dict(_retries),
+        }
+
+
+def print_summary(data=None):
+    """打印指标汇总"""
+    data = data or summary()
+    print("\n运行指标")
+    print("=" * 30)
+    print(f"总耗时: {data['total_seconds']:.2f} 秒")
+    if data['stages']:
+        print("\n各阶段耗时:")
+        for name, stage in sorted(data['stages'].items(), key=lambda item: -item[1]['seconds']):
+            print(f"  {name:<32} {stage['seconds']:>9.3f} 秒  {stage['calls']:>6} 次")
+    if data['requests']:
+        print("\n请求统计:")
+        for path, item in data['requests'].items():
+            average = item['seconds'] / item['requests'] if item['requests'] else 0.0
+            print(f"  {path}")
+            print(f"    请求 {item['requests']} 次，发送 {item['bytes_sent'] / 1024:.1f} KB，"
+                  f"接收 {item['bytes_received'] / 1024:.1f} KB，平均延迟 {average * 1000:.0f} ms，"
+                  f"p50 {_format_bound(item['p50'])}，p95 {_format_bound(item['p95'])}")
+            print(f"    状态码: {', '.join(f'{status}: {count}' for status, count in item['status'].items())}")
+    if data['retries']:
+        print("\n重试次数: " + ', '.join(f"{kind}: {count}" for kind, count in data['retries'].items()))
+    if data.get('rate_limiter'):
+        print("\n客户端限流:")
+        for path, item in data['rate_limiter'].items():
+            print(f"  {path}: 请求 {item['requests']} 次，被限流 {item['throttled']} 次，"
+                  f"累计等待 {item['waited']:.2f} 秒，当前速率 {item['rate']:.1f}/秒，并发上限 {item['concurrency']}")
+
+
+def export_json(path, data=None):
+    """把指标汇总导出为JSON文件"""
+    data = data or summary()
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return True
+    except Exception as e:
+        print(f"导出运行指标失败: {e}")
+        return False
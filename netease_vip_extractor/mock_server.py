@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地模拟weapi服务器和合成数据，用于基准测试和离线调试
+"""
+
+import json
+import time
+import base64
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+from Crypto.Cipher import AES
+from crypto_utils import NONCE, IV
+from records import Track, UrlInfo, CloudEntry
+
+# 客户端与模拟服务器约定的AES密钥，客户端需以WeapiClient(sec_key=MOCK_SEC_KEY)创建
+MOCK_SEC_KEY = 'benchmarkmockkey'
+
+_SYLLABLES = ['ai', 'bei', 'chen', 'de', 'feng', 'guang', 'hai', 'jin', 'kong', 'lan',
+              'ming', 'nian', 'qing', 'ran', 'shan', 'tian', 'wei', 'xin', 'yue', 'zhi',
+              '爱', '北', '晨', '风', '光', '海', '梦', '年', '晴', '山', '天', '星', '夜', '月']
+_SUFFIXES = ['', '', '', ' (Live)', ' (Remix)', '【伴奏】', ' - 完整版', '（翻唱）']
+_FEES = [0, 0, 0, 1, 1, 4, 8, 8]
+
+
+def _random_name(rng, min_parts=1, max_parts=4):
+    return ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(min_parts, max_parts)))
+
+
+class SyntheticLibrary:
+    """合成的歌单、歌曲详情、URL信息和云盘数据
+
+    约三成歌单歌曲出现在云盘中，其中一半通过歌曲ID匹配，另一半只能通过名称匹配。
+    """
+
+    def __init__(self, size, cloud_size=None, seed=0, playlist_id=1):
+        rng = random.Random(seed)
+        self.playlist_id = playlist_id
+        self.playlist_name = f"合成歌单{size}"
+        # 歌单中已失效的歌曲数，计入trackCount但不出现在trackIds中
+        self.unavailable_count = 0
+        artists = [_random_name(rng, 1, 3) for _ in range(max(10, size // 20))]
+
+        self.songs = {}
+        self.track_ids = []
+        self.urls = {}
+        for i in range(size):
+            song_id = 1000000 + i
+            fee = rng.choice(_FEES)
+            privilege_fee = fee if rng.random() < 0.8 else rng.choice(_FEES)
+            self.songs[song_id] = {
+                'id': song_id,
+                'name': _random_name(rng) + rng.choice(_SUFFIXES),
+                'ar': [{'id': rng.randint(1, 99999), 'name': rng.choice(artists)} for _ in range(rng.randint(1, 2))],
+                'fee': fee,
+                'privilege': {'id': song_id, 'fee': privilege_fee},
+            }
+            self.track_ids.append(song_id)
+            self.urls[song_id] = {'id': song_id, 'fee': fee if rng.random() < 0.9 else rng.choice(_FEES), 'url': None}
+
+        cloud_size = size if cloud_size is None else cloud_size
+        self.cloud = []
+        add_time = 1700000000000
+        for i in range(cloud_size):
+            add_time -= rng.randint(1000, 100000)
+            entry = {
+                'songId': 0,
+                'songName': _random_name(rng),
+                'artist': rng.choice(artists),
+                'fileName': f"cloud_{i}.mp3",
+                'fileSize': rng.randint(2, 15) * 1024 * 1024,
+                'addTime': add_time,
+            }
+            roll = rng.random()
+            if roll < 0.3 and self.track_ids:
+                song = self.songs[rng.choice(self.track_ids)]
+                entry['songName'] = song['name']
+                entry['artist'] = song['ar'][0]['name']
+                if roll < 0.15:
+                    entry['songId'] = song['id']
+            self.cloud.append(entry)
+
+        # 歌单ID到歌曲ID列表，可以再加入由同一批歌曲组成的其他歌单
+        self.playlists = {playlist_id: self.track_ids}
+
+    def tracks(self):
+        """按歌单顺序返回解析后的Track列表"""
+        return [Track.from_api(self.songs[song_id]) for song_id in self.track_ids]
+
+    def url_infos(self):
+        """返回与get_song_urls结构相同的 {歌曲ID: UrlInfo}"""
+        return {song_id: UrlInfo.from_api(item) for song_id, item in self.urls.items()}
+
+    def cloud_music_info(self):
+        """返回与extract_cloud_music_info结构相同的CloudEntry列表"""
+        info = []
+        for item in self.cloud:
+            song = self.songs.get(item['songId'])
+            info.append(CloudEntry.from_api(item, Track.from_api(song) if song else None))
+        return info
+
+
+class _ServerBucket:
+    """模拟服务器端的令牌桶，令牌不足时拒绝请求"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+def _aes_decrypt(text, key):
+    data = AES.new(key.encode(), AES.MODE_CBC, IV.encode()).decrypt(base64.b64decode(text))
+    return data[:-data[-1]]
+
+
+def decrypt_request(params, sec_key=MOCK_SEC_KEY):
+    """解密weapi请求的params字段，返回请求数据"""
+    return json.loads(_aes_decrypt(_aes_decrypt(params, sec_key).decode('utf-8'), NONCE))
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        form = parse_qs(body)
+        data = decrypt_request(form['params'][0], server.sec_key)
+        with server.stats_lock:
+            server.request_count += 1
+            if server.first_request_at is None:
+                server.first_request_at = time.time()
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        status = 200
+        bucket = server.buckets.get(self.path) if server.buckets is not None else None
+        if bucket is not None and not bucket.try_acquire():
+            with server.stats_lock:
+                server.throttled_count += 1
+            # 与真实接口一样返回HTTP 200和限流错误码，或按throttle_status返回429/503
+            status = server.throttle_status
+            result = {'code': 405 if status == 200 else status, 'message': '操作频繁，请稍候再试'}
+        else:
+            handler = server.routes.get(self.path)
+            result = handler(data) if handler else {'code': 404}
+        payload = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockWeapiServer:
+    """在本地端口上提供歌单详情、歌曲详情、歌曲URL和云盘接口的模拟服务器
+
+    throttle为 (每秒请求数, 突发请求数) 时每个接口按该速率限流，超出的请求返回错误码405，
+    throttle_status为429或503时改为返回对应的HTTP状态码。
+    """
+
+    def __init__(self, library, latency=0.0, sec_key=MOCK_SEC_KEY, host='127.0.0.1', port=0,
+                 throttle=None, throttle_status=200):
+        self.library = library
+        self.httpd = ThreadingHTTPServer((host, port), _MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.sec_key = sec_key
+        self.httpd.request_count = 0
+        self.httpd.first_request_at = None
+        self.httpd.throttled_count = 0
+        self.httpd.throttle_status = throttle_status
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.routes = {
+            '/weapi/v6/playlist/detail': self._playlist_detail,
+            '/weapi/v3/song/detail': self._song_detail,
+            '/weapi/song/enhance/player/url': self._song_urls,
+            '/weapi/v1/cloud/get': self._cloud,
+        }
+        self.httpd.buckets = None
+        if throttle is not None:
+            self.httpd.buckets = {path: _ServerBucket(*throttle) for path in self.httpd.routes}
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    @property
+    def first_request_at(self):
+        """收到第一个请求时的time.time()，尚未收到请求时为None"""
+        return self.httpd.first_request_at
+
+    @property
+    def throttled_count(self):
+        return self.httpd.throttled_count
+
+    def start(self):
+        """在后台线程中启动服务器"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务器"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _playlist_detail(self, data):
+        library = self.library
+        n = int(data.get('n', 1000))
+        playlist_id = int(data.get('id', library.playlist_id))
+        track_ids = library.playlists.get(playlist_id)
+        if track_ids is None:
+            return {'code': 404, 'message': '歌单不存在'}
+        name = library.playlist_name if playlist_id == library.playlist_id else f"{library.playlist_name}_{playlist_id}"
+        return {
+            'code': 200,
+            'playlist': {
+                'id': playlist_id,
+                'name': name,
+                'trackCount': len(track_ids) + library.unavailable_count,
+                'tracks': [library.songs[song_id] for song_id in track_ids[:n]],
+                'trackIds': [{'id': song_id} for song_id in track_ids],
+            },
+        }
+
+    def _song_detail(self, data):
+        ids = json.loads(data['ids'])
+        songs = [self.library.songs[song_id] for song_id in ids if song_id in self.library.songs]
+        return {'code': 200, 'songs': songs, 'privileges': [song['privilege'] for song in songs]}
+
+    def _song_urls(self, data):
+        ids = json.loads(data['ids'])
+        return {'code': 200, 'data': [self.library.urls[song_id] for song_id in ids if song_id in self.library.urls]}
+
+    def _cloud(self, data):
+        limit = int(data.get('limit', 1000))
+        offset = int(data.get('offset', 0))
+        page = self.library.cloud[offset:offset + limit]
+        return {'code': 200, 'data': page, 'count': len(self.library.cloud), 'hasMore': offset + limit < len(self.library.cloud)}
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+流水线模块，歌单枚举、歌曲详情、URL、VIP判断和云盘过滤按批次重叠执行
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from cloud_music import extract_cloud_music_info
+from extract_by_id import open_playlist, get_songs_detail, get_song_urls, find_vip_songs, filter_songs_by_cloud_music
+from cloud_index import open_cloud_index
+
+# 每批处理的歌曲数量
+PIPELINE_BATCH_SIZE = 500
+
+# 同时处理中的批次数量上限，同时限制内存中的待处理数据量
+PIPELINE_MAX_IN_FLIGHT = 4
+
+
+def _load_cloud_index(cookies, cache, incremental, full_sync=False):
+    """获取云盘音乐并构建匹配索引"""
+    cloud_music_info = extract_cloud_music_info(cookies, cache=cache, incremental=incremental, full_sync=full_sync)
+    return cloud_music_info, open_cloud_index(cloud_music_info)
+
+
+def _iter_batches(iterable, size):
+    """将迭代器按固定大小分批"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def run_pipeline(playlist_id, cookies=None, cache=None, incremental=True,
+                 batch_size=PIPELINE_BATCH_SIZE, max_in_flight=PIPELINE_MAX_IN_FLIGHT, full_sync=False):
+    """以流水线方式处理歌单
+
+    云盘音乐在后台与歌单各阶段并行加载；歌曲ID边枚举边分批，每批的详情和URL并发请求，
+    按歌单顺序完成VIP判断后立即与云盘索引比对，只保留VIP歌曲。
+    返回 (歌单名称, VIP歌曲, 过滤后的歌曲, 移除的歌曲, 云盘音乐信息)。
+    """
+    # 每个批次同时请求详情和URL，另加一个线程加载云盘
+    with ThreadPoolExecutor(max_workers=max_in_flight * 2 + 1) as executor:
+        cloud_future = executor.submit(_load_cloud_index, cookies, cache, incremental, full_sync)
+
+        playlist_name, track_count, track_ids = open_playlist(playlist_id, cookies)
+        print(f"歌单名称: {playlist_name}")
+        print(f"歌单共有 {track_count} 首歌曲")
+
+        vip_songs = []
+        filtered_songs = []
+        removed_songs = []
+        cloud_index = None
+        processed = 0
+        pending = deque()
+
+        def finish_batch():
+            nonlocal cloud_index, processed
+            batch, details_future, urls_future = pending.popleft()
+            batch_vip_songs = find_vip_songs(details_future.result(), urls_future.result())
+            processed += len(batch)
+            vip_songs.extend(batch_vip_songs)
+            if batch_vip_songs:
+                if cloud_index is None:
+                    cloud_index = cloud_future.result()[1]
+                batch_filtered, batch_removed = filter_songs_by_cloud_music(batch_vip_songs, None, index=cloud_index)
+                filtered_songs.extend(batch_filtered)
+                removed_songs.extend(batch_removed)
+            print(f"已处理 {processed}/{track_count} 首歌曲，找到 {len(vip_songs)} 首VIP歌曲")
+
+        for batch in _iter_batches(track_ids, batch_size):
+            details_future = executor.submit(get_songs_detail, batch, cookies, max_workers=1, cache=cache)
+            urls_future = executor.submit(get_song_urls, batch, cookies, chunk_size=batch_size, max_workers=1)
+            pending.append((batch, details_future, urls_future))
+            if len(pending) >= max_in_flight:
+                finish_batch()
+
+        while pending:
+            finish_batch()
+
+        cloud_music_info = cloud_future.result()[0]
+
+    return playlist_name, vip_songs, filtered_songs, removed_songs, cloud_music_info
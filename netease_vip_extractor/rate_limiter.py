@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+客户端限流模块，每个接口使用独立的令牌桶和自适应并发上限
+
+收到限流响应时速率和并发上限减半，并暂停该接口一段时间；响应正常时逐步恢复到预设值。
+"""
+
+import time
+import threading
+
+# 各接口的预算: (每秒请求数, 突发请求数, 最大并发数)
+# 路径与extract_by_id.py和cloud_music.py中的API路径一致
+ENDPOINT_BUDGETS = {
+    "/weapi/v6/playlist/detail": (5, 5, 2),
+    "/weapi/v3/song/detail": (10, 10, 4),
+    "/weapi/song/enhance/player/url": (10, 10, 4),
+    "/weapi/v1/cloud/get": (5, 5, 2),
+}
+DEFAULT_BUDGET = (10, 10, 4)
+
+# 速率下限（每秒请求数），限流后不会低于该值
+MIN_RATE = 0.5
+
+# 表示被限流的HTTP状态码和接口错误码
+THROTTLE_STATUS = (429, 503)
+THROTTLE_CODES = (405, 429, 503, -447, -460, -462)
+
+# 未提供Retry-After时，第n次连续限流后暂停 PAUSE_BASE * 2**(n-1) 秒，最长PAUSE_MAX秒
+PAUSE_BASE = 0.5
+PAUSE_MAX = 30.0
+
+
+class EndpointLimiter:
+    """单个接口的令牌桶与自适应并发上限
+
+    acquire在令牌不足、并发已满或处于暂停期时阻塞；release报告请求结果：
+    被限流时速率和并发上限减半并暂停，连续成功达到当前并发上限次数后并发加一、速率提高，
+    直到恢复预设值。
+    """
+
+    def __init__(self, rate, burst, max_concurrency, min_rate=MIN_RATE):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.min_rate = min(min_rate, rate)
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._successes = 0
+        self._consecutive_throttles = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_acquire(self, start):
+        """在持有锁时尝试占用一个请求名额
+
+        返回 (是否成功, 需要等待的秒数)；并发已满时等待秒数为None，表示等待其他请求完成。
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self._in_flight < self.concurrency and now >= self._paused_until and self._tokens >= 1:
+            self._tokens -= 1
+            self._in_flight += 1
+            self.requests += 1
+            self.waited += now - start
+            return True, 0.0
+        if self._in_flight >= self.concurrency:
+            return False, None
+        return False, max(self._paused_until - now, (1 - self._tokens) / self.rate)
+
+    def acquire(self):
+        """等待直到可以发送一个请求"""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                acquired, timeout = self._try_acquire(start)
+                if acquired:
+                    return
+                self._cond.wait(timeout)
+
+    def release(self, throttled=False, retry_after=None, failed=False):
+        """报告请求结果，throttled为True时降低速率和并发并暂停；failed表示连接失败，不影响速率"""
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                now = time.monotonic()
+                # 暂停期间返回的限流响应来自暂停前发出的请求，不重复减半
+                if now >= self._paused_until:
+                    self._consecutive_throttles += 1
+                    self._successes = 0
+                    self.concurrency = max(1, self.concurrency // 2)
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    pause = retry_after
+                    if pause is None:
+                        pause = min(PAUSE_MAX, PAUSE_BASE * 2 ** (self._consecutive_throttles - 1))
+                    self._refill(now)
+                    self._tokens = min(self._tokens, 0.0)
+                    self._paused_until = now + pause
+            elif not failed:
+                self._consecutive_throttles = 0
+                self._successes += 1
+                if self._successes >= self.concurrency:
+                    self._successes = 0
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                    self.rate = min(self.base_rate, self.rate * 1.5)
+            self._cond.notify_all()
+
+    def stats(self):
+        """返回请求数、限流次数、累计等待秒数以及当前速率和并发上限"""
+        with self._cond:
+            return {
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'waited': self.waited,
+                'rate': self.rate,
+                'concurrency': self.concurrency,
+            }
+
+
+class RateLimiter:
+    """按接口路径管理EndpointLimiter，未列出的路径使用默认预算
+
+    limiter_class为各接口使用的限流器类型，协程客户端传入async_api.AsyncEndpointLimiter。
+    """
+
+    def __init__(self, budgets=None, default_budget=DEFAULT_BUDGET, limiter_class=EndpointLimiter):
+        self.budgets = ENDPOINT_BUDGETS if budgets is None else budgets
+        self.default_budget = default_budget
+        self.limiter_class = limiter_class
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """获取指定接口的限流器，首次调用时创建"""
+        limiter = self._limiters.get(path)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(path)
+                if limiter is None:
+                    limiter = self.limiter_class(*self.budgets.get(path, self.default_budget))
+                    self._limiters[path] = limiter
+        return limiter
+
+    def stats(self):
+        """返回 {接口路径: 统计信息}"""
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {path: limiter.stats() for path, limiter in limiters.items()}
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据记录模块，在API边界把接口返回的JSON解析为只含必要字段的紧凑记录
+"""
+
+from utils import normalize_song_name, normalize_artist_name
+from vip_classifier import fee_flags, TRIAL_FLAG
+
+
+class Track:
+    """歌单歌曲记录，flags为fee和版权fee对应的VIP类别标志位"""
+
+    __slots__ = ('id', 'name', 'artists', 'fee', 'privilege_fee', 'flags', 'vip_type')
+
+    def __init__(self, id, name, artists=(), fee=None, privilege_fee=None, vip_type=''):
+        self.id = id
+        self.name = name
+        self.artists = artists
+        self.fee = fee
+        self.privilege_fee = privilege_fee
+        self.flags = fee_flags(fee, privilege_fee)
+        self.vip_type = vip_type
+
+    @classmethod
+    def from_api(cls, song):
+        """从歌曲详情JSON解析，忽略为空的艺术家"""
+        privilege = song.get('privilege') or {}
+        artists = tuple(artist['name'] for artist in song.get('ar') or []
+                        if artist is not None and artist.get('name') is not None)
+        return cls(song['id'], song.get('name') or '', artists, song.get('fee'), privilege.get('fee'))
+
+    def to_dict(self):
+        """转换为与歌曲详情JSON结构相同的精简字典，可再由from_api解析"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'ar': [{'name': artist} for artist in self.artists],
+            'fee': self.fee,
+            'privilege': {'fee': self.privilege_fee},
+        }
+
+    @property
+    def artists_str(self):
+        return ', '.join(self.artists)
+
+    def __repr__(self):
+        return f"Track({self.id!r}, {self.name!r}, {self.artists!r})"
+
+
+class UrlInfo:
+    """歌曲URL信息记录，只保留VIP判断所需的fee和试听信息"""
+
+    __slots__ = ('id', 'fee', 'trial', 'flags')
+
+    def __init__(self, id, fee=None, trial=False):
+        self.id = id
+        self.fee = fee
+        self.trial = trial
+        self.flags = fee_flags(fee) | (TRIAL_FLAG if trial else 0)
+
+    @classmethod
+    def from_api(cls, item):
+        """从歌曲URL接口返回的条目解析"""
+        return cls(item['id'], item.get('fee'), bool(item.get('freeTrialInfo')))
+
+    def __repr__(self):
+        return f"UrlInfo({self.id!r}, fee={self.fee!r}, trial={self.trial!r})"
+
+
+class CloudEntry:
+    """云盘音乐记录，标准化名称在首次访问时才计算，云盘索引文件可用时不需要标准化"""
+
+    __slots__ = ('song_id', 'name', 'artist', 'matched_name', 'matched_artist', 'file_size', 'add_time',
+                 '_normalized_name', '_normalized_artist')
+
+    def __init__(self, song_id, name, artist, matched_name='', matched_artist='', file_size=0, add_time=0):
+        self.song_id = song_id
+        self.name = name
+        self.artist = artist
+        self.matched_name = matched_name
+        self.matched_artist = matched_artist
+        self.file_size = file_size
+        self.add_time = add_time
+        self._normalized_name = None
+        self._normalized_artist = None
+
+    @property
+    def normalized_name(self):
+        if self._normalized_name is None:
+            self._normalized_name = normalize_song_name(self.name)
+        return self._normalized_name
+
+    @property
+    def normalized_artist(self):
+        if self._normalized_artist is None:
+            self._normalized_artist = normalize_artist_name(self.artist)
+        return self._normalized_artist
+
+    @classmethod
+    def from_api(cls, item, matched_track=None):
+        """从云盘接口返回的条目解析，matched_track为网易云匹配到的歌曲"""
+        return cls(
+            item.get('songId', 0),
+            item.get('songName', ''),
+            item.get('artist', ''),
+            matched_track.name if matched_track else '',
+            matched_track.artists_str if matched_track else '',
+            item.get('fileSize', 0),
+            item.get('addTime', 0),
+        )
+
+    def __repr__(self):
+        return f"CloudEntry({self.song_id!r}, {self.name!r}, {self.artist!r})"
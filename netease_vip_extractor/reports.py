@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+报告输出模块，从记录迭代器按块写出Markdown、CSV和JSONL报告
+
+所有格式在同一次遍历中写出，每块记录拼接后一次性写入文件，不需要预先持有全部记录。
+"""
+
+import csv
+import json
+from itertools import islice
+from operator import attrgetter
+import metrics
+
+# 支持的报告格式及对应的文件扩展名
+REPORT_FORMATS = ('md', 'csv', 'jsonl')
+DEFAULT_FORMATS = ('md',)
+
+# 每块处理的记录数和文件写缓冲大小
+CHUNK_ROWS = 2000
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+_report_formats = DEFAULT_FORMATS
+
+
+class Column:
+    """报告列：表头、JSONL字段名、从记录取值的函数和显示格式化函数
+
+    getter可以是属性名或接收记录的函数；markdown为False的列只写入CSV和JSONL；
+    separator为Markdown表头下分隔行中该列的内容。
+    """
+
+    __slots__ = ('header', 'field', 'getter', 'display', 'markdown', 'separator')
+
+    def __init__(self, header, field, getter, display=None, markdown=True, separator='--------'):
+        self.header = header
+        self.field = field
+        self.getter = attrgetter(getter) if isinstance(getter, str) else getter
+        self.display = display
+        self.markdown = markdown
+        self.separator = separator
+
+
+class ReportWriter:
+    """报告写入器基类，子类实现表头、行块和结尾的输出
+
+    每块数据按列传入：start为该块第一条记录的序号，values为与columns一一对应的原始值列表。
+    """
+
+    extension = ''
+    # 为False时只需要markdown列的取值
+    all_columns = True
+    newline = None
+    encoding = 'utf-8'
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self._file = open(path, 'w', encoding=self.encoding, newline=self.newline, buffering=WRITE_BUFFER_SIZE)
+
+    def write_header(self, header_lines):
+        pass
+
+    def write_rows(self, start, values):
+        """写入一块记录"""
+        raise NotImplementedError
+
+    def write_footer(self, footer_lines):
+        pass
+
+    def close(self):
+        self._file.close()
+
+
+def _display(columns, values):
+    """按列把原始值转换为显示文本"""
+    return [values[i] if column.display is None else list(map(column.display, values[i]))
+            for i, column in enumerate(columns)]
+
+
+class MarkdownWriter(ReportWriter):
+    extension = 'md'
+    all_columns = False
+
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        self._columns = [column for column in columns if column.markdown]
+        self._positions = [i for i, column in enumerate(columns) if column.markdown]
+        self._template = '| %s' + ' | %s' * len(self._columns) + ' |\n'
+
+    def write_header(self, header_lines):
+        headers = ['序号'] + [column.header for column in self._columns]
+        separators = ['------'] + [column.separator for column in self._columns]
+        self._file.write(''.join(header_lines)
+                         + '| ' + ' | '.join(headers) + ' |\n'
+                         + '|' + '|'.join(separators) + '|\n')
+
+    def write_rows(self, start, values):
+        selected = _display(self._columns, [values[i] for i in self._positions])
+        template = self._template
+        numbers = range(start, start + len(selected[0]))
+        self._file.write(''.join([template % row for row in zip(numbers, *selected)]))
+
+    def write_footer(self, footer_lines):
+        self._file.write(''.join(footer_lines))
+
+
+class CsvWriter(ReportWriter):
+    extension = 'csv'
+    newline = ''
+    # 带BOM以便Excel正确识别中文
+    encoding = 'utf-8-sig'
+
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        self._writer = csv.writer(self._file)
+
+    def write_header(self, header_lines):
+        self._writer.writerow(['序号'] + [column.header for column in self.columns])
+
+    def write_rows(self, start, values):
+        numbers = range(start, start + len(values[0]))
+        self._writer.writerows(zip(numbers, *_display(self.columns, values)))
+
+
+class JsonlWriter(ReportWriter):
+    """每行一条记录的JSON，保留原始值，便于其他工具处理"""
+
+    extension = 'jsonl'
+
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        self._fields = ['index'] + [column.field for column in columns]
+
+    def write_rows(self, start, values):
+        fields = self._fields
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        numbers = range(start, start + len(values[0]))
+        self._file.write(''.join([encode(dict(zip(fields, row))) + '\n' for row in zip(numbers, *values)]))
+
+
+WRITERS = {writer.extension: writer for writer in (MarkdownWriter, CsvWriter, JsonlWriter)}
+
+
+def set_report_formats(formats):
+    """设置默认输出的报告格式，忽略不支持的格式"""
+    global _report_formats
+    formats = tuple(fmt for fmt in formats if fmt in WRITERS)
+    _report_formats = formats or DEFAULT_FORMATS
+
+
+def get_report_formats():
+    return _report_formats
+
+
+def parse_formats(value):
+    """解析逗号分隔的格式列表，例如 md,csv,jsonl"""
+    formats = [fmt.strip().lower().lstrip('.') for fmt in value.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in WRITERS]
+    if unknown:
+        raise ValueError(f"不支持的报告格式: {', '.join(unknown)}，可选: {', '.join(REPORT_FORMATS)}")
+    return tuple(formats)
+
+
+@metrics.timed('write_report')
+def write_report(base_name, columns, records, header_lines=(), footer_lines=None, formats=None):
+    """把记录迭代器写为各格式的报告，返回 (文件名列表, 记录数)
+
+    每个报告都以从1开始的序号列开头；footer_lines为接收记录数、返回结尾行的函数，
+    用于事先不知道记录数的情况。
+    """
+    formats = formats or _report_formats
+    writers = [WRITERS[fmt](f"{base_name}.{fmt}", columns) for fmt in formats]
+    # 只有Markdown时跳过不显示的列
+    all_columns = any(writer.all_columns for writer in writers)
+    getters = [column.getter if all_columns or column.markdown else None for column in columns]
+    count = 0
+    try:
+        for writer in writers:
+            writer.write_header(header_lines)
+
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, CHUNK_ROWS))
+            if not chunk:
+                break
+            values = [list(map(getter, chunk)) if getter else None for getter in getters]
+            for writer in writers:
+                writer.write_rows(count + 1, values)
+            count += len(chunk)
+
+        lines = footer_lines(count) if footer_lines else ()
+        for writer in writers:
+            writer.write_footer(lines)
+    finally:
+        for writer in writers:
+            writer.close()
+    return [writer.path for writer in writers], count
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+歌曲详情缓存模块，使用SQLite在本地持久化歌曲名称和艺术家
+
+fee和版权信息会随时间变化，而且版权信息按登录账号区分，不写入缓存，需要判断VIP时总是重新请求。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from records import Track
+
+# 缓存文件路径
+CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "song_cache.db")
+
+# 缓存有效期（秒）和最大条目数
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 200000
+
+# 单条SQL语句中的最大参数个数
+_QUERY_CHUNK_SIZE = 500
+
+
+def _names_only(song):
+    """只保留歌曲详情JSON中的ID、名称和艺术家"""
+    return {'id': song['id'], 'name': song.get('name'), 'ar': song.get('ar') or []}
+
+
+class SongCache:
+    """按歌曲ID缓存歌曲名称和艺术家，条目超过有效期后失效，超过容量时按最近访问时间淘汰"""
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or CACHE_FILE
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS songs ("
+            "id INTEGER PRIMARY KEY, data TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_songs_accessed ON songs (accessed_at)")
+        self._conn.commit()
+
+    def get_many(self, song_ids):
+        """返回缓存中未过期的歌曲 {歌曲ID: Track}，并刷新其访问时间；返回的Track不含fee信息"""
+        now = time.time()
+        found = {}
+        unique_ids = list(dict.fromkeys(song_ids))
+        with self._lock:
+            for i in range(0, len(unique_ids), _QUERY_CHUNK_SIZE):
+                chunk = unique_ids[i:i+_QUERY_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT id, data FROM songs WHERE id IN ({placeholders}) AND fetched_at >= ?",
+                    chunk + [now - self.ttl]
+                ).fetchall()
+                for song_id, data in rows:
+                    found[song_id] = Track.from_api(_names_only(json.loads(data)))
+            if found:
+                self._conn.executemany("UPDATE songs SET accessed_at = ? WHERE id = ?",
+                                       [(now, song_id) for song_id in found])
+                self._conn.commit()
+        return found
+
+    def put_many(self, songs):
+        """写入Track列表的名称和艺术家，超过容量时淘汰最久未访问的条目"""
+        if not songs:
+            return
+        now = time.time()
+        rows = [(song.id, json.dumps(_names_only(song.to_dict()), ensure_ascii=False), now, now) for song in songs]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO songs (id, data, fetched_at, accessed_at) VALUES (?, ?, ?, ?)", rows)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """删除过期条目，并在超过容量时按LRU淘汰"""
+        self._conn.execute("DELETE FROM songs WHERE fetched_at < ?", (time.time() - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM songs WHERE id IN (SELECT id FROM songs ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """获取默认的歌曲详情缓存，打开失败时返回None；缓存不含账号相关信息，可以在多个账号之间共用"""
+    global _default_cache
+    if _default_cache is None:
+        try:
+            _default_cache = SongCache()
+        except sqlite3.Error as e:
+            print(f"打开歌曲详情缓存失败: {e}")
+            return None
+    return _default_cache
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+歌曲详情模块，歌单歌曲和云盘匹配歌曲共用的分批并发获取逻辑
+"""
+
+from http_client import get_client
+from utils import chunk_list, run_batches
+from records import Track
+import metrics
+
+# API路径
+SONG_DETAIL_PATH = "/weapi/v3/song/detail"
+
+# 歌曲详情分批请求参数
+DETAIL_BATCH_SIZE = 1000
+DETAIL_MAX_WORKERS = 4
+DETAIL_MAX_RETRIES = 2
+
+
+def songs_request(batch_ids):
+    """单批歌曲详情的请求数据"""
+    return {
+        'c': '[' + ','.join([f'{{"id":{track_id}}}' for track_id in batch_ids]) + ']',
+        'ids': '[' + ','.join([str(track_id) for track_id in batch_ids]) + ']',
+        'csrf_token': ''
+    }
+
+
+def parse_songs(result):
+    """解析歌曲详情响应，返回Track列表，接口返回错误码时抛出异常"""
+    if result.get('code') != 200:
+        raise RuntimeError(f"接口返回错误码: {result.get('code')}")
+    return [Track.from_api(song) for song in result.get('songs', [])]
+
+
+def _fetch_songs_batch(batch_ids, cookies=None):
+    """获取单批歌曲详情，接口返回错误码时抛出异常"""
+    return parse_songs(get_client().post(SONG_DETAIL_PATH, songs_request(batch_ids), cookies=cookies))
+
+
+@metrics.timed('get_songs_detail')
+def get_songs_detail(track_ids, cookies=None, max_workers=DETAIL_MAX_WORKERS, max_retries=DETAIL_MAX_RETRIES, cache=None,
+                     checkpoint=None, with_fees=True):
+    """获取歌曲详情，返回Track列表；传入checkpoint时跳过已完成的批次
+
+    传入cache时把获取到的名称和艺术家写入缓存。with_fees为False时只需要名称和艺术家（如云盘匹配歌曲），
+    缓存中已有的歌曲不再请求，返回的这部分Track不含fee信息；需要判断VIP时必须保持默认的True。
+    """
+    songs_by_id = cache.get_many(track_ids) if cache is not None and not with_fees else {}
+    missing_ids = [track_id for track_id in track_ids if track_id not in songs_by_id]
+    if songs_by_id:
+        print(f"缓存命中 {len(songs_by_id)} 首歌曲，需要请求 {len(missing_ids)} 首")
+    
+    # 由于API限制，每次最多获取1000首歌曲，所以需要分批请求
+    batches = chunk_list(missing_ids, DETAIL_BATCH_SIZE)
+    # 各批次并发请求，失败的批次单独重试，结果按原顺序合并
+    fetch = lambda batch: _fetch_songs_batch(batch, cookies)
+    if checkpoint is not None:
+        fetch = checkpoint.cached('detail', fetch, encode=lambda songs: [song.to_dict() for song in songs],
+                                  decode=lambda data: [Track.from_api(song) for song in data])
+    results, failures = run_batches(fetch, batches, max_workers=max_workers, max_retries=max_retries)
+    if failures and checkpoint is not None:
+        checkpoint.incomplete = True
+    
+    for index, error in failures:
+        start = index * DETAIL_BATCH_SIZE
+        print(f"第 {index + 1} 批歌曲详情获取失败（第 {start + 1}-{start + len(batches[index])} 首）: {error}")
+    
+    fetched_songs = []
+    for batch_songs in results:
+        if batch_songs:
+            fetched_songs.extend(batch_songs)
+    if cache is not None:
+        cache.put_many(fetched_songs)
+    
+    for song in fetched_songs:
+        songs_by_id[song.id] = song
+    return [songs_by_id[track_id] for track_id in dict.fromkeys(track_ids) if track_id in songs_by_id]
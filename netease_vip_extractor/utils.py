@@ -7,52 +7,139 @@
 import re
 import os
 import json
+import time
+from functools import lru_cache
 from datetime import datetime
+import metrics
 
 # 配置文件路径
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
 
+# 歌曲名中需要移除的版本标识，按正则分支的匹配优先级排列
+VERSION_TAGS = ('live', 'remix', 'cover', '翻唱', '现场', '版', '纯音乐', '伴奏', '纯音版', '完整版', '片段', '片段版', '混音', '混音版')
+
+# 括号内容规则：(开括号, 正则)，按顺序依次移除，不含开括号时跳过
+_BRACKET_RULES = (
+    ('(', re.compile(r'\([^)]*\)')),
+    ('[', re.compile(r'\[[^\]]*\]')),
+    ('（', re.compile(r'（[^）]*）')),  # 中文括号
+    ('【', re.compile(r'【[^】]*】')),  # 中文方括号
+)
+
+# 特殊字符（保留中文）
+_SPECIAL_CHARS = r'[^\w\s\u4e00-\u9fff]'
+
+# 每个标准化器缓存的结果数量上限
+NORMALIZE_CACHE_SIZE = 65536
+
+
+class NameNormalizer:
+    """名称标准化器，规则只编译一次，结果缓存在有界的LRU缓存中"""
+
+    def __init__(self, version_tags=(), cache_size=NORMALIZE_CACHE_SIZE):
+        self.version_tags = tuple(version_tags)
+        if self.version_tags:
+            # 版本标识由文字字符组成，与特殊字符互不重叠，合并为一次替换结果不变
+            tags = '|'.join(re.escape(tag) for tag in self.version_tags)
+            self._cleanup = re.compile(f'(?i:{tags})|{_SPECIAL_CHARS}')
+        else:
+            self._cleanup = re.compile(_SPECIAL_CHARS)
+        self._normalize = lru_cache(maxsize=cache_size)(self._normalize_uncached)
+
+    def _normalize_uncached(self, name):
+        # 去除括号内容
+        for opener, pattern in _BRACKET_RULES:
+            if opener in name:
+                name = pattern.sub('', name)
+        
+        # 移除版本标识和特殊字符
+        name = self._cleanup.sub('', name)
+        
+        # 去除多余空格并转为小写
+        return ' '.join(name.lower().split())
+
+    def __call__(self, name):
+        if not name:
+            return ""
+        return self._normalize(name)
+
+
+_song_normalizer = NameNormalizer(VERSION_TAGS)
+_artist_normalizer = NameNormalizer()
+
+
+def set_version_tags(version_tags):
+    """替换歌曲名标准化时移除的版本标识"""
+    global _song_normalizer
+    _song_normalizer = NameNormalizer(version_tags)
+
+
+def get_version_tags():
+    """返回当前歌曲名标准化时移除的版本标识"""
+    return _song_normalizer.version_tags
+
+
 def normalize_song_name(name):
     """标准化歌曲名称，去除特殊字符，便于比较"""
-    if not name:
-        return ""
-    
-    # 去除括号内容和特殊字符
-    name = re.sub(r'\([^)]*\)', '', name)
-    name = re.sub(r'\[[^\]]*\]', '', name)
-    name = re.sub(r'（[^）]*）', '', name)  # 中文括号
-    name = re.sub(r'【[^】]*】', '', name)  # 中文方括号
-    
-    # 移除常见的版本标识
-    name = re.sub(r'(live|remix|cover|翻唱|现场|版|remix|纯音乐|伴奏|纯音版|完整版|片段|片段版|混音|混音版)', '', name, flags=re.IGNORECASE)
-    
-    # 去除特殊字符但保留中文
-    name = re.sub(r'[^\w\s\u4e00-\u9fff]', '', name)
-    
-    # 去除多余空格并转为小写
-    name = ' '.join(name.lower().split())
-    
-    return name.strip()
+    return _song_normalizer(name)
 
 
 def normalize_artist_name(name):
     """标准化艺术家名称，去除特殊字符，便于比较"""
-    if not name:
-        return ""
+    return _artist_normalizer(name)
+
+
+def levenshtein_distance(s1, s2, max_distance=None):
+    """计算Levenshtein距离
+
+    只保留两行滚动数组；给定max_distance时只计算宽度为2*max_distance+1的对角带，
+    一旦距离不可能不超过max_distance就提前返回max_distance + 1。
+    """
+    # 让s1为较短的字符串，减少行数
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    len1, len2 = len(s1), len(s2)
+    if max_distance is None:
+        max_distance = len2
+    over = max_distance + 1
     
-    # 去除括号内容和特殊字符
-    name = re.sub(r'\([^)]*\)', '', name)
-    name = re.sub(r'\[[^\]]*\]', '', name)
-    name = re.sub(r'（[^）]*）', '', name)  # 中文括号
-    name = re.sub(r'【[^】]*】', '', name)  # 中文方括号
+    # 长度差已超过上限，无需计算
+    if len2 - len1 > max_distance:
+        return over
+    if len1 == 0:
+        return len2
     
-    # 去除特殊字符但保留中文
-    name = re.sub(r'[^\w\s\u4e00-\u9fff]', '', name)
+    prev = [j if j <= max_distance else over for j in range(len2 + 1)]
+    cur = [over] * (len2 + 1)
     
-    # 去除多余空格并转为小写
-    name = ' '.join(name.lower().split())
+    for i in range(1, len1 + 1):
+        lo = max(1, i - max_distance)
+        hi = min(len2, i + max_distance)
+        cur[lo - 1] = i if lo == 1 and i <= max_distance else over
+        if hi < len2:
+            cur[hi + 1] = over
+        row_min = cur[lo - 1]
+        c1 = s1[i - 1]
+        left = cur[lo - 1]
+        for j in range(lo, hi + 1):
+            value = prev[j - 1] if c1 == s2[j - 1] else prev[j - 1] + 1  # 替换
+            if prev[j] + 1 < value:
+                value = prev[j] + 1  # 删除
+            if left + 1 < value:
+                value = left + 1  # 插入
+            if value > over:
+                value = over
+            cur[j] = value
+            left = value
+            if value < row_min:
+                row_min = value
+        
+        # 整行都超过上限，最终距离也必然超过
+        if row_min > max_distance:
+            return over
+        prev, cur = cur, prev
     
-    return name.strip()
+    return min(prev[len2], over)
 
 
 def similarity(s1, s2):
@@ -62,37 +149,37 @@ def similarity(s1, s2):
     if not s1 or not s2:
         return 0.0
     
-    # 计算Levenshtein距离
-    len1, len2 = len(s1), len(s2)
-    matrix = [[0 for _ in range(len2 + 1)] for _ in range(len1 + 1)]
-    
-    for i in range(len1 + 1):
-        matrix[i][0] = i
-    for j in range(len2 + 1):
-        matrix[0][j] = j
-    
-    for i in range(1, len1 + 1):
-        for j in range(1, len2 + 1):
-            cost = 0 if s1[i-1] == s2[j-1] else 1
-            matrix[i][j] = min(
-                matrix[i-1][j] + 1,      # 删除
-                matrix[i][j-1] + 1,      # 插入
-                matrix[i-1][j-1] + cost  # 替换
-            )
-    
     # 计算相似度
-    distance = matrix[len1][len2]
-    max_len = max(len1, len2)
-    if max_len == 0:
-        return 1.0
+    distance = levenshtein_distance(s1, s2)
+    max_len = max(len(s1), len(s2))
     return 1.0 - distance / max_len
 
 
+def similarity_exceeds(s1, s2, threshold):
+    """判断similarity(s1, s2) > threshold，按阈值限制编辑距离以便提前退出"""
+    if not s1 and not s2:
+        return 1.0 > threshold
+    if not s1 or not s2:
+        return 0.0 > threshold
+    
+    # 相似度超过阈值时允许的最大编辑距离，按与similarity相同的浮点运算校正边界
+    max_len = max(len(s1), len(s2))
+    max_distance = int((1.0 - threshold) * max_len)
+    while max_distance >= 0 and 1.0 - max_distance / max_len <= threshold:
+        max_distance -= 1
+    while max_distance < max_len and 1.0 - (max_distance + 1) / max_len > threshold:
+        max_distance += 1
+    if max_distance < 0:
+        return False
+    
+    return levenshtein_distance(s1, s2, max_distance) <= max_distance
+
+
 def format_timestamp(timestamp):
     """将时间戳格式化为日期时间字符串"""
     if timestamp:
         try:
-            return datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')
+            return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp / 1000))
         except:
             return "未知"
     return "未知"
@@ -141,4 +228,47 @@ def save_playlist_id(playlist_id):
 def get_playlist_id():
     """获取保存的歌单ID"""
     config = load_config()
-    return config.get('playlist_id', '') 
\ No newline at end of file
+    return config.get('playlist_id', '')
+
+
+def chunk_list(items, size):
+    """按固定大小将列表切分为若干批"""
+    return [items[i:i+size] for i in range(0, len(items), size)]
+
+
+def run_batches(fetch, batches, max_workers=4, max_retries=2, retry_delay=0.5):
+    """使用有上限的线程池并发执行批量请求
+
+    fetch接收单个批次并返回结果，失败时抛出异常。失败的批次会单独重试，
+    返回 (results, failures)：results与batches顺序一致，失败批次对应None；
+    failures为 [(批次序号, 异常)] 列表。
+    """
+    def run_one(batch):
+        attempt = 0
+        while True:
+            try:
+                return fetch(batch)
+            except Exception:
+                if attempt >= max_retries:
+                    raise
+                attempt += 1
+                metrics.record_retry('batch')
+                time.sleep(retry_delay * attempt)
+
+    results = [None] * len(batches)
+    failures = []
+    if not batches:
+        return results, failures
+
+    # 导入concurrent.futures会连带导入logging，推迟到真正并发时
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        futures = [executor.submit(run_one, batch) for batch in batches]
+        for index, future in enumerate(futures):
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                failures.append((index, e))
+    
+    return results, failures
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+VIP分类模块，按列存放每首歌曲的类别标志位，一次性计算各类别的掩码
+
+安装了NumPy时使用向量化运算，否则退回到等价的纯Python实现。NumPy在首次分类时才导入。
+只判断一个类别时直接遍历歌曲记录，比构建标志位列更快。
+"""
+
+from array import array
+
+# 尚未尝试导入时为False，未安装时为None
+_np = False
+
+
+def _numpy():
+    """首次调用时导入NumPy，未安装时返回None"""
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+# 会员专享类别，find_vip_songs默认只识别该类别
+MEMBER_ONLY = '会员专享'
+
+# URL信息中带有试听信息的歌曲
+TRIAL_ONLY = '仅可试听'
+
+# 各类别对应的标志位
+CATEGORY_FLAGS = {
+    MEMBER_ONLY: 1,
+    '付费专辑': 2,
+    '会员高音质': 4,
+    TRIAL_ONLY: 8,
+}
+
+# fee值对应的标志位，歌曲、版权信息或URL信息中任一fee等于该值即属于对应类别
+FEE_FLAGS = {
+    1: CATEGORY_FLAGS[MEMBER_ONLY],
+    4: CATEGORY_FLAGS['付费专辑'],
+    8: CATEGORY_FLAGS['会员高音质'],
+}
+TRIAL_FLAG = CATEGORY_FLAGS[TRIAL_ONLY]
+
+ALL_CATEGORIES = tuple(CATEGORY_FLAGS)
+
+
+def fee_flags(*fees):
+    """把若干fee值转换为类别标志位，解析记录时调用一次"""
+    flags = 0
+    for fee in fees:
+        flags |= FEE_FLAGS.get(fee, 0)
+    return flags
+
+
+class TrackColumns:
+    """按列存放的类别标志位，标志位合并了歌曲、版权信息和URL信息"""
+
+    def __init__(self, tracks, song_urls):
+        self._np = np = _numpy()
+        get_url = song_urls.get
+        flags = [track.flags | getattr(get_url(track.id), 'flags', 0) for track in tracks]
+        if np is not None:
+            self.flags = np.array(flags, dtype=np.uint8)
+        else:
+            self.flags = array('B', flags)
+
+    def __len__(self):
+        return len(self.flags)
+
+    def mask(self, category):
+        """指定类别的掩码"""
+        flag = CATEGORY_FLAGS[category]
+        if self._np is not None:
+            return (self.flags & flag) != 0
+        return [bool(value & flag) for value in self.flags]
+
+
+def true_indices(mask):
+    """返回掩码中为真的位置列表"""
+    if not isinstance(mask, list):
+        return mask.nonzero()[0].tolist()
+    return [index for index, value in enumerate(mask) if value]
+
+
+def select_tracks(tracks, song_urls, category):
+    """返回属于单个类别的歌曲列表
+
+    只判断一个类别时不构建标志位列，歌曲自身的标志位命中时也不再查URL信息，一次遍历即可完成。
+    """
+    flag = CATEGORY_FLAGS[category]
+    get_url = song_urls.get
+    selected = []
+    for track in tracks:
+        if track.flags & flag:
+            selected.append(track)
+        else:
+            url_info = get_url(track.id)
+            if url_info is not None and url_info.flags & flag:
+                selected.append(track)
+    return selected
+
+
+def classify_tracks(tracks, song_urls, categories=ALL_CATEGORIES):
+    """计算各类别的掩码，返回 {类别: 掩码}，掩码与tracks顺序一致"""
+    columns = TrackColumns(tracks, song_urls)
+    return {category: columns.mask(category) for category in categories}
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+优化前的标准化、相似度和云盘比对实现，原样保留作为等价性测试的参照
+"""
+
+import re
+
+
+def normalize_song_name(name):
+    """标准化歌曲名称，去除特殊字符，便于比较"""
+    if not name:
+        return ""
+
+    # 去除括号内容和特殊字符
+    name = re.sub(r'\([^)]*\)', '', name)
+    name = re.sub(r'\[[^\]]*\]', '', name)
+    name = re.sub(r'（[^）]*）', '', name)  # 中文括号
+    name = re.sub(r'【[^】]*】', '', name)  # 中文方括号
+
+    # 移除常见的版本标识
+    name = re.sub(r'(live|remix|cover|翻唱|现场|版|remix|纯音乐|伴奏|纯音版|完整版|片段|片段版|混音|混音版)', '', name, flags=re.IGNORECASE)
+
+    # 去除特殊字符但保留中文
+    name = re.sub(r'[^\w\s\u4e00-\u9fff]', '', name)
+
+    # 去除多余空格并转为小写
+    name = ' '.join(name.lower().split())
+
+    return name.strip()
+
+
+def normalize_artist_name(name):
+    """标准化艺术家名称，去除特殊字符，便于比较"""
+    if not name:
+        return ""
+
+    # 去除括号内容和特殊字符
+    name = re.sub(r'\([^)]*\)', '', name)
+    name = re.sub(r'\[[^\]]*\]', '', name)
+    name = re.sub(r'（[^）]*）', '', name)  # 中文括号
+    name = re.sub(r'【[^】]*】', '', name)  # 中文方括号
+
+    # 去除特殊字符但保留中文
+    name = re.sub(r'[^\w\s\u4e00-\u9fff]', '', name)
+
+    # 去除多余空格并转为小写
+    name = ' '.join(name.lower().split())
+
+    return name.strip()
+
+
+def similarity(s1, s2):
+    """计算两个字符串的相似度，使用完整矩阵的Levenshtein距离"""
+    if not s1 and not s2:
+        return 1.0
+    if not s1 or not s2:
+        return 0.0
+
+    len1, len2 = len(s1), len(s2)
+    matrix = [[0 for _ in range(len2 + 1)] for _ in range(len1 + 1)]
+
+    for i in range(len1 + 1):
+        matrix[i][0] = i
+    for j in range(len2 + 1):
+        matrix[0][j] = j
+
+    for i in range(1, len1 + 1):
+        for j in range(1, len2 + 1):
+            cost = 0 if s1[i-1] == s2[j-1] else 1
+            matrix[i][j] = min(
+                matrix[i-1][j] + 1,      # 删除
+                matrix[i][j-1] + 1,      # 插入
+                matrix[i-1][j-1] + cost  # 替换
+            )
+
+    distance = matrix[len1][len2]
+    max_len = max(len1, len2)
+    if max_len == 0:
+        return 1.0
+    return 1.0 - distance / max_len
+
+
+def match_songs(songs, cloud_music_info):
+    """逐首比对歌曲与云盘，返回与songs顺序一致的 (匹配方式, 云盘条目位置) 列表，没有匹配时为None
+
+    与优化前filter_songs_by_cloud_music的判断逻辑相同，只是把打印改为返回匹配结果。
+    """
+    cloud_music_dict = {}
+    cloud_music_id_dict = {}
+
+    for position, item in enumerate(cloud_music_info):
+        if item.matched_name and item.matched_artist:
+            song_name = item.matched_name
+            artist_name = item.matched_artist
+        else:
+            song_name = item.name
+            artist_name = item.artist
+
+        normalized_name = normalize_song_name(song_name)
+        normalized_artist = normalize_artist_name(artist_name)
+
+        if item.song_id:
+            cloud_music_id_dict[item.song_id] = position
+
+        if normalized_name:
+            cloud_music_dict.setdefault((normalized_name, normalized_artist), []).append(position)
+            cloud_music_dict.setdefault(normalized_name, []).append(position)
+
+    results = []
+    for song in songs:
+        normalized_name = normalize_song_name(song.name)
+        normalized_artists = [normalize_artist_name(artist) for artist in song.artists]
+
+        if song.id in cloud_music_id_dict:
+            results.append(('id', cloud_music_id_dict[song.id]))
+            continue
+
+        match = None
+        for normalized_artist in normalized_artists:
+            if (normalized_name, normalized_artist) in cloud_music_dict:
+                match = ('exact', cloud_music_dict[normalized_name][0])
+                break
+
+        if match is None and normalized_name in cloud_music_dict:
+            cloud_artists = []
+            for position in cloud_music_dict[normalized_name]:
+                item = cloud_music_info[position]
+                if item.matched_artist:
+                    cloud_artists.append(normalize_artist_name(item.matched_artist))
+                else:
+                    cloud_artists.append(normalize_artist_name(item.artist))
+
+            for normalized_artist in normalized_artists:
+                for cloud_artist in cloud_artists:
+                    if (normalized_artist in cloud_artist or
+                            cloud_artist in normalized_artist or
+                            similarity(normalized_artist, cloud_artist) > 0.7):
+                        match = ('fuzzy', cloud_music_dict[normalized_name][0])
+                        break
+                if match is not None:
+                    break
+
+        results.append(match)
+    return results
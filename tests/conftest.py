@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+测试配置：核心代码以脚本目录方式组织，模块之间直接按文件名导入
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "netease_vip_extractor"))
+
+import pytest
+
+import checkpoint
+import cloud_index
+import cloud_music
+import diff_mode
+from http_client import set_client
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """在临时目录中运行，报告、断点状态、云盘快照、匹配索引和歌单快照都写到该目录下"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(checkpoint, 'STATE_DIR', str(tmp_path / 'state'))
+    monkeypatch.setattr(cloud_music, 'CLOUD_SNAPSHOT_FILE', str(tmp_path / 'cloud_snapshot.json'))
+    monkeypatch.setattr(cloud_index, 'CLOUD_INDEX_FILE', str(tmp_path / 'cloud_index.bin'))
+    monkeypatch.setattr(diff_mode, 'SNAPSHOT_DIR', str(tmp_path / 'playlist_snapshots'))
+    yield tmp_path
+    set_client(None)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+测试共用的辅助工具：连接模拟服务器的客户端、失败注入和带随机改写的合成数据
+"""
+
+import random
+
+import cloud_music
+from http_client import WeapiClient, WeapiError, set_client
+from mock_server import SyntheticLibrary, MOCK_SEC_KEY
+from records import CloudEntry, Track
+
+# 随机字符串使用的片段，覆盖括号、版本标识、大小写、标点和中英文混排
+FRAGMENTS = ['a', 'B', 'ming', 'Yue', ' ', '  ', '海', '星', '月', '(', ')', '[', ']', '（', '）', '【', '】',
+             'live', 'LIVE', 'Remix', 'cover', '翻唱', '现场', '版', '纯音版', '完整版', '片段版', '混音版', '伴奏',
+             '-', '·', '&', '!', '_', "'", '1', '2', 'é', 'ß']
+
+
+class FlakyClient(WeapiClient):
+    """对指定接口注入若干次失败的客户端，should_fail(path, data)为True时抛出WeapiError
+
+    requests按顺序记录每次请求的 (接口路径, 请求数据)。
+    """
+
+    def __init__(self, should_fail, failures, **kwargs):
+        super().__init__(**kwargs)
+        self.should_fail = should_fail
+        self.failures = failures
+        self.requests = []
+
+    def post(self, path, data, cookies=None):
+        self.requests.append((path, data))
+        if self.failures and self.should_fail(path, data):
+            self.failures -= 1
+            raise WeapiError("注入的失败", 500)
+        return super().post(path, data, cookies)
+
+
+def use_server(server, should_fail=None, failures=0):
+    """让全局客户端连接模拟服务器，可选地对should_fail匹配的请求注入failures次失败，返回该客户端"""
+    client = FlakyClient(should_fail or (lambda path, data: False), failures,
+                         base_url=server.base_url, sec_key=MOCK_SEC_KEY)
+    set_client(client)
+    return client
+
+
+def cloud_page(offset):
+    """匹配指定偏移的云盘分页请求"""
+    return lambda path, data: path == cloud_music.CLOUD_MUSIC_PATH and data.get('offset') == offset
+
+
+def random_text(rng, max_parts=8):
+    return ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, max_parts)))
+
+
+def mutate(rng, text):
+    """对字符串做一次随机的增删改，制造艺术家名称的近似写法"""
+    if not text:
+        return rng.choice(FRAGMENTS)
+    position = rng.randrange(len(text))
+    roll = rng.random()
+    if roll < 0.33:
+        return text[:position] + text[position + 1:]
+    if roll < 0.66:
+        return text[:position] + rng.choice('abcxyz海星') + text[position:]
+    return text[:position] + rng.choice('abcxyz海星') + text[position + 1:]
+
+
+def fuzzed_library(seed, size=3000):
+    """合成歌单和云盘，并给部分云盘条目的艺术家加上随机改写，使模糊匹配的各个分支都被覆盖
+
+    返回 (歌单Track列表, 云盘CloudEntry列表)。
+    """
+    rng = random.Random(seed)
+    library = SyntheticLibrary(size, cloud_size=size, seed=seed)
+    songs = library.tracks()
+    cloud = []
+    for item in library.cloud:
+        item = dict(item)
+        roll = rng.random()
+        if roll < 0.2:
+            item['artist'] = mutate(rng, item['artist'])
+        elif roll < 0.25:
+            item['artist'] = ''
+        elif roll < 0.3:
+            item['artist'] = item['artist'].upper() + ' (feat. ' + random_text(rng, 3) + ')'
+        song = library.songs.get(item['songId'])
+        cloud.append(CloudEntry.from_api(item, Track.from_api(song) if song else None))
+    return songs, cloud
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+协程接口测试：结果与逐首判断和比对一致，多个用户同时运行互不影响，不写入本地云盘索引文件
+"""
+
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+import async_api
+import song_cache
+from async_api import AsyncWeapiClient, run_playlists
+from extract_by_id import find_vip_songs, filter_songs_by_cloud_music
+from matcher import CloudMusicIndex
+from mock_server import SyntheticLibrary, MockWeapiServer, MOCK_SEC_KEY
+from song_cache import SongCache
+
+
+def _library(size, seed, extra_playlist=True):
+    library = SyntheticLibrary(size, cloud_size=size, seed=seed)
+    if extra_playlist:
+        library.playlists[2] = library.track_ids[size // 2:] + library.track_ids[:100]
+    return library
+
+
+def _expected(library):
+    """按歌单返回 {歌单ID: (VIP歌曲ID, 过滤后的歌曲ID, 移除的歌曲ID)}"""
+    vip_songs = find_vip_songs(library.tracks(), library.url_infos())
+    _, removed_songs = filter_songs_by_cloud_music(vip_songs, None, index=CloudMusicIndex(library.cloud_music_info()))
+    vip_ids = {song.id for song in vip_songs}
+    removed_ids = {song.id for song in removed_songs}
+    expected = {}
+    for playlist_id, track_ids in library.playlists.items():
+        vip = [track_id for track_id in track_ids if track_id in vip_ids]
+        expected[playlist_id] = (vip, [track_id for track_id in vip if track_id not in removed_ids],
+                                 [track_id for track_id in vip if track_id in removed_ids])
+    return expected
+
+
+def _ids(result):
+    _, vip_songs, filtered_songs, removed_songs, _ = result
+    return tuple([song.id for song in songs] for songs in (vip_songs, filtered_songs, removed_songs))
+
+
+async def _run_user(server, library, cookies, cache):
+    async with AsyncWeapiClient(base_url=server.base_url, sec_key=MOCK_SEC_KEY) as client:
+        return await run_playlists(client, list(library.playlists), cookies, cache=cache)
+
+
+def test_results_match_per_song_check(workspace):
+    library = _library(1500, seed=0)
+    with MockWeapiServer(library) as server:
+        results = asyncio.run(_run_user(server, library, {}, None))
+
+    expected = _expected(library)
+    assert [_ids(result) for result in results] == [expected[playlist_id] for playlist_id in library.playlists]
+    assert [len(result[4]) for result in results] == [len(library.cloud)] * len(results)
+    assert not os.path.exists(workspace / 'cloud_index.bin')
+
+
+def test_users_run_concurrently_without_sharing_state(workspace):
+    first, second = _library(1200, seed=1), _library(800, seed=2, extra_playlist=False)
+    cache = SongCache(str(workspace / 'song_cache.db'))
+
+    async def run_both(first_server, second_server):
+        return await asyncio.gather(_run_user(first_server, first, {'MUSIC_U': 'first'}, cache),
+                                    _run_user(second_server, second, {'MUSIC_U': 'second'}, cache))
+
+    try:
+        with MockWeapiServer(first) as first_server, MockWeapiServer(second) as second_server:
+            first_results, second_results = asyncio.run(run_both(first_server, second_server))
+    finally:
+        cache.close()
+
+    for library, results in ((first, first_results), (second, second_results)):
+        expected = _expected(library)
+        assert [_ids(result) for result in results] == [expected[playlist_id] for playlist_id in library.playlists]
+        cloud_keys = [(entry.song_id, entry.add_time) for entry in results[0][4]]
+        assert cloud_keys == [(item['songId'], item['addTime']) for item in library.cloud]
+    assert os.listdir(workspace) == ['song_cache.db']
+
+
+def test_main_saves_reports_per_playlist(workspace, monkeypatch):
+    library = _library(600, seed=3)
+    monkeypatch.setattr(async_api, 'get_cookies', lambda: {})
+    monkeypatch.setattr(song_cache, 'get_default_cache', lambda: None)
+
+    async def main(server):
+        async with AsyncWeapiClient(base_url=server.base_url, sec_key=MOCK_SEC_KEY) as client:
+            return await async_api.main(['1', 'https://music.163.com/playlist?id=2'], client)
+
+    with MockWeapiServer(library) as server:
+        results = asyncio.run(main(server))
+
+    assert len(results) == 2
+    reports = sorted(os.listdir(workspace))
+    for playlist_id in (1, 2):
+        playlist_name = results[playlist_id - 1][0]
+        assert any(name.startswith(f"{playlist_name}_{playlist_id}_vip_songs_2") for name in reports)
+        assert any(name.startswith(f"{playlist_name}_{playlist_id}_vip_songs_filtered_") for name in reports)
+    assert any(name.startswith("云盘音乐列表_") for name in reports)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+批量模式测试：多个歌单中重复的歌曲只查询一次，按歌单拆分的结果与逐个处理一致
+"""
+
+import json
+
+from batch import run_batch, read_playlist_ids
+from extract_by_id import SONG_URL_PATH, find_vip_songs, filter_songs_by_cloud_music
+from helpers import use_server
+from matcher import CloudMusicIndex
+from mock_server import SyntheticLibrary, MockWeapiServer
+from song_detail import SONG_DETAIL_PATH
+
+
+def _requested_ids(client, path):
+    return [track_id for request_path, data in client.requests if request_path == path
+            for track_id in json.loads(data['ids'])]
+
+
+def test_shared_tracks_are_queried_once(workspace):
+    library = SyntheticLibrary(1500, cloud_size=1500)
+    track_ids = library.track_ids
+    library.playlists[2] = track_ids[1000:] + track_ids[:300]
+    library.playlists[3] = track_ids[200:400]
+
+    with MockWeapiServer(library) as server:
+        client = use_server(server)
+        results = run_batch(['1', '2', '3'], {})
+
+    # 云盘匹配歌曲的详情另外查询一次
+    cloud_song_ids = list(dict.fromkeys(item['songId'] for item in library.cloud if item['songId']))
+    assert sorted(_requested_ids(client, SONG_DETAIL_PATH)) == sorted(track_ids + cloud_song_ids)
+    assert sorted(_requested_ids(client, SONG_URL_PATH)) == sorted(track_ids)
+
+    vip_songs = find_vip_songs(library.tracks(), library.url_infos())
+    _, removed_songs = filter_songs_by_cloud_music(vip_songs, None, index=CloudMusicIndex(library.cloud_music_info()))
+    vip_ids = {song.id for song in vip_songs}
+    removed_ids = {song.id for song in removed_songs}
+    assert list(results) == ['1', '2', '3']
+    for playlist_id, (_, playlist_vip, filtered, removed) in results.items():
+        expected = [track_id for track_id in library.playlists[int(playlist_id)] if track_id in vip_ids]
+        assert [song.id for song in playlist_vip] == expected
+        assert [song.id for song in filtered] == [track_id for track_id in expected if track_id not in removed_ids]
+        assert [song.id for song in removed] == [track_id for track_id in expected if track_id in removed_ids]
+
+
+def test_read_playlist_ids_dedupes_ids_and_links(tmp_path):
+    playlist_file = tmp_path / 'playlists.txt'
+    playlist_file.write_text("# 注释\n123\nhttps://music.163.com/#/playlist?id=456\n\n123\n", encoding='utf-8')
+    assert read_playlist_ids(['456', 'https://music.163.com/playlist?id=789&userid=1', 'abc'],
+                             str(playlist_file)) == ['456', '789', '123']
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+针对模拟weapi服务器的端到端测试：请求失败后的断点续传
+"""
+
+import os
+
+import pytest
+
+import extract_by_id
+from helpers import use_server, cloud_page
+from mock_server import SyntheticLibrary, MockWeapiServer
+from song_detail import SONG_DETAIL_PATH
+
+
+@pytest.fixture
+def saved(workspace, monkeypatch):
+    """记录每次保存的VIP歌曲 (是否过滤, 歌曲ID列表)"""
+    monkeypatch.setattr(extract_by_id, 'get_cookies', lambda: {})
+    monkeypatch.setattr(extract_by_id, 'get_default_cache', lambda: None)
+    monkeypatch.setattr(extract_by_id, 'save_playlist_id', lambda playlist_id: None)
+
+    saved = []
+    save_to_markdown = extract_by_id.save_to_markdown
+
+    def record(playlist_name, vip_songs, filtered=False, **kwargs):
+        vip_songs = list(vip_songs)
+        saved.append((filtered, [song.id for song in vip_songs]))
+        return save_to_markdown(playlist_name, vip_songs, filtered=filtered, **kwargs)
+
+    monkeypatch.setattr(extract_by_id, 'save_to_markdown', record)
+    return saved
+
+
+def _run(library, server, saved, argv=(), should_fail=None, failures=0):
+    use_server(server, should_fail, failures)
+    del saved[:]
+    extract_by_id.main([str(library.playlist_id)] + list(argv))
+    return dict(saved)
+
+
+def _detail_batch(first_id):
+    return lambda path, data: path == SONG_DETAIL_PATH and data['ids'].startswith(f"[{first_id},")
+
+
+@pytest.mark.parametrize('should_fail', [cloud_page(1000), _detail_batch(1001000)],
+                         ids=['cloud_page', 'detail_batch'])
+def test_resume_after_failure_matches_clean_run(workspace, saved, should_fail):
+    library = SyntheticLibrary(2500, cloud_size=2500)
+    with MockWeapiServer(library) as server:
+        expected = _run(library, server, saved)
+        assert not os.listdir(workspace / 'state')
+        # 删除云盘快照，使下一次运行全量获取云盘分页
+        os.remove(workspace / 'cloud_snapshot.json')
+
+        # 每个批次最多重试两次，注入足够多的失败使一个分页或批次最终失败
+        _run(library, server, saved, should_fail=should_fail, failures=3)
+        assert os.listdir(workspace / 'state'), "请求失败后应保留断点状态"
+
+        requests_before = server.request_count
+        assert _run(library, server, saved, ['--resume']) == expected
+        assert server.request_count - requests_before < requests_before / 2
+        assert not os.listdir(workspace / 'state'), "全部完成后应清除断点状态"
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+云盘索引文件测试：mmap索引与优化前的比对结果一致，同时写入互不干扰，直接打开索引文件时不标准化云盘歌曲名
+"""
+
+import os
+import threading
+
+import pytest
+
+import baseline
+import records
+from cloud_index import MappedCloudIndex, write_index_file, cloud_fingerprint, open_cloud_index
+from helpers import fuzzed_library
+from matcher import CloudMusicIndex
+from mock_server import SyntheticLibrary
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_mapped_index_matches_baseline(tmp_path, seed):
+    songs, cloud = fuzzed_library(seed)
+    path = str(tmp_path / 'cloud_index.bin')
+    fingerprint = cloud_fingerprint(cloud)
+    write_index_file(CloudMusicIndex(cloud), path, fingerprint)
+    mapped = MappedCloudIndex(path)
+    try:
+        assert mapped.fingerprint == fingerprint
+        assert [mapped.match_position(song) for song in songs] == baseline.match_songs(songs, cloud)
+    finally:
+        mapped.close()
+
+
+def test_concurrent_writers_do_not_collide(tmp_path):
+    path = str(tmp_path / 'cloud_index.bin')
+    clouds = [SyntheticLibrary(200, seed=seed).cloud_music_info() for seed in range(6)]
+    indexes = [(CloudMusicIndex(cloud), cloud_fingerprint(cloud)) for cloud in clouds]
+    errors = []
+    barrier = threading.Barrier(len(indexes))
+
+    def write(index, fingerprint):
+        barrier.wait()
+        try:
+            for _ in range(5):
+                write_index_file(index, path, fingerprint)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=item) for item in indexes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert os.listdir(tmp_path) == ['cloud_index.bin']
+    mapped = MappedCloudIndex(path)
+    try:
+        assert mapped.fingerprint in {fingerprint for _, fingerprint in indexes}
+    finally:
+        mapped.close()
+
+
+def test_reopening_index_does_not_normalize_cloud(tmp_path, monkeypatch):
+    library = SyntheticLibrary(500)
+    path = str(tmp_path / 'cloud_index.bin')
+    open_cloud_index(library.cloud_music_info(), path)
+
+    calls = []
+    for name in ('normalize_song_name', 'normalize_artist_name'):
+        function = getattr(records, name)
+        monkeypatch.setattr(records, name, lambda value, function=function: calls.append(value) or function(value))
+    index = open_cloud_index(library.cloud_music_info(), path)
+    try:
+        assert isinstance(index, MappedCloudIndex)
+        assert calls == []
+    finally:
+        index.close()
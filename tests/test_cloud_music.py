@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+云盘增量同步测试：快照按账号保存、不完整的列表不写入快照、云盘总数不一致和--full-sync时全量同步
+"""
+
+import os
+
+import pytest
+
+import cloud_music
+from helpers import use_server, cloud_page
+from http_client import set_client
+from mock_server import SyntheticLibrary, MockWeapiServer
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cloud_music, 'CLOUD_SNAPSHOT_FILE', str(tmp_path / 'cloud_snapshot.json'))
+    yield tmp_path
+    set_client(None)
+
+
+def _keys(entries):
+    return [cloud_music._cloud_entry_key(item) for item in entries]
+
+
+def test_incomplete_cloud_list_is_not_saved_as_snapshot(snapshot_dir):
+    library = SyntheticLibrary(500, cloud_size=3000)
+    snapshot_file = str(snapshot_dir / 'cloud_snapshot.json')
+    with MockWeapiServer(library) as server:
+        use_server(server, cloud_page(1000), 1)
+        assert len(cloud_music.sync_cloud_music({}, snapshot_file=snapshot_file)) == 1000
+        assert not os.path.exists(snapshot_file)
+
+        assert len(cloud_music.sync_cloud_music({}, snapshot_file=snapshot_file)) == 3000
+        snapshot = cloud_music.load_cloud_snapshot(snapshot_file)
+        assert len(snapshot['entries']) == 3000
+
+        # 增量同步失败时不移动水位线，原快照保持不变
+        snapshot['watermark'] = 0
+        cloud_music.save_cloud_snapshot(snapshot, snapshot_file)
+        use_server(server, cloud_page(1000), 1)
+        assert len(cloud_music.sync_cloud_music({}, snapshot_file=snapshot_file)) == 3000
+        assert cloud_music.load_cloud_snapshot(snapshot_file)['watermark'] == 0
+
+
+def test_snapshots_are_kept_per_account(snapshot_dir):
+    first, second = SyntheticLibrary(100, cloud_size=1500, seed=1), SyntheticLibrary(100, cloud_size=1200, seed=2)
+    with MockWeapiServer(first) as first_server, MockWeapiServer(second) as second_server:
+        use_server(first_server)
+        assert _keys(cloud_music.sync_cloud_music({'MUSIC_U': 'first'})) == _keys(first.cloud)
+        use_server(second_server)
+        assert _keys(cloud_music.sync_cloud_music({'MUSIC_U': 'second'})) == _keys(second.cloud)
+
+        first_file = cloud_music.cloud_snapshot_file({'MUSIC_U': 'first'})
+        second_file = cloud_music.cloud_snapshot_file({'MUSIC_U': 'second'})
+        assert first_file != second_file
+        assert len(cloud_music.load_cloud_snapshot(first_file)['entries']) == 1500
+        assert len(cloud_music.load_cloud_snapshot(second_file)['entries']) == 1200
+
+
+def test_count_mismatch_falls_back_to_full_sync(snapshot_dir):
+    library = SyntheticLibrary(100, cloud_size=2500)
+    cookies = {'MUSIC_U': 'user'}
+    with MockWeapiServer(library) as server:
+        use_server(server)
+        cloud_music.sync_cloud_music(cookies)
+
+        # 新上传一首，同时删除一首较早的歌曲：只看水位线会把删除的歌曲留在快照中
+        added = dict(library.cloud[0], addTime=library.cloud[0]['addTime'] + 1000, fileName='new.mp3')
+        deleted = library.cloud.pop(1800)
+        library.cloud.insert(0, added)
+        entries = cloud_music.sync_cloud_music(cookies)
+        assert _keys(entries) == _keys(library.cloud)
+        assert cloud_music._cloud_entry_key(deleted) not in _keys(entries)
+        snapshot = cloud_music.load_cloud_snapshot(cloud_music.cloud_snapshot_file(cookies))
+        assert _keys(snapshot['entries']) == _keys(library.cloud)
+
+        # 数目一致时只请求第一页
+        requests_before = server.request_count
+        assert _keys(cloud_music.sync_cloud_music(cookies)) == _keys(library.cloud)
+        assert server.request_count - requests_before == 1
+
+
+def test_full_sync_ignores_snapshot(snapshot_dir):
+    library = SyntheticLibrary(100, cloud_size=2500)
+    cookies = {'MUSIC_U': 'user'}
+    with MockWeapiServer(library) as server:
+        use_server(server)
+        cloud_music.sync_cloud_music(cookies)
+        requests_before = server.request_count
+        assert _keys(cloud_music.sync_cloud_music(cookies, full=True)) == _keys(library.cloud)
+        assert server.request_count - requests_before == 3
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+差异模式测试：各类变化与前后两次全量判断的差异一致，未过期的歌曲不重新请求
+"""
+
+import json
+
+import pytest
+
+from diff_mode import run_diff, ADDED, VIP_CHANGED, NEWLY_COVERED, NO_LONGER_COVERED, REMOVED
+from extract_by_id import find_vip_songs
+from helpers import use_server
+from matcher import CloudMusicIndex
+from mock_server import SyntheticLibrary, MockWeapiServer
+from song_cache import SongCache
+from song_detail import SONG_DETAIL_PATH
+
+
+@pytest.fixture
+def cache(workspace):
+    cache = SongCache(str(workspace / 'song_cache.db'))
+    yield cache
+    cache.close()
+
+
+def _state(library):
+    """按歌单当前内容全量判断，返回 {歌曲ID: (VIP类型, 是否被云盘覆盖)}"""
+    tracks = library.tracks()
+    vip_types = {song.id: song.vip_type for song in find_vip_songs(tracks, library.url_infos())}
+    index = CloudMusicIndex(library.cloud_music_info())
+    return {song.id: (vip_types.get(song.id, ''), song.id in vip_types and index.match(song) is not None)
+            for song in tracks}
+
+
+def _expected_changes(before, after):
+    changes = set()
+    for track_id, (vip_type, covered) in after.items():
+        if track_id not in before:
+            changes.add((ADDED, track_id))
+        elif before[track_id][0] != vip_type:
+            changes.add((VIP_CHANGED, track_id))
+        elif vip_type and before[track_id][1] != covered:
+            changes.add((NEWLY_COVERED if covered else NO_LONGER_COVERED, track_id))
+    changes.update((REMOVED, track_id) for track_id in before if track_id not in after)
+    return changes
+
+
+def _add_song(library, song_id, fee):
+    library.songs[song_id] = {'id': song_id, 'name': f"新歌{song_id}", 'ar': [{'id': 1, 'name': '新歌手'}],
+                              'fee': fee, 'privilege': {'id': song_id, 'fee': fee}}
+    library.urls[song_id] = {'id': song_id, 'fee': fee, 'url': None}
+    library.track_ids.append(song_id)
+
+
+def test_changes_match_full_recheck(workspace, cache):
+    library = SyntheticLibrary(1500, cloud_size=1500)
+    before = _state(library)
+    vip_ids = [track_id for track_id, (vip_type, _) in before.items() if vip_type]
+    covered = [track_id for track_id in vip_ids if before[track_id][1]]
+    uncovered = [track_id for track_id in vip_ids if not before[track_id][1]]
+    free_ids = [track_id for track_id, (vip_type, _) in before.items() if not vip_type]
+
+    with MockWeapiServer(library) as server:
+        use_server(server)
+        _, changes = run_diff(library.playlist_id, {}, cache=cache)
+        assert changes == []
+
+        # 免费歌曲变为会员专享，会员歌曲变为免费
+        for track_id in (free_ids[0], vip_ids[-1]):
+            fee = 0 if track_id == vip_ids[-1] else 1
+            library.songs[track_id]['fee'] = library.songs[track_id]['privilege']['fee'] = fee
+            library.urls[track_id]['fee'] = fee
+        # 上传一首未被覆盖的VIP歌曲，删除覆盖另一首VIP歌曲的云盘条目
+        song = library.songs[uncovered[0]]
+        library.cloud.insert(0, dict(library.cloud[0], songId=song['id'], songName=song['name'],
+                                     addTime=library.cloud[0]['addTime'] + 1000, fileName='upload.mp3'))
+        for track_id in covered:
+            remaining = [item for item in library.cloud if item['songId'] != track_id]
+            if len(remaining) < len(library.cloud):
+                library.cloud[:] = remaining
+                if not _state(library)[track_id][1]:
+                    break
+        # 歌单新增和移出歌曲
+        _add_song(library, 2000000, 1)
+        library.track_ids.remove(vip_ids[1])
+
+        after = _state(library)
+        expected = _expected_changes(before, after)
+        assert {change for change, _ in expected} == {ADDED, VIP_CHANGED, NEWLY_COVERED, NO_LONGER_COVERED, REMOVED}
+        _, changes = run_diff(library.playlist_id, {}, cache=cache, stale_after=0)
+    assert {(change.change, change.id) for change in changes} == expected
+
+
+def test_only_new_tracks_are_requested(workspace, cache):
+    library = SyntheticLibrary(1500, cloud_size=1500)
+    with MockWeapiServer(library) as server:
+        use_server(server)
+        run_diff(library.playlist_id, {}, cache=cache)
+
+        _add_song(library, 2000000, 1)
+        client = use_server(server)
+        _, changes = run_diff(library.playlist_id, {}, cache=cache)
+
+    # 云盘匹配歌曲的名称已在缓存中，只有新增歌曲需要请求详情
+    requested = [json.loads(data['ids']) for path, data in client.requests if path == SONG_DETAIL_PATH]
+    assert requested == [[2000000]]
+    assert [(change.change, change.id) for change in changes] == [(ADDED, 2000000)]
+    assert 2000000 in cache.get_many([2000000])
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+歌单详情测试：歌单中有已失效的歌曲时不重复请求歌单详情
+"""
+
+import pytest
+
+from extract_by_id import get_playlist_detail
+from helpers import use_server
+from http_client import set_client
+from mock_server import SyntheticLibrary, MockWeapiServer, MOCK_SEC_KEY
+
+
+@pytest.fixture
+def library():
+    library = SyntheticLibrary(1500)
+    library.unavailable_count = 3
+    yield library
+    set_client(None)
+
+
+def test_unavailable_tracks_do_not_trigger_refetch(library):
+    with MockWeapiServer(library) as server:
+        use_server(server)
+        assert get_playlist_detail(library.playlist_id, {}) == (library.playlist_name, library.track_ids)
+        assert server.request_count == 1
+
+
+def test_async_unavailable_tracks_do_not_trigger_refetch(library):
+    pytest.importorskip('aiohttp')
+    import asyncio
+    from async_api import AsyncWeapiClient, get_playlist_detail as get_playlist_detail_async
+
+    async def fetch(server):
+        client = AsyncWeapiClient(base_url=server.base_url, sec_key=MOCK_SEC_KEY)
+        try:
+            return await get_playlist_detail_async(client, library.playlist_id, {})
+        finally:
+            await client.close()
+
+    with MockWeapiServer(library) as server:
+        assert asyncio.run(fetch(server)) == (library.playlist_name, library.track_ids)
+        assert server.request_count == 1
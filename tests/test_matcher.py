@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+云盘匹配测试：匹配索引和多进程比对与优化前逐首比对的实现结果一致
+"""
+
+import pytest
+
+import baseline
+from helpers import fuzzed_library
+from matcher import CloudMusicIndex, match_all, _fork_context
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_cloud_index_matches_baseline(seed):
+    songs, cloud = fuzzed_library(seed)
+    expected = baseline.match_songs(songs, cloud)
+    index = CloudMusicIndex(cloud)
+    assert [index.match_position(song) for song in songs] == expected
+    # 三种匹配方式都应出现，否则测试数据没有覆盖到对应分支
+    assert {match[0] for match in expected if match} == {'id', 'exact', 'fuzzy'}
+
+
+@pytest.mark.skipif(_fork_context() is None, reason="多进程比对依赖fork")
+def test_parallel_match_all_matches_serial():
+    songs, cloud = fuzzed_library(7)
+    index = CloudMusicIndex(cloud)
+    serial = match_all(index, songs, processes=1)
+    assert match_all(index, songs, processes=3) == serial
+    assert serial == [None if match is None else (match[0], cloud[match[1]])
+                      for match in baseline.match_songs(songs, cloud)]
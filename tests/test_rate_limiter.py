@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+限流测试：被限流时速率和并发减半并暂停，恢复后逐步回到预设值；请求限流的模拟服务器时降速重试，最终全部成功
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from http_client import WeapiClient
+from mock_server import SyntheticLibrary, MockWeapiServer, MOCK_SEC_KEY
+from rate_limiter import EndpointLimiter, RateLimiter
+from song_detail import SONG_DETAIL_PATH, songs_request
+
+
+def test_throttle_halves_budget_and_recovers():
+    limiter = EndpointLimiter(80, 8, 4)
+    limiter.acquire()
+    limiter.acquire()
+    limiter.release(throttled=True, retry_after=0.05)
+    assert (limiter.rate, limiter.concurrency) == (40, 2)
+
+    # 暂停期间返回的限流响应来自暂停前发出的请求，不再减半
+    limiter.release(throttled=True)
+    assert (limiter.rate, limiter.concurrency) == (40, 2)
+
+    limiter.acquire()
+    assert limiter.stats()['waited'] >= 0.04
+    limiter.release()
+    limiter.acquire()
+    limiter.release()
+    assert (limiter.rate, limiter.concurrency) == (60, 3)
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release()
+    assert (limiter.rate, limiter.concurrency) == (80, 4)
+
+
+@pytest.mark.parametrize('throttle_status', [200, 429])
+def test_backs_off_against_throttling_server(throttle_status):
+    library = SyntheticLibrary(100)
+    batches = [library.track_ids[i:i + 10] for i in range(0, 100, 10)] * 3
+    # 客户端预算远高于服务器允许的速率，必须靠限流响应降速
+    rate_limiter = RateLimiter(budgets={SONG_DETAIL_PATH: (200, 20, 8)})
+    with MockWeapiServer(library, throttle=(40, 5), throttle_status=throttle_status) as server:
+        client = WeapiClient(base_url=server.base_url, sec_key=MOCK_SEC_KEY, rate_limiter=rate_limiter)
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda batch: client.post(SONG_DETAIL_PATH, songs_request(batch)),
+                                            batches))
+        finally:
+            client.close()
+
+    assert [[song['id'] for song in result['songs']] for result in results] == batches
+    stats = rate_limiter.stats()[SONG_DETAIL_PATH]
+    assert stats['throttled'] == server.throttled_count > 0
+    assert stats['requests'] == len(batches) + server.throttled_count
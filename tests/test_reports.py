@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+报告输出测试：Markdown与优化前逐行写出的格式完全一致，CSV和JSONL包含全部列，分块写出时序号连续
+"""
+
+import csv
+import json
+
+import pytest
+
+import reports
+from cloud_music import CLOUD_MUSIC_COLUMNS, save_cloud_music_to_markdown
+from extract_by_id import VIP_SONG_COLUMNS
+from mock_server import SyntheticLibrary
+from reports import write_report, parse_formats
+from utils import format_filesize, format_timestamp
+
+
+@pytest.fixture
+def records(monkeypatch):
+    # 缩小分块大小，使记录跨越多个块
+    monkeypatch.setattr(reports, 'CHUNK_ROWS', 7)
+    library = SyntheticLibrary(30)
+    tracks = library.tracks()
+    for i, track in enumerate(tracks):
+        track.vip_type = '会员专享' if i % 3 else ''
+    return tracks, library.cloud_music_info()
+
+
+def _read(path, encoding='utf-8'):
+    with open(path, encoding=encoding, newline='') as f:
+        return f.read()
+
+
+def test_vip_markdown_matches_original_format(workspace, records):
+    tracks, _ = records
+    header_lines = ["# 歌单 - VIP歌曲列表\n\n"]
+    filenames, count = write_report('vip', VIP_SONG_COLUMNS, iter(tracks), header_lines)
+    assert filenames == ['vip.md'] and count == len(tracks)
+
+    expected = "# 歌单 - VIP歌曲列表\n\n"
+    expected += "| 序号 | 歌曲名称 | 艺术家 | VIP类型 |\n"
+    expected += "|------|--------|--------|--------|\n"
+    for i, track in enumerate(tracks, 1):
+        expected += f"| {i} | {track.name} | {', '.join(track.artists)} | {track.vip_type or '未知'} |\n"
+    assert _read('vip.md') == expected
+
+
+def test_cloud_markdown_matches_original_format(workspace, records):
+    _, cloud = records
+    filename = save_cloud_music_to_markdown(cloud)
+    lines = _read(filename).split('\n')
+    assert lines[0] == "# 网易云音乐云盘音乐列表"
+    assert lines[3] == f"总计: {len(cloud)} 首歌曲"
+
+    expected = ["| 序号 | 原始歌曲名称 | 原始艺术家 | 匹配歌曲名称 | 匹配艺术家 | 文件大小 | 添加时间 |",
+                "|------|------------|----------|------------|----------|---------|--------|"]
+    for i, song in enumerate(cloud, 1):
+        expected.append(f"| {i} | {song.name} | {song.artist} | {song.matched_name or song.name} | "
+                        f"{song.matched_artist or song.artist} | {format_filesize(song.file_size)} | "
+                        f"{format_timestamp(song.add_time)} |")
+    assert lines[5:-1] == expected
+    assert lines[-1] == ''
+
+
+def test_cloud_markdown_footer_for_iterators(workspace, records):
+    _, cloud = records
+    filename = save_cloud_music_to_markdown(iter(cloud))
+    content = _read(filename)
+    assert "总计" not in content.split('\n')[3]
+    assert content.endswith(f"\n\n总计: {len(cloud)} 首歌曲\n")
+
+
+def test_csv_and_jsonl_include_all_columns(workspace, records):
+    tracks, _ = records
+    filenames, _ = write_report('vip', VIP_SONG_COLUMNS, tracks, formats=('csv', 'jsonl'))
+    assert filenames == ['vip.csv', 'vip.jsonl']
+
+    with open('vip.csv', encoding='utf-8', newline='') as f:
+        assert f.read(1) == '\ufeff'
+        rows = list(csv.reader(f))
+    assert rows[0] == ['序号', '歌曲ID', '歌曲名称', '艺术家', 'VIP类型']
+    assert rows[1:] == [[str(i), str(track.id), track.name, ', '.join(track.artists), track.vip_type or '未知']
+                        for i, track in enumerate(tracks, 1)]
+
+    with open('vip.jsonl', encoding='utf-8') as f:
+        items = [json.loads(line) for line in f]
+    assert items == [{'index': i, 'id': track.id, 'name': track.name, 'artists': list(track.artists),
+                      'vip_type': track.vip_type} for i, track in enumerate(tracks, 1)]
+
+
+def test_parse_formats():
+    assert parse_formats('MD, .csv,jsonl') == ('md', 'csv', 'jsonl')
+    with pytest.raises(ValueError):
+        parse_formats('md,xlsx')
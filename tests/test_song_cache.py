@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+歌曲详情缓存测试：有效期、LRU淘汰，以及fee和版权信息不经过缓存
+"""
+
+import json
+import time
+
+import pytest
+
+from http_client import WeapiClient, set_client
+from mock_server import SyntheticLibrary, MockWeapiServer, MOCK_SEC_KEY
+from records import Track
+from song_cache import SongCache
+from song_detail import get_songs_detail
+
+
+class _Clock:
+    """可手动拨动的time.time替代"""
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SongCache(str(tmp_path / 'song_cache.db'), ttl=100, max_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_expired_entries_are_not_returned(cache, clock):
+    cache.put_many([Track(1, 'a', ('x',))])
+    clock.now += 50
+    assert list(cache.get_many([1])) == [1]
+    clock.now += 51
+    assert cache.get_many([1]) == {}
+
+
+def test_least_recently_accessed_entry_is_evicted(cache, clock):
+    for song_id in (1, 2, 3):
+        clock.now += 1
+        cache.put_many([Track(song_id, str(song_id))])
+    clock.now += 1
+    cache.get_many([1])
+    clock.now += 1
+    cache.put_many([Track(4, '4')])
+    assert sorted(cache.get_many([1, 2, 3, 4])) == [1, 3, 4]
+
+
+def test_fees_are_never_cached(tmp_path):
+    library = SyntheticLibrary(50)
+    track_ids = library.track_ids
+    cache = SongCache(str(tmp_path / 'song_cache.db'))
+    with MockWeapiServer(library) as server:
+        set_client(WeapiClient(base_url=server.base_url, sec_key=MOCK_SEC_KEY))
+        try:
+            songs = get_songs_detail(track_ids, {}, cache=cache)
+            assert [song.fee for song in songs] == [library.songs[song_id]['fee'] for song_id in track_ids]
+            rows = cache._conn.execute("SELECT data FROM songs").fetchall()
+            assert rows and all(set(json.loads(data)) == {'id', 'name', 'ar'} for data, in rows)
+
+            # 歌曲变为免费后，即使缓存未过期也应返回新的fee
+            for song in library.songs.values():
+                song['fee'] = 0
+                song['privilege']['fee'] = 0
+            requests_before = server.request_count
+            songs = get_songs_detail(track_ids, {}, cache=cache)
+            assert server.request_count > requests_before
+            assert all(song.fee == 0 and song.privilege_fee == 0 and not song.flags for song in songs)
+
+            # 只需要名称时直接使用缓存，返回的Track不含fee信息
+            requests_before = server.request_count
+            songs = get_songs_detail(track_ids, {}, cache=cache, with_fees=False)
+            assert server.request_count == requests_before
+            assert [song.name for song in songs] == [library.songs[song_id]['name'] for song_id in track_ids]
+            assert all(song.fee is None and song.privilege_fee is None for song in songs)
+        finally:
+            set_client(None)
+            cache.close()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+工具函数测试：名称标准化和编辑距离相似度与优化前的实现结果一致
+"""
+
+import random
+
+import pytest
+
+import baseline
+from helpers import random_text, mutate
+from mock_server import SyntheticLibrary
+from utils import normalize_song_name, normalize_artist_name, similarity, similarity_exceeds
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_normalizers_match_baseline(seed):
+    rng = random.Random(seed)
+    names = [random_text(rng) for _ in range(5000)] + [song.name for song in SyntheticLibrary(500, seed=seed).tracks()]
+    for name in names:
+        assert normalize_song_name(name) == baseline.normalize_song_name(name), name
+        assert normalize_artist_name(name) == baseline.normalize_artist_name(name), name
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_similarity_matches_baseline(seed):
+    rng = random.Random(seed)
+    alphabet = 'abcab海星'
+    for _ in range(5000):
+        s1 = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        s2 = mutate(rng, s1) if rng.random() < 0.5 else ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        expected = baseline.similarity(s1, s2)
+        assert similarity(s1, s2) == expected, (s1, s2)
+        for threshold in (0.0, 0.5, 0.7, 0.75, 0.9):
+            assert similarity_exceeds(s1, s2, threshold) == (expected > threshold), (s1, s2, threshold)
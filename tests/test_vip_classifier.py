@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+VIP分类测试：各类别的掩码与逐首按fee判断的结果一致，NumPy和纯Python实现结果相同
+"""
+
+import random
+
+import pytest
+
+import vip_classifier
+from extract_by_id import find_vip_songs
+from mock_server import SyntheticLibrary
+from records import UrlInfo
+from vip_classifier import (ALL_CATEGORIES, MEMBER_ONLY, TRIAL_ONLY, classify_tracks, select_tracks,
+                            true_indices)
+
+# 各类别对应的fee值，仅可试听由URL信息中的试听信息决定
+_CATEGORY_FEES = {MEMBER_ONLY: 1, '付费专辑': 4, '会员高音质': 8}
+
+
+def _library():
+    """合成歌曲和URL信息，并给部分URL信息加上试听信息，部分歌曲没有URL信息"""
+    rng = random.Random(0)
+    library = SyntheticLibrary(2000)
+    for item in library.urls.values():
+        if rng.random() < 0.1:
+            item['freeTrialInfo'] = {'start': 0, 'end': 30}
+    song_urls = {song_id: UrlInfo.from_api(item) for song_id, item in library.urls.items() if rng.random() < 0.95}
+    return library, library.tracks(), song_urls
+
+
+def _expected(library, song_urls, category):
+    """逐首检查原始JSON，返回属于该类别的歌曲位置"""
+    positions = []
+    for position, song_id in enumerate(library.track_ids):
+        song = library.songs[song_id]
+        url = library.urls[song_id] if song_id in song_urls else {}
+        if category == TRIAL_ONLY:
+            matched = bool(url.get('freeTrialInfo'))
+        else:
+            fee = _CATEGORY_FEES[category]
+            matched = fee in (song['fee'], song['privilege']['fee'], url.get('fee'))
+        if matched:
+            positions.append(position)
+    return positions
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+        monkeypatch.setattr(vip_classifier, '_np', False)
+    else:
+        monkeypatch.setattr(vip_classifier, '_np', None)
+    return request.param
+
+
+def test_category_masks_match_fees(backend):
+    library, tracks, song_urls = _library()
+    masks = classify_tracks(tracks, song_urls)
+    assert set(masks) == set(ALL_CATEGORIES)
+    for category in ALL_CATEGORIES:
+        expected = _expected(library, song_urls, category)
+        assert expected, category
+        assert true_indices(masks[category]) == expected, category
+        assert select_tracks(tracks, song_urls, category) == [tracks[position] for position in expected], category
+
+
+def test_earlier_category_wins(backend):
+    library, tracks, song_urls = _library()
+    categories = ('付费专辑', MEMBER_ONLY, TRIAL_ONLY)
+    vip_songs = find_vip_songs(tracks, song_urls, categories)
+
+    expected = {}
+    for category in reversed(categories):
+        for position in _expected(library, song_urls, category):
+            expected[position] = category
+    assert [(song.id, song.vip_type) for song in vip_songs] == \
+        [(tracks[position].id, expected[position]) for position in sorted(expected)]
+    # 同时属于多个类别的歌曲应当存在，否则没有覆盖到优先级
+    assert set(_expected(library, song_urls, '付费专辑')) & set(_expected(library, song_urls, MEMBER_ONLY))